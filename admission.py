@@ -0,0 +1,178 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Admission control. Token buckets limit how fast work is started, per
+# session and for the whole process, and the fill level of the process-wide
+# buckets picks a load-shedding tier:
+#
+#   normal  everything runs
+#   cache   optional Gemini work (speculation, AI descriptions, background
+#           refreshes) is shed and cached results are served even when stale
+#   canned  no new Gemini work: cached or canned questions and recommendations
+#   reject  steps that would start new work are turned away until the
+#           buckets refill (cached results are still served)
+#
+# The session is bound with a context variable, so calls made from coroutines
+# on the shared loop are charged to the session that started them.
+
+# Resources with their own buckets: steps that start work, Gemini calls and
+# TMDB calls
+STEPS = "steps"
+GEMINI = "gemini"
+TMDB = "tmdb"
+
+TIERS = ("normal", "cache", "canned", "reject")
+
+# Outcomes of admit()
+ADMITTED = "admitted"
+SESSION_LIMITED = "session_limited"
+GLOBAL_LIMITED = "global_limited"
+
+_current_session = contextvars.ContextVar("admission_session", default=None)
+
+# Holds up to `burst` tokens, refilled continuously at `rate` per second
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, cost=1.0):
+        with self._lock:
+            self._refill()
+            if self.tokens < cost:
+                return False
+            self.tokens -= cost
+            return True
+
+    def refund(self, cost=1.0):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + cost)
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+    # Fraction of the bucket that is full
+    def level(self):
+        return self.available() / self.capacity
+
+# Session the current code is running for, if any
+def current_session():
+    return _current_session.get()
+
+# `limits` maps each resource to ((rate, burst), (session_rate, session_burst)).
+# The tier drops to "cache" and then "canned" as the process-wide Gemini
+# bucket falls below `cache_level` and `canned_level` (fractions of full).
+# Sessions idle for `session_idle` seconds lose their buckets.
+class AdmissionController:
+    def __init__(self, limits, cache_level, canned_level, session_idle=600):
+        self.limits = limits
+        self.cache_level = cache_level
+        self.canned_level = canned_level
+        self.session_idle = session_idle
+        self.buckets = {resource: TokenBucket(*process_limits) for resource, (process_limits, _) in limits.items()}
+        self.sessions = {}
+        self.outcomes = {}
+        self.shed = {}
+        self._lock = threading.Lock()
+
+    # Charge the calls made inside the block to a session
+    @contextmanager
+    def session(self, session_id):
+        token = _current_session.set(session_id)
+        try:
+            yield
+        finally:
+            _current_session.reset(token)
+
+    def _session_buckets(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                for idle in [key for key, (seen, _) in self.sessions.items() if now - seen > self.session_idle]:
+                    del self.sessions[idle]
+                buckets = {resource: TokenBucket(*session_limits) for resource, (_, session_limits) in self.limits.items()}
+                entry = (now, buckets)
+            self.sessions[session_id] = (now, entry[1])
+            return entry[1]
+
+    # Take `cost` tokens for a resource from the current session's bucket (if
+    # a session is bound) and the process-wide one. Returns ADMITTED,
+    # SESSION_LIMITED or GLOBAL_LIMITED; nothing is taken unless admitted.
+    def admit(self, resource, cost=1.0):
+        session_id = _current_session.get()
+        session_bucket = self._session_buckets(session_id)[resource] if session_id is not None else None
+        if session_bucket is not None and not session_bucket.try_acquire(cost):
+            outcome = SESSION_LIMITED
+        elif not self.buckets[resource].try_acquire(cost):
+            if session_bucket is not None:
+                session_bucket.refund(cost)
+            outcome = GLOBAL_LIMITED
+        else:
+            outcome = ADMITTED
+        with self._lock:
+            self.outcomes[(resource, outcome)] = self.outcomes.get((resource, outcome), 0) + 1
+        return outcome
+
+    # Current load-shedding tier
+    def tier(self):
+        if self.buckets[STEPS].available() < 1:
+            return "reject"
+        level = self.buckets[GEMINI].level()
+        if level < self.canned_level:
+            return "canned"
+        if level < self.cache_level:
+            return "cache"
+        return "normal"
+
+    # Count a piece of work skipped because of the tier
+    def note_shed(self, tier, what):
+        with self._lock:
+            self.shed[(tier, what)] = self.shed.get((tier, what), 0) + 1
+
+    # Prometheus text exposition format
+    def export_prometheus(self, prefix="svomo_admission"):
+        current = self.tier()
+        lines = [
+            f"# HELP {prefix}_tier Active load-shedding tier (1 for the active one).",
+            f"# TYPE {prefix}_tier gauge"
+        ]
+        lines += [f'{prefix}_tier{{tier="{tier}"}} {int(tier == current)}' for tier in TIERS]
+        lines += [
+            f"# HELP {prefix}_bucket_level Fill level of the process-wide token buckets (0-1).",
+            f"# TYPE {prefix}_bucket_level gauge"
+        ]
+        lines += [f'{prefix}_bucket_level{{resource="{resource}"}} {bucket.level():.3f}' for resource, bucket in sorted(self.buckets.items())]
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            shed = dict(self.shed)
+            sessions = len(self.sessions)
+        lines += [
+            f"# HELP {prefix}_sessions Sessions with their own buckets.",
+            f"# TYPE {prefix}_sessions gauge",
+            f"{prefix}_sessions {sessions}",
+            f"# HELP {prefix}_requests_total Admission decisions per resource.",
+            f"# TYPE {prefix}_requests_total counter"
+        ]
+        lines += [
+            f'{prefix}_requests_total{{resource="{resource}",outcome="{outcome}"}} {count}'
+            for (resource, outcome), count in sorted(outcomes.items())
+        ]
+        lines += [
+            f"# HELP {prefix}_shed_total Work skipped by load shedding.",
+            f"# TYPE {prefix}_shed_total counter"
+        ]
+        lines += [f'{prefix}_shed_total{{tier="{tier}",what="{what}"}} {count}' for (tier, what), count in sorted(shed.items())]
+        return "\n".join(lines) + "\n"
@@ -1,8 +1,31 @@
 import streamlit as st
-import requests
+import asyncio
+import hashlib
 import json
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 import google.generativeai as genai
+import httpx
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from tmdb_catalog import TMDBCatalog, DEFAULT_CATALOG_PATH, DEFAULT_FUZZY_THRESHOLD, DEFAULT_MIN_POPULARITY, title_similarity
+import admission
+import posters
+import prompts
+import semantic_cache
+import tracing
+
+try:
+    import redis
+except ImportError:
+    redis = None
 
 # Set page configuration
 st.set_page_config(
@@ -11,6 +34,17 @@ st.set_page_config(
     layout="wide"
 )
 
+# Read an optional setting from secrets.toml, falling back to an environment
+# variable and then to the given default (whose type the value is cast to)
+def get_setting(name, default):
+    try:
+        value = st.secrets[name]
+    except Exception:
+        value = os.environ.get(name, default)
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
+
 # Load secrets with proper error handling
 try:
     TMDB_API_KEY = st.secrets["TMDB_API_KEY"]
@@ -18,200 +52,286 @@ except Exception as e:
     st.error("TMDB API key not found in secrets. Please check your secrets.toml file.")
     TMDB_API_KEY = "missing"
 
+# Gemini transport. "rest" works where gRPC is blocked, and together with
+# GEMINI_API_ENDPOINT lets the app talk to a local stub (see bench/)
+GEMINI_TRANSPORT = get_setting("GEMINI_TRANSPORT", "")
+GEMINI_API_ENDPOINT = get_setting("GEMINI_API_ENDPOINT", "")
+
 try:
     GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
     # Configure Gemini API right away to catch errors early
-    genai.configure(api_key=GEMINI_API_KEY)
+    genai.configure(
+        api_key=GEMINI_API_KEY,
+        transport=GEMINI_TRANSPORT or None,
+        client_options={"api_endpoint": GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None
+    )
 except Exception as e:
     st.error(f"Error configuring Gemini API: {e}. Please check your secrets.toml file.")
     GEMINI_API_KEY = "missing"
 
-# Apply custom styling for retro UI
+# Poster shown when TMDB has no image (or no match) for a title. It goes
+# through the poster pipeline below like any other poster (and is drawn
+# locally if it can't be fetched), so pages never hot-link it.
+POSTER_PLACEHOLDER_SOURCE = "https://i.ibb.co/s9ZYS5wk/45e6544ed099.jpg"
+POSTER_PLACEHOLDER_TIMEOUT = 3
+
+# Poster pipeline: each TMDB poster is fetched once at POSTER_SOURCE_SIZE,
+# resized to posters.POSTER_WIDTHS in WebP and JPEG and served from
+# static/posters under a content hash, trimmed to POSTER_CACHE_MAX_MB. Cards
+# list every width and let the browser pick one for the column.
+TMDB_IMAGE_BASE = get_setting("TMDB_IMAGE_BASE", "https://image.tmdb.org/t/p")
+POSTER_SOURCE_SIZE = "w500"
+POSTER_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "posters")
+POSTER_CACHE_MAX_MB = get_setting("POSTER_CACHE_MAX_MB", 200)
+POSTER_INDEX_TTL = 30 * 24 * 60 * 60
+POSTER_INDEX_MAX_ENTRIES = 10000
+POSTER_FETCH_TIMEOUT = 10
+# Rendered poster width: a third of the page in the wide layout, full width
+# once the columns stack on small screens
+POSTER_SIZES = "(max-width: 640px) 90vw, 30vw"
+
+# Enrichment settings: how many titles are looked up at once across the whole
+# process (also the TMDB connection pool size), and how long the results page
+# waits before giving up on a title
+ENRICHMENT_MAX_WORKERS = 8
+ENRICHMENT_TIMEOUT = 20
+
+# TMDB HTTP client: one pooled keep-alive async client per process, connect/read
+# timeouts in seconds, bounded retries on 429/5xx, and a circuit breaker that
+# stops calling TMDB for a while after repeated failures
+TMDB_API_BASE = get_setting("TMDB_API_BASE", "https://api.themoviedb.org/3")
+TMDB_CONNECT_TIMEOUT = get_setting("TMDB_CONNECT_TIMEOUT", 3.05)
+TMDB_READ_TIMEOUT = get_setting("TMDB_READ_TIMEOUT", 10.0)
+TMDB_MAX_RETRIES = get_setting("TMDB_MAX_RETRIES", 3)
+TMDB_BREAKER_THRESHOLD = get_setting("TMDB_BREAKER_THRESHOLD", 5)
+TMDB_BREAKER_COOLDOWN = get_setting("TMDB_BREAKER_COOLDOWN", 30.0)
+TMDB_RETRY_STATUSES = (429, 500, 502, 503, 504)
+TMDB_MAX_RETRY_AFTER = 10.0
+
+# Total time one TMDB request may take, retries and backoff included. A title
+# makes at most two requests in a row (search, then details), so together
+# they fit in ENRICHMENT_TIMEOUT. No retry starts with less than
+# TMDB_MIN_ATTEMPT_TIME left.
+TMDB_REQUEST_BUDGET = get_setting("TMDB_REQUEST_BUDGET", ENRICHMENT_TIMEOUT / 2)
+TMDB_MIN_ATTEMPT_TIME = 1.0
+
+# Lean enrichment: render cards straight from the search hit and only call the
+# details endpoint when a field the card needs is missing. That call pulls in
+# everything else we might use through append_to_response.
+TMDB_LEAN_ENRICHMENT = get_setting("TMDB_LEAN_ENRICHMENT", True)
+TMDB_DETAILS_APPEND = "images"
+
+# Local TMDB catalog index (see tmdb_catalog.py). When a snapshot has been
+# imported, titles are resolved to ids locally, with fuzzy matching, and
+# /search is only called on a miss. Titles still resolve while TMDB is down.
+# Hits below TMDB_CATALOG_MIN_POPULARITY are ignored, since the index only
+# knows original titles and an English title may name an obscure homonym.
+TMDB_CATALOG_PATH = get_setting("TMDB_CATALOG_PATH", DEFAULT_CATALOG_PATH)
+TMDB_CATALOG_FUZZY_THRESHOLD = get_setting("TMDB_CATALOG_FUZZY_THRESHOLD", DEFAULT_FUZZY_THRESHOLD)
+TMDB_CATALOG_MIN_POPULARITY = get_setting("TMDB_CATALOG_MIN_POPULARITY", DEFAULT_MIN_POPULARITY)
+
+# How AI descriptions are written for the results page:
+#   "batch"    - one Gemini call describes every title (per-title calls only
+#                if the batch answer is malformed)
+#   "inline"   - get_recommendations asks for descriptions in the same call,
+#                so the whole flow needs at most two LLM calls
+#   "per_item" - one Gemini call per title
+GEMINI_DESCRIPTION_MODE = get_setting("GEMINI_DESCRIPTION_MODE", "batch")
+
+# Gemini client: model instances are reused per (model, generation config),
+# requests time out after GEMINI_TIMEOUT seconds, at most
+# GEMINI_MAX_CONCURRENCY requests are in flight per process (keep this under
+# the project's QPS quota), and a tiny warm-up request at server start sets up
+# the transport before the first user arrives
+GEMINI_MODEL = get_setting("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_TIMEOUT = get_setting("GEMINI_TIMEOUT", 30.0)
+GEMINI_MAX_CONCURRENCY = get_setting("GEMINI_MAX_CONCURRENCY", 8)
+GEMINI_WARMUP = get_setting("GEMINI_WARMUP", True)
+
+# Latency budgets per call site, in seconds: past its budget a call gives up
+# and the caller's fallback content is used (streams stop where they are).
+# A call still running at the GEMINI_HEDGE_PERCENTILE latency of its call
+# site's recent calls gets one hedged duplicate; the first answer wins and
+# the other is cancelled. Until GEMINI_HEDGE_MIN_SAMPLES calls have been
+# seen, hedges go out at GEMINI_HEDGE_COLD_FRACTION of the budget. Hedges
+# are only sent while admission control is in its normal tier, so a slow
+# backend doesn't get twice the load.
+GEMINI_CALL_BUDGETS = {
+    "questions": get_setting("GEMINI_BUDGET_QUESTIONS", 12.0),
+    "recommendations": get_setting("GEMINI_BUDGET_RECOMMENDATIONS", 15.0),
+    "description": get_setting("GEMINI_BUDGET_DESCRIPTION", 6.0),
+    "batch_description": get_setting("GEMINI_BUDGET_BATCH_DESCRIPTION", 10.0)
+}
+GEMINI_HEDGING = get_setting("GEMINI_HEDGING", True)
+GEMINI_HEDGE_PERCENTILE = get_setting("GEMINI_HEDGE_PERCENTILE", 95.0)
+GEMINI_HEDGE_MIN_SAMPLES = 20
+GEMINI_HEDGE_COLD_FRACTION = 0.5
+GEMINI_HEDGE_MIN_DELAY = 0.25
+GEMINI_LATENCY_WINDOW = 200
+
+# Stream the recommendation response and render each card as soon as its title
+# arrives, filling in poster and description when they are ready
+GEMINI_STREAMING = get_setting("GEMINI_STREAMING", True)
+
+# Ask Gemini for JSON that follows a response schema instead of relying on the
+# prompt alone; turn off for models without structured output support
+GEMINI_STRUCTURED_OUTPUT = get_setting("GEMINI_STRUCTURED_OUTPUT", True)
+
+# Background prefetching: the question bank is topped up while the welcome
+# screen is up, and recommendations for the most likely answers to the last
+# question start while the user is still reading it. Speculative jobs have
+# their own PREFETCH_MAX_WORKERS threads and are skipped rather than queued
+# when those are busy. A job that has started is waited for as long as
+# building the page from scratch could take, so a slow guess isn't paid for
+# twice; one still queued is cancelled and the page built directly.
+PREFETCH_MAX_WORKERS = get_setting("PREFETCH_MAX_WORKERS", 4)
+SPECULATION_BRANCHES = get_setting("SPECULATION_BRANCHES", 2)
+SPECULATION_WAIT_TIMEOUT = (
+    GEMINI_CALL_BUDGETS["recommendations"] + ENRICHMENT_TIMEOUT + GEMINI_CALL_BUDGETS["batch_description"]
+)
+
+# Question bank: validated question sets per persona, stored on disk and served
+# without an LLM call. Gemini only tops the bank up in the background. Bump
+# QUESTION_PROMPT_VERSION when the question format changes to start a new bank.
+QUESTION_PROMPT_VERSION = 1
+QUESTION_BANK_SIZE = get_setting("QUESTION_BANK_SIZE", 5)
+QUESTION_BANK_REFRESH_AFTER = get_setting("QUESTION_BANK_REFRESH_AFTER", 24 * 60 * 60)
+QUESTION_BANK_TTL = 30 * 24 * 60 * 60
+QUESTION_BANK_ROTATE = get_setting("QUESTION_BANK_ROTATE", True)
+# Bank fills run on their own threads (one per persona, since a persona only
+# ever has one fill running), so a first visitor never waits behind
+# speculative jobs. They wait at most one questions call.
+QUESTION_BANK_WAIT_TIMEOUT = GEMINI_CALL_BUDGETS["questions"] + 1
+
+# Recommendation cache keyed on a hash of the persona, the normalized
+# question/answer pairs and RECOMMENDATION_PROMPT_VERSION (bump it when the
+# recommendation prompt changes). Entries are fresh for RECOMMENDATION_CACHE_TTL;
+# after that they can still be served for RECOMMENDATION_CACHE_STALE_TTL while
+# a background job refreshes them.
+RECOMMENDATION_PROMPT_VERSION = 2
+RECOMMENDATION_CACHE_TTL = get_setting("RECOMMENDATION_CACHE_TTL", 24 * 60 * 60)
+RECOMMENDATION_CACHE_STALE_TTL = get_setting("RECOMMENDATION_CACHE_STALE_TTL", 7 * 24 * 60 * 60)
+RECOMMENDATION_CACHE_MAX_ENTRIES = get_setting("RECOMMENDATION_CACHE_MAX_ENTRIES", 2000)
+RECOMMENDATION_CACHE_SERVE_STALE = get_setting("RECOMMENDATION_CACHE_SERVE_STALE", True)
+
+# Semantic cache: on an exact-key miss, a results page cached for a prompt with
+# the same persona and exactly the same (normalized) answers is reused if each
+# of its questions is at least SEMANTIC_CACHE_THRESHOLD similar (cosine, 0-1)
+# to the question at the same position, i.e. only the question wording may
+# differ. Rewordings of the canned questions score 0.2-0.9 and different
+# questions up to about 0.55; tune the threshold with the similarity
+# histograms in the Prometheus export.
+SEMANTIC_CACHE_ENABLED = get_setting("SEMANTIC_CACHE_ENABLED", True)
+SEMANTIC_CACHE_THRESHOLD = get_setting("SEMANTIC_CACHE_THRESHOLD", 0.6)
+
+# Persistent cache shared by every session and server process on this machine.
+# A hit only writes the entry's access time (for LRU eviction) if it is older
+# than CACHE_TOUCH_INTERVAL, so most lookups are plain reads; the entry count
+# shown in the sidebar is re-counted at most every CACHE_STATS_INTERVAL.
+CACHE_PATH = get_setting("CACHE_PATH", ".cache/svomo_cache.sqlite3")
+CACHE_TOUCH_INTERVAL = 60
+CACHE_STATS_INTERVAL = 30
+
+# Admission control: token buckets (rate per second, burst) per session and
+# per process for steps that start work, Gemini calls and TMDB calls. As the
+# process-wide Gemini bucket drains below ADMISSION_SHED_CACHE_LEVEL and then
+# ADMISSION_SHED_CANNED_LEVEL the app sheds load in tiers (see admission.py):
+# first optional Gemini work, then all new Gemini work in favour of cached and
+# canned results; steps are only rejected once their own buckets are empty.
+ADMISSION_STEP_RATE = get_setting("ADMISSION_STEP_RATE", 5.0)
+ADMISSION_STEP_BURST = get_setting("ADMISSION_STEP_BURST", 20)
+ADMISSION_SESSION_STEP_RATE = get_setting("ADMISSION_SESSION_STEP_RATE", 0.2)
+ADMISSION_SESSION_STEP_BURST = get_setting("ADMISSION_SESSION_STEP_BURST", 4)
+ADMISSION_GEMINI_RATE = get_setting("ADMISSION_GEMINI_RATE", 2.0)
+ADMISSION_GEMINI_BURST = get_setting("ADMISSION_GEMINI_BURST", 60)
+ADMISSION_SESSION_GEMINI_RATE = get_setting("ADMISSION_SESSION_GEMINI_RATE", 0.5)
+ADMISSION_SESSION_GEMINI_BURST = get_setting("ADMISSION_SESSION_GEMINI_BURST", 15)
+ADMISSION_TMDB_RATE = get_setting("ADMISSION_TMDB_RATE", 30.0)
+ADMISSION_TMDB_BURST = get_setting("ADMISSION_TMDB_BURST", 40)
+ADMISSION_SESSION_TMDB_RATE = get_setting("ADMISSION_SESSION_TMDB_RATE", 3.0)
+ADMISSION_SESSION_TMDB_BURST = get_setting("ADMISSION_SESSION_TMDB_BURST", 20)
+ADMISSION_SHED_CACHE_LEVEL = get_setting("ADMISSION_SHED_CACHE_LEVEL", 0.3)
+ADMISSION_SHED_CANNED_LEVEL = get_setting("ADMISSION_SHED_CANNED_LEVEL", 0.1)
+
+# Recommendation jobs: generation runs on a worker pool and publishes partial
+# and final results under a job id, which is kept in the page URL so that a
+# refresh or reconnect picks the job back up. Records live in the disk cache,
+# or in Redis when JOB_REDIS_URL is set (needs the redis package) so several
+# app processes share them. A running job whose record hasn't been touched for
+# JOB_STALE_AFTER seconds is assumed lost and restarted.
+JOB_MAX_WORKERS = get_setting("JOB_MAX_WORKERS", 8)
+JOB_POLL_INTERVAL = get_setting("JOB_POLL_INTERVAL", 0.5)
+JOB_TTL = get_setting("JOB_TTL", 60 * 60)
+JOB_STALE_AFTER = get_setting("JOB_STALE_AFTER", 120)
+JOB_MAX_ENTRIES = 1000
+JOB_REDIS_URL = get_setting("JOB_REDIS_URL", "")
+
+# TMDB lookup cache: hits are kept for a week, "no result" answers for an hour
+TMDB_LANGUAGE = "en-US"
+TMDB_CACHE_TTL = get_setting("TMDB_CACHE_TTL", 7 * 24 * 60 * 60)
+TMDB_NEGATIVE_CACHE_TTL = get_setting("TMDB_NEGATIVE_CACHE_TTL", 60 * 60)
+TMDB_CACHE_MAX_ENTRIES = get_setting("TMDB_CACHE_MAX_ENTRIES", 5000)
+
+# AI description cache: descriptions are keyed on the title, its TMDB
+# overview and the reason it was recommended, so the canned lists (and
+# anything warm_cache.py pre-describes) never need Gemini twice
+DESCRIPTION_CACHE_TTL = get_setting("DESCRIPTION_CACHE_TTL", 30 * 24 * 60 * 60)
+DESCRIPTION_CACHE_MAX_ENTRIES = get_setting("DESCRIPTION_CACHE_MAX_ENTRIES", 5000)
+
+# Tracing: each session keeps its last TRACE_BUFFER_SIZE script runs for the
+# sidebar waterfall. Set TRACE_OTEL_LOG_PATH to append every trace as an
+# OpenTelemetry JSON line, and TRACE_PROMETHEUS_PATH to keep a Prometheus
+# textfile of span latencies up to date.
+TRACE_BUFFER_SIZE = get_setting("TRACE_BUFFER_SIZE", 20)
+TRACE_OTEL_LOG_PATH = get_setting("TRACE_OTEL_LOG_PATH", "")
+TRACE_PROMETHEUS_PATH = get_setting("TRACE_PROMETHEUS_PATH", "")
+
+# Retro UI stylesheet, served by Streamlit's static file serving
+# (server.enableStaticServing in .streamlit/config.toml)
+STYLESHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "svomo.css")
+
+# URL of the stylesheet, versioned by content hash so browsers can keep it
+# cached until the file changes. Computed once per process.
+@st.cache_resource
+def get_stylesheet_url():
+    with open(STYLESHEET_PATH, "rb") as stylesheet:
+        version = hashlib.sha256(stylesheet.read()).hexdigest()[:12]
+    return f"app/static/svomo.css?v={version}"
+
+# Apply custom styling for retro UI. Streamlit drops any element a rerun
+# doesn't emit again, so this still runs every time, but it only sends a
+# <link> tag; the browser downloads the stylesheet (and its fonts) once.
 def load_css():
-    st.markdown("""
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=VT323&display=swap');
-        @import url('https://fonts.googleapis.com/css2?family=Press+Start+2P&display=swap');
-        
-        * {
-            font-family: 'VT323', monospace;
-        }
-        
-        h1, h2, h3 {
-            font-family: 'Press Start 2P', cursive;
-            color: #ff00ff;
-            text-shadow: 2px 2px #00ffff;
-        }
-        
-        .stButton button {
-            background-color: #ff00ff;
-            color: black;
-            border: 2px solid #00ffff;
-            border-radius: 0px;
-            font-family: 'VT323', monospace;
-            text-transform: uppercase;
-            font-size: 1.2rem;
-            margin: 5px 0;
-            transition: all 0.3s;
-        }
-        
-        .stButton button:hover {
-            background-color: #00ffff;
-            color: black;
-            border: 2px solid #ff00ff;
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(255, 0, 255, 0.5);
-        }
-        
-        .retro-card {
-            border: 2px solid #ff00ff;
-            background-color: rgba(0, 0, 0, 0.7);
-            padding: 20px;
-            margin: 10px 0;
-            box-shadow: 5px 5px 0px #00ffff;
-        }
-        
-        .title-text {
-            font-family: 'Press Start 2P', cursive;
-            font-size: 2.5em;
-            color: #ff00ff;
-            text-shadow: 3px 3px #00ffff;
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        
-        .question-text {
-            font-size: 1.5em;
-            color: #00ffff;
-            margin-bottom: 20px;
-        }
-        
-        .option-text {
-            font-size: 1.2em;
-            color: white;
-        }
-        
-        /* Retro grid background */
-        .stApp {
-            background-image: 
-                linear-gradient(rgba(0, 0, 0, 0.7), rgba(0, 0, 0, 0.7)),
-                linear-gradient(90deg, rgba(255, 0, 255, 0.2) 1px, transparent 1px),
-                linear-gradient(0deg, rgba(0, 255, 255, 0.2) 1px, transparent 1px);
-            background-size: 100% 100%, 30px 30px, 30px 30px;
-            background-color: #000020;
-        }
-        
-        /* Movie card styling */
-        .movie-card {
-            border: 2px solid #ff00ff;
-            background-color: rgba(0, 0, 0, 0.7);
-            padding: 15px;
-            margin: 10px;
-            box-shadow: 5px 5px 0px #00ffff;
-            transition: transform 0.3s;
-        }
-        
-        .movie-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 8px 8px 0px #00ffff;
-        }
-        
-        .movie-title {
-            font-family: 'Press Start 2P', cursive;
-            font-size: 1em;
-            color: #ff00ff;
-            margin: 10px 0;
-        }
-        
-        .movie-year {
-            color: #00ffff;
-            font-size: 1.2em;
-            margin-bottom: 10px;
-        }
-        
-        .movie-overview {
-            color: white;
-            font-size: 1.2em;
-            margin-top: 10px;
-        }
-        
-        /* Loading animation */
-        .loading-container {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            margin: 40px 0;
-        }
-        
-        .loading-text {
-            color: #ff00ff;
-            font-size: 24px;
-            margin-bottom: 20px;
-            font-family: 'Press Start 2P', cursive;
-        }
-        
-        .loading-dots {
-            display: flex;
-        }
-        
-        .loading-dot {
-            width: 20px;
-            height: 20px;
-            margin: 0 10px;
-            border-radius: 50%;
-            background-color: #00ffff;
-            animation: loading-dot-animation 1.5s infinite ease-in-out;
-        }
-        
-        .loading-dot:nth-child(1) {
-            animation-delay: 0s;
-        }
-        
-        .loading-dot:nth-child(2) {
-            animation-delay: 0.3s;
-        }
-        
-        .loading-dot:nth-child(3) {
-            animation-delay: 0.6s;
-        }
-        
-        @keyframes loading-dot-animation {
-            0%, 100% {
-                transform: scale(0.5);
-                background-color: #00ffff;
-            }
-            50% {
-                transform: scale(1.5);
-                background-color: #ff00ff;
-            }
-        }
-        
-        /* Credits section */
-        .credits {
-            text-align: center;
-            margin-top: 50px;
-            padding: 20px;
-            border-top: 1px solid #ff00ff;
-        }
-        
-        .credits img {
-            margin: 0 10px;
-            max-height: 30px;
-        }
-        
-        /* Blinking cursor effect */
-        .blinking-cursor {
-            animation: blink 1s infinite;
-            display: inline-block;
-        }
-        
-        @keyframes blink {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0; }
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f'<link rel="stylesheet" href="{get_stylesheet_url()}">', unsafe_allow_html=True)
+
+# Personas offered on the welcome screen
+PERSONA_OPTIONS = [
+    "Anime Fan", 
+    "Hollywood Movie Enthusiast", 
+    "Bollywood Fan", 
+    "K-Drama Lover", 
+    "TV Series Binger",
+    "Indie Film Appreciator"
+]
+
+# Fallback recommendations if the AI fails
+FALLBACK_RECOMMENDATIONS = [
+    {
+        "title": "The Matrix",
+        "type": "movie",
+        "reason": "A sci-fi classic that combines action, philosophy, and groundbreaking visuals."
+    },
+    {
+        "title": "Stranger Things",
+        "type": "tv",
+        "reason": "A nostalgic series with supernatural elements and compelling characters."
+    },
+    {
+        "title": "Inception",
+        "type": "movie",
+        "reason": "A mind-bending thriller with stunning visuals and an intricate plot."
+    }
+]
 
 # Initialize session state
 def init_session_state():
@@ -229,8 +349,32 @@ def init_session_state():
         st.session_state.recommendations = []
     if 'debug_info' not in st.session_state:
         st.session_state.debug_info = ""
-    if 'retry_count' not in st.session_state:
-        st.session_state.retry_count = 0
+    if 'speculations' not in st.session_state:
+        st.session_state.speculations = {}
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
+    if 'traces' not in st.session_state:
+        st.session_state.traces = tracing.new_trace_buffer(TRACE_BUFFER_SIZE)
+
+# Record debug info for the current session. Enrichment runs on worker threads
+# that have no Streamlit session attached, so writes from there are dropped.
+def set_debug_info(message):
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        st.session_state.debug_info = message
+
+# Credits footer shown on the welcome and results pages
+CREDITS_HTML = """
+<div class="credits">
+    <p style="color: #00ffff; font-size: 1.2em;">Powered by Google Gemini AI | Movie data from TheMovieDB</p>
+    <div>
+        <img src="https://www.gstatic.com/lamda/images/gemini_ai_logo_70e467c4f0c37.svg" alt="Gemini AI">
+        <img src="https://www.themoviedb.org/assets/2/v4/logos/v2/blue_short-8e7b30f73a4020692ccca9c88bafe5dcb6f8a62a4c6bc55cd9ba82bb2cd95f6c.svg" alt="TMDB">
+    </div>
+</div>
+"""
+
+def show_credits():
+    st.markdown(CREDITS_HTML, unsafe_allow_html=True)
 
 # Display loading animation
 def show_loading(text="Loading..."):
@@ -245,39 +389,803 @@ def show_loading(text="Loading..."):
     </div>
     """, unsafe_allow_html=True)
 
-# Function to communicate with Gemini API
-def ask_gemini(prompt):
+# Marker returned by DiskCache.get when a key is not cached, so that a cached
+# None ("no result") can be told apart from a miss. The script runs afresh on
+# every interaction while caches live for the whole process, so the marker
+# has to be process-wide too, or a miss from a cache created in an earlier
+# run would look like a hit.
+@st.cache_resource
+def get_cache_miss_marker():
+    return object()
+
+CACHE_MISS = get_cache_miss_marker()
+
+# SQLite-backed key/value cache with per-entry TTL and LRU eviction. Several
+# Streamlit processes can share one file; each namespace keeps its own size
+# limit. Hit/miss counters are kept in memory, per process.
+class DiskCache:
+    def __init__(self, path, namespace, max_entries):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.size = None
+        self.size_counted_at = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS cache_entries_lru
+                ON cache_entries (namespace, accessed_at)
+            """)
+    
+    # SQLite connections can't be shared between threads, so keep one per thread
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    # Return the cached value for key, or CACHE_MISS if it is absent or expired
+    def get(self, key):
+        key = json.dumps(key)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, expires_at, accessed_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row is None or row[1] < now:
+                    self._count(False)
+                    return CACHE_MISS
+                if now - row[2] > CACHE_TOUCH_INTERVAL:
+                    conn.execute(
+                        "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                        (now, self.namespace, key)
+                    )
+                self._count(True)
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            set_debug_info(f"Cache read failed for {self.namespace}: {e}")
+            return CACHE_MISS
+    
+    # Store a JSON-serialisable value for ttl seconds, evicting the least
+    # recently used entries once the namespace grows past max_entries
+    def set(self, key, value, ttl):
+        key = json.dumps(key)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), now + ttl, now)
+                )
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?",
+                    (self.namespace, now)
+                )
+                conn.execute("""
+                    DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                        SELECT key FROM cache_entries WHERE namespace = ?
+                        ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.namespace, self.namespace, self.max_entries))
+        except sqlite3.Error as e:
+            set_debug_info(f"Cache write failed for {self.namespace}: {e}")
+    
+    # get() and set() for coroutines on the shared loop. Every lookup writes
+    # (access time, counters) and may wait on another process's lock, so the
+    # SQLite work runs on a worker thread instead of stalling the loop.
+    async def get_async(self, key):
+        return await asyncio.to_thread(self.get, key)
+    
+    async def set_async(self, key, value, ttl):
+        await asyncio.to_thread(self.set, key, value, ttl)
+    
+    # Up to `limit` live values, most recently used first. Doesn't count as
+    # a lookup.
+    def recent(self, limit):
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT value FROM cache_entries WHERE namespace = ? AND expires_at >= ? "
+                    "ORDER BY accessed_at DESC LIMIT ?",
+                    (self.namespace, time.time(), limit)
+                ).fetchall()
+        except sqlite3.Error as e:
+            set_debug_info(f"Cache read failed for {self.namespace}: {e}")
+            return []
+        return [json.loads(row[0]) for row in rows]
+    
+    # This process's hit/miss counters and the namespace's entry count
+    # (across processes, re-counted at most every CACHE_STATS_INTERVAL)
+    def stats(self):
+        now = time.time()
+        if self.size is None or now - self.size_counted_at > CACHE_STATS_INTERVAL:
+            try:
+                with self._connect() as conn:
+                    self.size = conn.execute(
+                        "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?",
+                        (self.namespace,)
+                    ).fetchone()[0]
+            except sqlite3.Error:
+                self.size = self.size or 0
+            self.size_counted_at = now
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'size': self.size
+        }
+
+# TMDB lookup cache, created once per server process
+@st.cache_resource
+def get_tmdb_cache():
+    return DiskCache(CACHE_PATH, "tmdb", TMDB_CACHE_MAX_ENTRIES)
+
+# AI description cache, created once per server process
+@st.cache_resource
+def get_description_cache():
+    return DiskCache(CACHE_PATH, "descriptions", DESCRIPTION_CACHE_MAX_ENTRIES)
+
+# Poster variants on disk, created once per server process
+@st.cache_resource
+def get_poster_store():
+    return posters.PosterStore(POSTER_CACHE_DIR, "app/static/posters", POSTER_CACHE_MAX_MB * 1024 * 1024)
+
+# Source image URL -> poster content key
+@st.cache_resource
+def get_poster_index():
+    return DiskCache(CACHE_PATH, "posters", POSTER_INDEX_MAX_ENTRIES)
+
+# Long-lived asyncio event loop running on a daemon thread, one per server
+# process. All Gemini and TMDB I/O runs on it, so in-flight requests cost a
+# coroutine rather than a parked thread. Script threads hand work over with
+# submit() (returns a concurrent.futures.Future) or run() (blocks for the
+# result). Never call run() from a coroutine on the loop itself.
+class AsyncRunner:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="async-io", daemon=True)
+        self.thread.start()
+    
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def run(self, coro, timeout=None):
+        return self.submit(coro).result(timeout)
+
+# Shared event loop, created once per server process
+@st.cache_resource
+def get_async_runner():
+    return AsyncRunner()
+
+# Run a coroutine on the shared event loop and wait for its result
+def run_async(coro, timeout=None):
+    return get_async_runner().run(coro, timeout)
+
+# Consume an async iterator from synchronous code. Items are pumped across
+# from the shared loop through a queue; an exception ends the iteration and
+# is re-raised here. Closing the generator stops the pump.
+def iterate_async(async_iterable):
+    items = queue.Queue()
+    done = object()
+    
+    async def pump():
+        try:
+            async for item in async_iterable:
+                items.put(item)
+        except Exception as e:
+            items.put(e)
+        finally:
+            items.put(done)
+    
+    future = get_async_runner().submit(pump())
     try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # A consumer that stops early cancels the pump, which unwinds the
+        # async iterator and frees what it holds (e.g. a Gemini slot)
+        future.cancel()
+
+# Consume a blocking iterator from a coroutine, fetching each item on a worker
+# thread so the loop stays free
+async def iterate_in_thread(iterable):
+    iterator = iter(iterable)
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+# Process-wide request coalescing ("single flight"). Concurrent calls with the
+# same key share one in-flight task and all get its result; once it finishes
+# the key is free again. Only used from coroutines on the shared loop, so no
+# locking is needed.
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.started = 0
+        self.coalesced = 0
+    
+    async def do(self, key, make_coro):
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coro())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # A waiter that gives up (e.g. times out) must not cancel the call for the others
+        return await asyncio.shield(task)
+
+# Single-flight registry, created once per server process
+@st.cache_resource
+def get_single_flight():
+    return SingleFlight()
+
+# Process-wide Gemini client. Holds one GenerativeModel per generation config,
+# the concurrency semaphore and the per-request timeout.
+class GeminiClient:
+    def __init__(self, api_key):
+        self.available = api_key != "missing"
+        self.models = {}
+        self.slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        self.request_options = {"timeout": GEMINI_TIMEOUT}
+        self._lock = threading.Lock()
+    
+    def model(self, generation_config=None):
+        key = json.dumps(generation_config or {}, sort_keys=True)
+        with self._lock:
+            model = self.models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(GEMINI_MODEL, generation_config=generation_config)
+                self.models[key] = model
+        return model
+    
+    async def generate(self, prompt, generation_config=None):
+        async with self.slots:
+            model = self.model(generation_config)
+            if GEMINI_TRANSPORT == "rest":
+                # The async client has no REST transport; block a worker thread instead
+                return await asyncio.to_thread(model.generate_content, prompt, request_options=self.request_options)
+            return await model.generate_content_async(
+                prompt,
+                request_options=self.request_options
+            )
+    
+    # Start a streamed request and return the response along with an async
+    # iterator over its chunks
+    async def stream(self, prompt, generation_config=None):
+        model = self.model(generation_config)
+        if GEMINI_TRANSPORT == "rest":
+            response = await asyncio.to_thread(
+                model.generate_content,
+                prompt,
+                stream=True,
+                request_options=self.request_options
+            )
+            return response, iterate_in_thread(response)
+        response = await model.generate_content_async(
+            prompt,
+            stream=True,
+            request_options=self.request_options
+        )
+        return response, response
+    
+    # One-token request so the first real call doesn't pay for channel setup
+    async def warm_up(self):
+        try:
+            await self.generate("Reply with OK.", {"max_output_tokens": 1})
+        except Exception as e:
+            set_debug_info(f"Gemini warm-up failed: {e}")
+
+# Recent Gemini latencies per call site, for picking hedge delays, plus
+# counters for hedges and blown budgets
+class GeminiLatency:
+    def __init__(self, window=GEMINI_LATENCY_WINDOW):
+        self.samples = {}
+        self.window = window
+        self.counts = {}
+        self._lock = threading.Lock()
+    
+    def record(self, call_site, latency):
+        with self._lock:
+            self.samples.setdefault(call_site, deque(maxlen=self.window)).append(latency)
+    
+    def count(self, call_site, event):
+        with self._lock:
+            self.counts[(call_site, event)] = self.counts.get((call_site, event), 0) + 1
+    
+    # Nearest-rank percentile of the recent latencies; None until there are
+    # enough of them
+    def percentile(self, call_site, pct):
+        with self._lock:
+            samples = sorted(self.samples.get(call_site, ()))
+        if len(samples) < GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        index = max(int(round(pct / 100 * len(samples) + 0.5)) - 1, 0)
+        return samples[min(index, len(samples) - 1)]
+    
+    # How long to wait on the first attempt before hedging
+    def hedge_delay(self, call_site, budget):
+        delay = self.percentile(call_site, GEMINI_HEDGE_PERCENTILE)
+        if delay is None:
+            delay = budget * GEMINI_HEDGE_COLD_FRACTION
+        return min(max(delay, GEMINI_HEDGE_MIN_DELAY), budget)
+    
+    # Per-site summary, for display
+    def summary(self):
+        with self._lock:
+            sites = set(self.samples) | {call_site for call_site, _ in self.counts}
+            counts = dict(self.counts)
+        return {
+            call_site: {
+                'p50': self.percentile(call_site, 50),
+                'hedge_at': self.percentile(call_site, GEMINI_HEDGE_PERCENTILE),
+                'hedged': counts.get((call_site, 'hedged'), 0),
+                'hedge_won': counts.get((call_site, 'hedge_won'), 0),
+                'over_budget': counts.get((call_site, 'over_budget'), 0)
+            }
+            for call_site in sorted(sites)
+        }
+    
+    # Prometheus text exposition format
+    def export_prometheus(self, prefix="svomo_gemini"):
+        lines = [
+            f"# HELP {prefix}_calls_total Gemini calls that were hedged, won by the hedge, or ran out of budget.",
+            f"# TYPE {prefix}_calls_total counter"
+        ]
+        with self._lock:
+            counts = sorted(self.counts.items())
+        lines += [f'{prefix}_calls_total{{call_site="{site}",event="{event}"}} {count}' for (site, event), count in counts]
+        return "\n".join(lines) + "\n"
+
+# Gemini latency tracker, created once per server process
+@st.cache_resource
+def get_gemini_latency():
+    return GeminiLatency()
+
+# Run one Gemini request within the call site's budget, hedging it once if
+# it is slower than usual. Returns the first response to arrive, or None if
+# the budget ran out. An attempt that fails is ignored while the other one
+# is still running; if both fail the last error is raised. Every call adds
+# one latency sample, timed from the first attempt: calls that ran out of
+# budget count with the time they were given, so a slowdown raises the hedge
+# delay instead of making every call hedge.
+async def hedged_generate(client, prompt, generation_config, call_site):
+    latency = get_gemini_latency()
+    budget = GEMINI_CALL_BUDGETS.get(call_site, GEMINI_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + budget
+    
+    first = asyncio.ensure_future(client.generate(prompt, generation_config))
+    pending = {first}
+    hedge = None
+    error = None
+    with get_tracer().span("gemini_budget", call_site=call_site, budget=budget) as span:
+        try:
+            if GEMINI_HEDGING:
+                done, pending = await asyncio.wait(pending, timeout=latency.hedge_delay(call_site, budget))
+                # A hedge is a real request, so it needs its own admission,
+                # and none are sent once the Gemini bucket is running low
+                controller = get_admission()
+                if not done and controller.tier() == "normal" and controller.admit(admission.GEMINI) == admission.ADMITTED:
+                    latency.count(call_site, 'hedged')
+                    span['hedged'] = True
+                    hedge = asyncio.ensure_future(client.generate(prompt, generation_config))
+                    pending.add(hedge)
+                else:
+                    pending = pending | done
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            latency.count(call_site, 'hedge_won')
+                            span['hedge_won'] = True
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not pending:
+                raise error
+            latency.count(call_site, 'over_budget')
+            span['over_budget'] = True
+            return None
+        finally:
+            latency.record(call_site, min(loop.time(), deadline) - started)
+            # Cancel the loser (or both, past the budget). A REST attempt runs
+            # on a worker thread that finishes on its own; its answer is dropped.
+            for task in (first, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+# Gemini client, created once per server process
+@st.cache_resource
+def get_gemini_client():
+    return GeminiClient(GEMINI_API_KEY)
+
+# Tracer with the process-wide span metrics (and the admission metrics)
+@st.cache_resource
+def get_tracer():
+    tracer = tracing.Tracer("svomo", TRACE_OTEL_LOG_PATH or None, TRACE_PROMETHEUS_PATH or None)
+    tracer.collectors.append(get_admission().export_prometheus)
+    tracer.collectors.append(get_gemini_latency().export_prometheus)
+    index = get_recommendation_cache().index
+    if index is not None:
+        tracer.collectors.append(index.export_prometheus)
+    return tracer
+
+# Admission controller, shared by every session in the process
+@st.cache_resource
+def get_admission():
+    return admission.AdmissionController(
+        {
+            admission.STEPS: (
+                (ADMISSION_STEP_RATE, ADMISSION_STEP_BURST),
+                (ADMISSION_SESSION_STEP_RATE, ADMISSION_SESSION_STEP_BURST)
+            ),
+            admission.GEMINI: (
+                (ADMISSION_GEMINI_RATE, ADMISSION_GEMINI_BURST),
+                (ADMISSION_SESSION_GEMINI_RATE, ADMISSION_SESSION_GEMINI_BURST)
+            ),
+            admission.TMDB: (
+                (ADMISSION_TMDB_RATE, ADMISSION_TMDB_BURST),
+                (ADMISSION_SESSION_TMDB_RATE, ADMISSION_SESSION_TMDB_BURST)
+            )
+        },
+        ADMISSION_SHED_CACHE_LEVEL,
+        ADMISSION_SHED_CANNED_LEVEL
+    )
+
+# Whether optional Gemini work (speculation, descriptions, refreshes) should
+# run; counts it as shed when it shouldn't
+def may_run_optional(what):
+    controller = get_admission()
+    tier = controller.tier()
+    if tier == "normal":
+        return True
+    controller.note_shed(tier, what)
+    return False
+
+# Prompt token and latency counters, shared by every session in the process
+@st.cache_resource
+def get_prompt_usage():
+    return prompts.PromptUsage()
+
+# Fire the Gemini warm-up once per server process, in the background
+@st.cache_resource
+def start_gemini_warmup():
+    client = get_gemini_client()
+    if GEMINI_WARMUP and client.available:
+        return get_async_runner().submit(client.warm_up())
+    return None
+
+# Function to communicate with Gemini API. Identical prompts in flight at the
+# same time (after whitespace normalisation) with the same generation config
+# share one request. `call_site` labels the call in the prompt usage stats.
+async def ask_gemini_async(prompt, generation_config=None, call_site="other"):
+    key = ("gemini", " ".join(prompt.split()), json.dumps(generation_config or {}, sort_keys=True))
+    with get_tracer().span("gemini", call_site=call_site):
+        return await get_single_flight().do(key, lambda: generate_gemini_content(prompt, generation_config, call_site))
+
+# Make the actual Gemini request for ask_gemini_async
+async def generate_gemini_content(prompt, generation_config=None, call_site="other"):
+    try:
+        client = get_gemini_client()
+        
         # Check if API key is missing
-        if GEMINI_API_KEY == "missing":
-            st.session_state.debug_info = "Gemini API key is missing. Using fallback content."
+        if not client.available:
+            set_debug_info("Gemini API key is missing. Using fallback content.")
             return '{"error": "API key missing"}'
-            
-        # Create model and generate content with error handling
-        model = genai.GenerativeModel('gemini-2.0-flash')
         
-        # Safety check before API call
-        if not model:
-            st.session_state.debug_info = "Failed to create Gemini model"
-            return '{"error": "Model creation failed"}'
-            
-        # Generate content with timeout
-        response = model.generate_content(prompt)
+        # Check the session's and the process's Gemini budget
+        if get_admission().admit(admission.GEMINI) != admission.ADMITTED:
+            set_debug_info(f"Gemini call for {call_site} refused by admission control")
+            return '{"error": "Rate limited"}'
+        
+        # Generate content within the call site's budget (the client also
+        # caps concurrency)
+        started = time.monotonic()
+        response = await hedged_generate(client, prompt, generation_config, call_site)
+        if response is None:
+            set_debug_info(f"Gemini call for {call_site} ran out of its latency budget")
+            return '{"error": "Timed out"}'
+        get_prompt_usage().record(call_site, prompt, getattr(response, 'usage_metadata', None), time.monotonic() - started)
         
         # Check if response is valid
         if response and hasattr(response, 'text'):
             return response.text
         else:
-            st.session_state.debug_info = "Empty or invalid response from Gemini"
+            set_debug_info("Empty or invalid response from Gemini")
             return '{"error": "Invalid response"}'
             
     except Exception as e:
-        st.session_state.debug_info = f"Error in ask_gemini: {str(e)}"
+        set_debug_info(f"Error in ask_gemini: {str(e)}")
         # If there's an error, return a placeholder response that can be handled by the caller
         return '{"error": "Failed to generate content"}'
 
-# Function to generate personalized questions based on persona
-def generate_questions(persona):
+def ask_gemini(prompt, generation_config=None, call_site="other"):
+    return run_async(ask_gemini_async(prompt, generation_config, call_site))
+
+# Stream a Gemini response, yielding text chunks as they arrive
+async def ask_gemini_stream_async(prompt, generation_config=None, call_site="other"):
+    client = get_gemini_client()
+    if get_admission().admit(admission.GEMINI) != admission.ADMITTED:
+        # Callers treat an empty stream as a failed one
+        set_debug_info(f"Gemini stream for {call_site} refused by admission control")
+        return
+    # Streams aren't hedged (the caller is already drawing the first one), but
+    # they stop at the call site's budget; the caller keeps whatever arrived
+    budget = GEMINI_CALL_BUDGETS.get(call_site, GEMINI_TIMEOUT)
+    with get_tracer().span("gemini_stream", call_site=call_site) as span:
+        async with client.slots:
+            started = time.monotonic()
+            try:
+                async with asyncio.timeout(budget):
+                    response, chunks = await client.stream(prompt, generation_config)
+                    async for chunk in chunks:
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            # Chunk without text parts (e.g. a safety block)
+                            continue
+                        if text:
+                            yield text
+            except TimeoutError:
+                span['over_budget'] = True
+                get_gemini_latency().count(call_site, 'over_budget')
+                get_gemini_latency().record(call_site, budget)
+                set_debug_info(f"Gemini stream for {call_site} ran out of its latency budget")
+                return
+            get_gemini_latency().record(call_site, time.monotonic() - started)
+            # Usage metadata is only complete once the stream has finished
+            get_prompt_usage().record(call_site, prompt, getattr(response, 'usage_metadata', None), time.monotonic() - started)
+
+# Blocking version of ask_gemini_stream_async. Errors end the stream early;
+# callers handle an empty or partial stream with their fallbacks.
+def ask_gemini_stream(prompt, generation_config=None, call_site="other"):
+    if not get_gemini_client().available:
+        set_debug_info("Gemini API key is missing. Using fallback content.")
+        return
+    
+    try:
+        yield from iterate_async(ask_gemini_stream_async(prompt, generation_config, call_site))
+    except Exception as e:
+        set_debug_info(f"Error in ask_gemini_stream: {str(e)}")
+
+# Incremental parser for a streamed JSON array of objects. feed() takes the
+# next chunk of text and returns the elements that are now complete; anything
+# before the opening bracket (such as a ```json fence) is skipped.
+class JSONArrayStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.position = None
+        self.decoder = json.JSONDecoder()
+    
+    def feed(self, text):
+        self.buffer += text
+        items = []
+        if self.position is None:
+            start = self.buffer.find('[')
+            if start == -1:
+                return items
+            self.position = start + 1
+        
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\r\n,":
+                self.position += 1
+            if self.position >= len(self.buffer) or self.buffer[self.position] == ']':
+                return items
+            try:
+                item, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                # The next element hasn't fully arrived yet
+                return items
+            items.append(item)
+            self.position = end
+    
+    # Title of the element that is still arriving, once its "title" field is complete
+    def pending_title(self):
+        if self.position is None:
+            return None
+        match = re.search(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)"', self.buffer[self.position:])
+        if not match:
+            return None
+        try:
+            return json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            return None
+
+# Pull the JSON value out of a model response. Tolerates ```json fences and
+# prose around the JSON; a truncated array keeps the elements that did arrive.
+# Returns None when there is nothing usable.
+def extract_json(text):
+    if not text:
+        return None
+    text = re.sub(r"```(?:json)?", "", text)
+    starts = [index for index in (text.find('['), text.find('{')) if index != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        return value
+    except ValueError:
+        pass
+    if text[start] == '[':
+        return JSONArrayStreamParser().feed(text[start:]) or None
+    return None
+
+# One question of a question set
+@dataclass(slots=True)
+class Question:
+    question: str
+    options: list
+
+    # Build a Question from parsed JSON, or None if it doesn't have the right shape
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            return None
+        question = data.get('question')
+        options = data.get('options')
+        if not isinstance(question, str) or not question.strip() or not isinstance(options, list):
+            return None
+        options = [option.strip() for option in options if isinstance(option, str) and option.strip()]
+        if len(options) < 2:
+            return None
+        return cls(question.strip(), options)
+
+    def to_dict(self):
+        return {'question': self.question, 'options': list(self.options)}
+
+# One recommendation as returned by Gemini, before TMDB enrichment
+@dataclass(slots=True)
+class Recommendation:
+    title: str
+    type: str
+    reason: str
+    description: str | None = None
+
+    # Build a Recommendation from parsed JSON, or None if it doesn't have the right shape
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            return None
+        title = data.get('title')
+        media_type = str(data.get('type', '')).strip().lower()
+        reason = data.get('reason')
+        description = data.get('description')
+        if not isinstance(title, str) or not title.strip() or media_type not in ("movie", "tv"):
+            return None
+        if not isinstance(reason, str):
+            return None
+        if not isinstance(description, str) or not description.strip():
+            description = None
+        return cls(title.strip(), media_type, reason.strip(), description and description.strip())
+
+    def to_dict(self):
+        rec = {'title': self.title, 'type': self.type, 'reason': self.reason}
+        if self.description:
+            rec['description'] = self.description
+        return rec
+
+# Parse a question-set response. Malformed questions are dropped; returns None
+# unless at least three usable questions remain.
+def parse_questions(response):
+    parsed = extract_json(response)
+    if not isinstance(parsed, list):
+        return None
+    questions = [q for q in map(Question.from_dict, parsed) if q]
+    return questions if len(questions) >= 3 else None
+
+# Parse a recommendations response. Malformed entries are dropped; returns None
+# if none are usable.
+def parse_recommendations(response):
+    parsed = extract_json(response)
+    if not isinstance(parsed, list):
+        return None
+    recommendations = [r for r in map(Recommendation.from_dict, parsed) if r]
+    return recommendations or None
+
+# Response schemas for structured output
+QUESTIONS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "question": {"type": "string"},
+            "options": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["question", "options"]
+    }
+}
+
+RECOMMENDATIONS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "type": {"type": "string", "enum": ["movie", "tv"]},
+            "reason": {"type": "string"},
+            "description": {"type": "string"}
+        },
+        "required": ["title", "type", "reason"]
+    }
+}
+
+# Generation config asking for JSON (matching `schema`, if given), or None
+# when structured output is turned off
+def structured_output_config(schema=None):
+    if not GEMINI_STRUCTURED_OUTPUT:
+        return None
+    config = {"response_mime_type": "application/json"}
+    if schema:
+        config["response_schema"] = schema
+    return config
+
+# Build the Gemini prompt that asks for a persona's question set
+def build_questions_prompt(persona):
+    return prompts.questions_prompt(persona)
+
+# Ask Gemini for a question set. Returns None when the response is unusable;
+# exceptions are left to the caller.
+def request_questions(persona):
+    set_debug_info("Attempting to call Gemini API...")
+    response = ask_gemini(build_questions_prompt(persona), structured_output_config(QUESTIONS_SCHEMA), "questions")
+    set_debug_info(f"Gemini API response received: {response[:100]}...")
+    
+    questions = parse_questions(response)
+    if questions:
+        set_debug_info("Successfully parsed question set")
+        return [q.to_dict() for q in questions]
+    set_debug_info("Response had incorrect structure, using fallback")
+    return None
+
+# Canned question set for a persona, used when Gemini fails or is being shed
+def canned_questions(persona):
     # Fallback questions in case API fails
     fallback_questions = [
         {
@@ -321,192 +1229,1289 @@ def generate_questions(persona):
             "options": ["Shonen/Action", "Slice of Life", "Romance/Drama", "Fantasy/Isekai"]
         }
     
+    return fallback_questions
+
+# Function to generate personalized questions based on persona
+def generate_questions(persona):
+    # Fallback questions in case API fails
+    fallback_questions = canned_questions(persona)
+    
     # Try to get AI-generated questions, fall back if it fails
     try:
-        prompt = f"""
-        Generate a sequence of 8 personalized questions to recommend movies or shows based on this persona: {persona}.
-        
-        Each question should have 2-4 options for the user to choose from. Format your response as a JSON array of objects, 
-        where each object has 'question' and 'options' fields. The options should be an array of strings.
-        
-        Make sure questions cover: mood, watching companions, available time, content preferences (movie/series length), 
-        thematic interests, age of content (new releases vs classics), and preferred languages/regions.
-        
-        Example format:
-        [
-            {{
-                "question": "Are you watching alone or with someone?",
-                "options": ["Alone", "With friends", "With family", "With a date"]
-            }}
-        ]
-        
-        IMPORTANT: Return ONLY valid JSON without any explanation or additional text.
-        """
-        
-        st.session_state.debug_info = "Attempting to call Gemini API..."
-        response = ask_gemini(prompt)
-        st.session_state.debug_info = f"Gemini API response received: {response[:100]}..."
-        
-        parsed_response = json.loads(response)
-        st.session_state.debug_info = "Successfully parsed JSON response"
-        
-        # Verify the structure is correct
-        if (isinstance(parsed_response, list) and 
-            all('question' in q and 'options' in q for q in parsed_response) and
-            len(parsed_response) >= 3):
-            return parsed_response
-        else:
-            st.session_state.debug_info = "Response had incorrect structure, using fallback"
-            return fallback_questions
+        questions = request_questions(persona)
+        return questions if questions else fallback_questions
             
     except Exception as e:
-        st.session_state.debug_info = f"Error in generate_questions: {str(e)}"
+        set_debug_info(f"Error in generate_questions: {str(e)}")
         st.error(f"Error generating questions: {e}")
         return fallback_questions
 
+# Default recommendations for different personas if API fails
+DEFAULT_RECOMMENDATIONS = {
+    "Anime Fan": [
+        {"title": "Spirited Away", "type": "movie", "reason": "A classic anime film with beautiful animation and a compelling story."},
+        {"title": "Attack on Titan", "type": "tv", "reason": "An intense action anime with complex characters and an engaging plot."},
+        {"title": "Your Name", "type": "movie", "reason": "A beautiful anime romance with stunning visuals and emotional depth."}
+    ],
+    "Hollywood Movie Enthusiast": [
+        {"title": "The Shawshank Redemption", "type": "movie", "reason": "A classic drama about hope and perseverance with excellent performances."},
+        {"title": "Inception", "type": "movie", "reason": "A mind-bending thriller with stunning visuals and an intricate plot."},
+        {"title": "The Dark Knight", "type": "movie", "reason": "An exceptional superhero film with outstanding performances and direction."}
+    ],
+    "Bollywood Fan": [
+        {"title": "3 Idiots", "type": "movie", "reason": "A heartwarming story about friendship, education, and following your passion."},
+        {"title": "Dangal", "type": "movie", "reason": "An inspiring sports drama based on a true story with exceptional performances."},
+        {"title": "Lagaan", "type": "movie", "reason": "A classic period drama that combines sports, romance, and social commentary."}
+    ],
+    "K-Drama Lover": [
+        {"title": "Crash Landing on You", "type": "tv", "reason": "A romantic drama with political elements and charming performances."},
+        {"title": "Squid Game", "type": "tv", "reason": "A thrilling survival drama with social commentary and unexpected twists."},
+        {"title": "Goblin", "type": "tv", "reason": "A fantasy romance with emotional depth and supernatural elements."}
+    ],
+    "TV Series Binger": [
+        {"title": "Breaking Bad", "type": "tv", "reason": "A gripping drama about a chemistry teacher turned drug manufacturer."},
+        {"title": "Stranger Things", "type": "tv", "reason": "A nostalgic series with supernatural elements and compelling characters."},
+        {"title": "The Crown", "type": "tv", "reason": "A historical drama about the British royal family with excellent performances."}
+    ],
+    "Indie Film Appreciator": [
+        {"title": "Parasite", "type": "movie", "reason": "A thought-provoking social commentary with unexpected twists and excellent direction."},
+        {"title": "Moonlight", "type": "movie", "reason": "A beautiful coming-of-age story with excellent performances and direction."},
+        {"title": "Lady Bird", "type": "movie", "reason": "A heartfelt coming-of-age story with authentic characters and relationships."}
+    ]
+}
+
+# Build the Gemini prompt that asks for recommendations. In inline mode the
+# descriptions come back with the recommendations.
+def build_recommendation_prompt(persona, questions, answers):
+    return prompts.recommendations_prompt(
+        persona,
+        [(q['question'], a) for q, a in zip(questions, answers)],
+        inline_descriptions=GEMINI_DESCRIPTION_MODE == "inline"
+    )
+
 # Function to get movie recommendations based on user responses
 def get_recommendations(persona, questions, answers):
     # Default recommendations for different personas if API fails
-    default_recommendations = {
-        "Anime Fan": [
-            {"title": "Spirited Away", "type": "movie", "reason": "A classic anime film with beautiful animation and a compelling story."},
-            {"title": "Attack on Titan", "type": "tv", "reason": "An intense action anime with complex characters and an engaging plot."},
-            {"title": "Your Name", "type": "movie", "reason": "A beautiful anime romance with stunning visuals and emotional depth."}
-        ],
-        "Hollywood Movie Enthusiast": [
-            {"title": "The Shawshank Redemption", "type": "movie", "reason": "A classic drama about hope and perseverance with excellent performances."},
-            {"title": "Inception", "type": "movie", "reason": "A mind-bending thriller with stunning visuals and an intricate plot."},
-            {"title": "The Dark Knight", "type": "movie", "reason": "An exceptional superhero film with outstanding performances and direction."}
-        ],
-        "Bollywood Fan": [
-            {"title": "3 Idiots", "type": "movie", "reason": "A heartwarming story about friendship, education, and following your passion."},
-            {"title": "Dangal", "type": "movie", "reason": "An inspiring sports drama based on a true story with exceptional performances."},
-            {"title": "Lagaan", "type": "movie", "reason": "A classic period drama that combines sports, romance, and social commentary."}
-        ],
-        "K-Drama Lover": [
-            {"title": "Crash Landing on You", "type": "tv", "reason": "A romantic drama with political elements and charming performances."},
-            {"title": "Squid Game", "type": "tv", "reason": "A thrilling survival drama with social commentary and unexpected twists."},
-            {"title": "Goblin", "type": "tv", "reason": "A fantasy romance with emotional depth and supernatural elements."}
-        ],
-        "TV Series Binger": [
-            {"title": "Breaking Bad", "type": "tv", "reason": "A gripping drama about a chemistry teacher turned drug manufacturer."},
-            {"title": "Stranger Things", "type": "tv", "reason": "A nostalgic series with supernatural elements and compelling characters."},
-            {"title": "The Crown", "type": "tv", "reason": "A historical drama about the British royal family with excellent performances."}
-        ],
-        "Indie Film Appreciator": [
-            {"title": "Parasite", "type": "movie", "reason": "A thought-provoking social commentary with unexpected twists and excellent direction."},
-            {"title": "Moonlight", "type": "movie", "reason": "A beautiful coming-of-age story with excellent performances and direction."},
-            {"title": "Lady Bird", "type": "movie", "reason": "A heartfelt coming-of-age story with authentic characters and relationships."}
-        ]
-    }
+    default_recommendations = DEFAULT_RECOMMENDATIONS
     
     # Create a detailed prompt for Gemini to generate recommendations
-    answers_text = "\n".join([f"Q: {q['question']}\nA: {a}" for q, a in zip(questions, answers)])
+    prompt = build_recommendation_prompt(persona, questions, answers)
     
-    prompt = f"""
-    Based on the following user persona and preferences, recommend exactly 3 movies or TV shows.
+    try:
+        set_debug_info("Attempting to get recommendations from Gemini API...")
+        response = ask_gemini(prompt, structured_output_config(RECOMMENDATIONS_SCHEMA), "recommendations")
+        set_debug_info(f"Gemini API response received: {response[:100]}...")
+        
+        recommendations = parse_recommendations(response)
+        if recommendations:
+            set_debug_info("Successfully parsed recommendations")
+            return [r.to_dict() for r in recommendations]
+        else:
+            set_debug_info("Response had incorrect structure, using fallback recommendations")
+            return default_recommendations.get(persona, default_recommendations["Hollywood Movie Enthusiast"])
+            
+    except Exception as e:
+        set_debug_info(f"Error in get_recommendations: {str(e)}")
+        st.error(f"Error generating recommendations: {e}")
+        return default_recommendations.get(persona, default_recommendations["Hollywood Movie Enthusiast"])
+
+# Stream recommendations from Gemini. Yields ("title", index, title) as soon as
+# a recommendation's title is readable and ("recommendation", index, rec) once
+# the whole object has arrived. Falls back to the persona's default list if the
+# stream produces nothing usable.
+def stream_recommendations(persona, questions, answers, limit=3):
+    prompt = build_recommendation_prompt(persona, questions, answers)
+    parser = JSONArrayStreamParser()
+    count = 0
+    announced = -1
     
-    User Persona: {persona}
+    set_debug_info("Streaming recommendations from Gemini API...")
+    for chunk in ask_gemini_stream(prompt, structured_output_config(RECOMMENDATIONS_SCHEMA), "recommendations"):
+        for item in parser.feed(chunk):
+            if count >= limit:
+                break
+            rec = Recommendation.from_dict(item)
+            if rec:
+                yield ("recommendation", count, rec.to_dict())
+                count += 1
+        if count >= limit:
+            break
+        title = parser.pending_title()
+        if title and announced < count:
+            announced = count
+            yield ("title", count, title)
     
-    User Preferences:
-    {answers_text}
+    if count == 0:
+        set_debug_info("Streamed response had no usable recommendations, using fallback recommendations")
+        for i, rec in enumerate(DEFAULT_RECOMMENDATIONS.get(persona, DEFAULT_RECOMMENDATIONS["Hollywood Movie Enthusiast"])):
+            yield ("recommendation", i, rec)
+
+# Circuit breaker: after `failure_threshold` failures in a row the circuit opens
+# and calls are refused for `cooldown` seconds. After that a single trial call
+# is let through; its outcome closes the circuit again or re-opens it.
+class CircuitBreaker:
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
     
-    For each recommendation, provide:
-    1. Title (exactly as it would appear in TheMovieDB)
-    2. Media type ("movie" or "tv")
-    3. A brief explanation of why this recommendation matches the user's preferences (2-3 sentences max)
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return "open"
+            return "half-open"
     
-    Format your response as a JSON array of objects with 'title', 'type', and 'reason' fields.
+    # False if the call is refused, "trial" if it is the half-open trial call
+    # (which must end in record_success, record_failure or release_trial),
+    # True otherwise
+    def allow_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return "trial"
     
-    Example:
-    [
-        {{
-            "title": "Inception",
-            "type": "movie",
-            "reason": "This mind-bending sci-fi thriller matches your interest in complex plots and psychological themes."
-        }}
-    ]
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
     
-    IMPORTANT: Return ONLY valid JSON without any explanation or additional text.
-    """
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
     
-    try:
-        st.session_state.debug_info = "Attempting to get recommendations from Gemini API..."
-        response = ask_gemini(prompt)
-        st.session_state.debug_info = f"Gemini API response received: {response[:100]}..."
+    # Give back a half-open trial that ended without an outcome (e.g. it was
+    # cancelled), so the next request can try again
+    def release_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+# Process-wide TMDB client built on httpx.AsyncClient, which keeps a pool of
+# keep-alive connections on the shared event loop. Requests that fail or come
+# back 429/5xx are retried with jittered exponential backoff, honouring
+# Retry-After. get() is a blocking wrapper around get_async().
+class TMDBClient:
+    def __init__(self, api_key):
+        self.headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        self.client = None
+        self.breaker = CircuitBreaker(TMDB_BREAKER_THRESHOLD, TMDB_BREAKER_COOLDOWN)
+    
+    # The httpx client is tied to the event loop it first runs on, so it is
+    # created lazily from inside the shared loop
+    def _client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=TMDB_API_BASE,
+                headers=self.headers,
+                timeout=httpx.Timeout(TMDB_READ_TIMEOUT, connect=TMDB_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=ENRICHMENT_MAX_WORKERS,
+                    max_keepalive_connections=ENRICHMENT_MAX_WORKERS
+                )
+            )
+        return self.client
+    
+    # Seconds to wait before retry number `attempt` (0-based)
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), TMDB_MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+    
+    # GET a TMDB endpoint. Returns the response, or None when the request failed
+    # or the circuit is open (callers then fall back to the placeholder card).
+    async def get_async(self, path, params=None):
+        if get_admission().admit(admission.TMDB) != admission.ADMITTED:
+            set_debug_info(f"TMDB request to {path} refused by admission control")
+            return None
+        allowed = self.breaker.allow_request()
+        if not allowed:
+            return None
+        try:
+            return await self._get_with_retries(path, params)
+        finally:
+            # A trial that was cancelled (or raised) never recorded an
+            # outcome; without this the circuit would stay half-open for good
+            if allowed == "trial":
+                self.breaker.release_trial()
+    
+    # Retries stop at TMDB_MAX_RETRIES or when the next attempt wouldn't fit
+    # in TMDB_REQUEST_BUDGET; each attempt's timeouts are cut to what is left
+    async def _get_with_retries(self, path, params):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + TMDB_REQUEST_BUDGET
         
-        parsed_response = json.loads(response)
-        st.session_state.debug_info = "Successfully parsed JSON response for recommendations"
+        def can_retry(attempt, delay):
+            return attempt < TMDB_MAX_RETRIES and loop.time() + delay + TMDB_MIN_ATTEMPT_TIME <= deadline
         
-        # Verify the structure is correct
-        if (isinstance(parsed_response, list) and 
-            all('title' in r and 'type' in r and 'reason' in r for r in parsed_response) and
-            len(parsed_response) >= 1):
-            return parsed_response
+        for attempt in range(TMDB_MAX_RETRIES + 1):
+            remaining = max(deadline - loop.time(), TMDB_MIN_ATTEMPT_TIME)
+            timeout = httpx.Timeout(min(TMDB_READ_TIMEOUT, remaining), connect=min(TMDB_CONNECT_TIMEOUT, remaining))
+            try:
+                response = await self._client().get(path, params=params, timeout=timeout)
+            except httpx.HTTPError as e:
+                delay = self._backoff(attempt)
+                if can_retry(attempt, delay):
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_failure()
+                set_debug_info(f"TMDB request to {path} failed: {e}")
+                return None
+            if response.status_code in TMDB_RETRY_STATUSES:
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                if can_retry(attempt, delay):
+                    await asyncio.sleep(delay)
+                    continue
+            break
+        
+        if response.status_code in TMDB_RETRY_STATUSES:
+            self.breaker.record_failure()
         else:
-            st.session_state.debug_info = "Response had incorrect structure, using fallback recommendations"
-            return default_recommendations.get(persona, default_recommendations["Hollywood Movie Enthusiast"])
-            
+            self.breaker.record_success()
+        return response
+    
+    def get(self, path, params=None):
+        return run_async(self.get_async(path, params))
+
+# TMDB client, created once per server process
+@st.cache_resource
+def get_tmdb_client():
+    return TMDBClient(TMDB_API_KEY)
+
+# Image downloads. TMDB's image CDN needs no API key, so this is a plain
+# pooled client, created lazily on the shared loop like the TMDB one.
+class ImageClient:
+    def __init__(self):
+        self.client = None
+    
+    async def fetch(self, url):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(POSTER_FETCH_TIMEOUT, connect=TMDB_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=ENRICHMENT_MAX_WORKERS,
+                    max_keepalive_connections=ENRICHMENT_MAX_WORKERS
+                ),
+                follow_redirects=True
+            )
+        response = await self.client.get(url)
+        response.raise_for_status()
+        return response.content
+
+# Image client, created once per server process
+@st.cache_resource
+def get_image_client():
+    return ImageClient()
+
+# Local content key for a poster image, fetching and resizing it the first
+# time it is seen. None if it couldn't be fetched or decoded.
+async def prepare_poster_async(source_url):
+    key = await get_poster_index().get_async(source_url)
+    if key is not CACHE_MISS and await asyncio.to_thread(get_poster_store().has, key):
+        return key
+    with get_tracer().span("poster"):
+        try:
+            return await get_single_flight().do(("poster", source_url), lambda: download_poster(source_url))
+        except Exception as e:
+            set_debug_info(f"Poster {source_url} unavailable: {e}")
+            return None
+
+# Fetch a poster and store its variants, for prepare_poster_async
+async def download_poster(source_url):
+    data = await get_image_client().fetch(source_url)
+    # Resizing is CPU work; keep it off the event loop
+    key = await asyncio.to_thread(get_poster_store().add, data)
+    await get_poster_index().set_async(source_url, key, POSTER_INDEX_TTL)
+    return key
+
+# Placeholder poster image, fetched once per process (drawn if that fails)
+@st.cache_resource
+def get_placeholder_image():
+    try:
+        response = httpx.get(POSTER_PLACEHOLDER_SOURCE, timeout=POSTER_PLACEHOLDER_TIMEOUT, follow_redirects=True)
+        response.raise_for_status()
+        # Make sure it decodes before every page depends on it
+        posters.render_variants(response.content, widths=posters.POSTER_WIDTHS[:1])
+        return response.content
     except Exception as e:
-        st.session_state.debug_info = f"Error in get_recommendations: {str(e)}"
-        st.error(f"Error generating recommendations: {e}")
-        return default_recommendations.get(persona, default_recommendations["Hollywood Movie Enthusiast"])
+        set_debug_info(f"Couldn't fetch the placeholder poster, drawing one: {e}")
+        return posters.draw_placeholder()
+
+# Content key of the placeholder poster, storing it again if it was evicted
+def get_placeholder_poster():
+    return get_poster_store().add(get_placeholder_image())
 
 # Function to search for movie/TV show details from TMDB
-def search_tmdb(title, media_type):
-    url = f"https://api.themoviedb.org/3/search/{media_type}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {TMDB_API_KEY}"
-    }
-    params = {
-        "query": title,
-        "include_adult": "false",
-        "language": "en-US",
-        "page": "1"
-    }
-    
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
+async def search_tmdb_async(title, media_type):
+    with get_tracer().span("tmdb_search", media_type=media_type) as span:
+        cache = get_tmdb_cache()
+        cache_key = ["search", media_type, " ".join(title.casefold().split()), TMDB_LANGUAGE]
+        cached = await cache.get_async(cache_key)
+        span['cache'] = "hit" if cached is not CACHE_MISS else "miss"
+        if cached is not CACHE_MISS:
+            return cached
+        
+        params = {
+            "query": title,
+            "include_adult": "false",
+            "language": TMDB_LANGUAGE,
+            "page": "1"
+        }
+        
+        return await get_single_flight().do(
+            tuple(cache_key),
+            lambda: fetch_tmdb_search(cache_key, media_type, params)
+        )
+
+# Network half of search_tmdb_async; concurrent identical searches share one call
+async def fetch_tmdb_search(cache_key, media_type, params):
+    cache = get_tmdb_cache()
+    response = await get_tmdb_client().get_async(f"/search/{media_type}", params=params)
+    if response is not None and response.status_code == 200:
         results = response.json().get('results', [])
         if results:
+            await cache.set_async(cache_key, results[0], TMDB_CACHE_TTL)
             return results[0]  # Return the first (most relevant) result
+        # Remember that nothing matched so we don't ask again straight away
+        await cache.set_async(cache_key, None, TMDB_NEGATIVE_CACHE_TTL)
     return None
 
-# Function to get full details for a movie or TV show
-def get_tmdb_details(item_id, media_type):
-    url = f"https://api.themoviedb.org/3/{media_type}/{item_id}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {TMDB_API_KEY}"
-    }
-    
-    response = requests.get(url, headers=headers)
+def search_tmdb(title, media_type):
+    return run_async(search_tmdb_async(title, media_type))
+
+# Function to get full details for a movie or TV show. Extra sub-requests
+# (e.g. "images") can be folded into the same round trip via append_to_response.
+async def get_tmdb_details_async(item_id, media_type, append_to_response=None):
+    with get_tracer().span("tmdb_details", media_type=media_type) as span:
+        cache = get_tmdb_cache()
+        cache_key = ["details", media_type, str(item_id), TMDB_LANGUAGE, append_to_response or ""]
+        cached = await cache.get_async(cache_key)
+        span['cache'] = "hit" if cached is not CACHE_MISS else "miss"
+        if cached is not CACHE_MISS:
+            return cached
+        
+        params = {
+            "language": TMDB_LANGUAGE
+        }
+        if append_to_response:
+            params["append_to_response"] = append_to_response
+            # Keep posters without a language tag, which is most of them
+            params["include_image_language"] = f"{TMDB_LANGUAGE.split('-')[0]},null"
+        
+        return await get_single_flight().do(
+            tuple(cache_key),
+            lambda: fetch_tmdb_details(cache_key, media_type, item_id, params)
+        )
+
+# Network half of get_tmdb_details_async; concurrent identical lookups share one call
+async def fetch_tmdb_details(cache_key, media_type, item_id, params):
+    cache = get_tmdb_cache()
+    response = await get_tmdb_client().get_async(f"/{media_type}/{item_id}", params=params)
+    if response is None:
+        return None
     if response.status_code == 200:
-        return response.json()
+        details = response.json()
+        await cache.set_async(cache_key, details, TMDB_CACHE_TTL)
+        return details
+    if response.status_code == 404:
+        await cache.set_async(cache_key, None, TMDB_NEGATIVE_CACHE_TTL)
     return None
 
-# Function to generate AI description for a movie/show
+def get_tmdb_details(item_id, media_type, append_to_response=None):
+    return run_async(get_tmdb_details_async(item_id, media_type, append_to_response))
+
+# List the fields the results card needs that are empty or absent in a TMDB item
+def missing_card_fields(item, media_type):
+    if media_type == 'movie':
+        fields = ('poster_path', 'overview', 'title', 'release_date')
+    else:
+        fields = ('poster_path', 'overview', 'name', 'first_air_date')
+    return [field for field in fields if not item.get(field)]
+
+# Resolve the TMDB data for a search hit. In lean mode the hit is used as-is
+# when it already has everything the card shows; otherwise one details call
+# (with TMDB_DETAILS_APPEND) fills in the gaps.
+async def resolve_tmdb_item_async(result, media_type):
+    if TMDB_LEAN_ENRICHMENT and not missing_card_fields(result, media_type):
+        return result
+    
+    details = await get_tmdb_details_async(
+        result.get('id'),
+        media_type,
+        append_to_response=TMDB_DETAILS_APPEND if TMDB_LEAN_ENRICHMENT else None
+    )
+    if not details:
+        # Fall back to whatever the search hit had
+        return result if TMDB_LEAN_ENRICHMENT else None
+    
+    item = {**result, **{key: value for key, value in details.items() if value}}
+    if not item.get('poster_path'):
+        item['poster_path'] = poster_from_images(details)
+    return item
+
+# First poster from an append_to_response=images payload, if any
+def poster_from_images(details):
+    posters = (details.get('images') or {}).get('posters') or []
+    return posters[0].get('file_path') if posters else None
+
+# Local catalog index, opened once per server process (None until imported)
+@st.cache_resource
+def get_tmdb_catalog():
+    catalog = TMDBCatalog(TMDB_CATALOG_PATH, TMDB_CATALOG_FUZZY_THRESHOLD, TMDB_CATALOG_MIN_POPULARITY)
+    return catalog if catalog.available() else None
+
+# Whether TMDB details are for the title that was asked for: the localized or
+# the original title has to match it
+def details_match_title(details, title, media_type):
+    names = (details.get('title'), details.get('original_title')) if media_type == 'movie' else (details.get('name'), details.get('original_name'))
+    return any(name and title_similarity(name, title) >= TMDB_CATALOG_FUZZY_THRESHOLD for name in names)
+
+# Find the TMDB data for a title. The local catalog is tried first: a hit needs
+# only the (cached) details call, and if TMDB is down the card is built from
+# the catalog entry alone. On a catalog miss, or a hit whose details turn out
+# to be for another title, this falls back to /search.
+async def find_tmdb_item_async(title, media_type):
+    catalog = get_tmdb_catalog()
+    entry = await asyncio.to_thread(catalog.lookup, title, media_type) if catalog else None
+    if entry:
+        details = await get_tmdb_details_async(entry['id'], media_type, append_to_response=TMDB_DETAILS_APPEND)
+        if details and details_match_title(details, title, media_type):
+            if not details.get('poster_path'):
+                details = {**details, 'poster_path': poster_from_images(details)}
+            return details
+        if details:
+            set_debug_info(f"Catalog match for {title} is {entry['title']} ({entry['id']}), not the title asked for")
+        elif get_tmdb_client().breaker.state != "closed":
+            # Degraded mode: TMDB is unhealthy, so render from the index alone
+            date = str(entry['year']) if entry['year'] else ''
+            if media_type == 'movie':
+                return {'id': entry['id'], 'title': entry['title'], 'release_date': date, 'degraded': True}
+            return {'id': entry['id'], 'name': entry['title'], 'first_air_date': date, 'degraded': True}
+    
+    # Search for the title in TMDB
+    result = await search_tmdb_async(title, media_type)
+    if not result:
+        return None
+    # Get full details (only fetched when the search hit is incomplete)
+    return await resolve_tmdb_item_async(result, media_type)
+
+# Check whether ask_gemini returned its error placeholder instead of content
+def is_gemini_error(response):
+    try:
+        parsed = json.loads(response)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(parsed, dict) and set(parsed) == {"error"}
+
+# Description used when Gemini can't write one
+def fallback_description(overview, reason):
+    return overview[:150] + "..." if overview else reason
+
+# Description cache key for a title. The overview stands in for the TMDB
+# item, so a title that resolves differently gets a new description.
+def description_cache_key(title, media_type, overview, reason):
+    return [
+        "description",
+        GEMINI_MODEL,
+        normalize_text(title),
+        media_type.lower(),
+        hashlib.sha256((overview or "").encode()).hexdigest()[:16],
+        normalize_text(reason)
+    ]
+
+# Function to generate AI description for a movie/show. Returns None when
+# Gemini can't write one (or is being shed); callers fall back to
+# fallback_description() and mark the card as degraded.
+async def generate_ai_description_async(title, overview, media_type, reason):
+    cache = get_description_cache()
+    cache_key = description_cache_key(title, media_type, overview, reason)
+    prompt = prompts.description_prompt(title, media_type, overview, reason)
+    
+    with get_tracer().span("ai_description", media_type=media_type) as span:
+        cached = await cache.get_async(cache_key)
+        span['cache'] = "hit" if cached is not CACHE_MISS else "miss"
+        if cached is not CACHE_MISS:
+            return cached
+        if not may_run_optional("description"):
+            return None
+        try:
+            response = await ask_gemini_async(prompt, call_site="description")
+            if is_gemini_error(response):
+                return None
+            await cache.set_async(cache_key, response, DESCRIPTION_CACHE_TTL)
+            return response
+        except Exception as e:
+            return None
+
 def generate_ai_description(title, overview, media_type, reason):
-    prompt = f"""
-    Create a brief, engaging description for this {media_type}:
+    return run_async(generate_ai_description_async(title, overview, media_type, reason))
+
+# Generate AI descriptions for several titles with a single Gemini call.
+# `items` is a list of dicts with title, overview, media_type and reason.
+# Returns a dict mapping each item's index to its description; items the
+# model skipped or answered badly are left out so the caller can retry them.
+async def generate_ai_descriptions_async(items):
+    prompt = prompts.batch_description_prompt(items)
+    
+    with get_tracer().span("ai_descriptions", items=len(items)):
+        response = await ask_gemini_async(prompt, structured_output_config(), "batch_description")
+    if is_gemini_error(response):
+        return None
+    parsed_response = extract_json(response)
+    if not isinstance(parsed_response, dict):
+        set_debug_info("Batch description response was not a JSON object")
+        return {}
+    
+    descriptions = {}
+    for i in range(len(items)):
+        description = parsed_response.get(str(i))
+        if isinstance(description, str) and description.strip():
+            descriptions[i] = description.strip()
+    return descriptions
+
+def generate_ai_descriptions(items):
+    return run_async(generate_ai_descriptions_async(items))
+
+# Build the card shown when TMDB has no match for a title. Cards marked
+# 'degraded' (this one, or one whose description fell back to the overview)
+# or 'canned' (enriched from the canned lists) keep their results page out of
+# the recommendation cache and out of shared recommendation jobs.
+def build_fallback_recommendation(title, media_type, reason):
+    return {
+        'title': title,
+        'poster': None,
+        'poster_url': None,
+        'year': '',
+        'overview': '',
+        'ai_description': reason,
+        'media_type': media_type.title(),
+        'reason': reason,
+        'degraded': True
+    }
+
+# Limits how many titles are enriched at once across the whole process
+@st.cache_resource
+def get_enrichment_slots():
+    return asyncio.Semaphore(ENRICHMENT_MAX_WORKERS)
+
+# Look up a single recommendation in TMDB and write its AI description. With
+# describe=False the card is returned with ai_description set to None so the
+# descriptions can be written in one batch afterwards.
+async def enrich_recommendation_async(rec, describe=True):
+    title = rec.get('title')
+    media_type = rec.get('type', 'movie')  # Default to movie if not specified
+    reason = rec.get('reason', '')
+    
+    # Resolve the title locally or through TMDB search
+    async with get_enrichment_slots():
+        details = await find_tmdb_item_async(title, media_type)
+    if not details:
+        return build_fallback_recommendation(title, media_type, reason)
     
-    Title: {title}
-    Original Overview: {overview}
-    Recommendation Reason: {reason}
+    # Extract relevant information. The poster is prepared while the
+    # description is being written.
+    poster_path = details.get('poster_path')
+    poster_url = f"{TMDB_IMAGE_BASE}/{POSTER_SOURCE_SIZE}{poster_path}" if poster_path else None
+    poster_task = asyncio.ensure_future(prepare_poster_async(poster_url)) if poster_url else None
     
-    Write a concise (maximum 2-3 sentences) and appealing description that highlights why this would be enjoyable
-    based on the recommendation reason. Use a retro-futuristic tone with vibrant language.
-    """
+    overview = details.get('overview', '')
     
+    # For movies, get release year; for TV shows, get first air date year
+    year = ""
+    if media_type == 'movie' and 'release_date' in details:
+        year = details['release_date'][:4] if details.get('release_date') else ''
+    elif media_type == 'tv' and 'first_air_date' in details:
+        year = details['first_air_date'][:4] if details.get('first_air_date') else ''
+    
+    # Generate AI description, unless Gemini already wrote one with the
+    # recommendation. Uses the TMDB title, like the batched descriptions, so
+    # both share cache entries.
+    ai_description = rec.get('description')
+    degraded = details.get('degraded', False)
+    if not ai_description and describe:
+        tmdb_title = (details.get('title') if media_type == 'movie' else details.get('name')) or title
+        ai_description = await generate_ai_description_async(tmdb_title, overview, media_type, reason)
+        if ai_description is None:
+            ai_description = fallback_description(overview, reason)
+            degraded = True
+    poster = await poster_task if poster_task else None
+    
+    return {
+        'title': details.get('title') if media_type == 'movie' else details.get('name'),
+        'poster': poster,
+        'poster_url': poster_url,
+        'year': year,
+        'overview': overview,
+        'ai_description': ai_description,
+        'media_type': media_type.title(),
+        'reason': reason,
+        'degraded': degraded,
+        'canned': is_canned_recommendation(rec)
+    }
+
+def enrich_recommendation(rec, describe=True):
+    return run_async(enrich_recommendation_async(rec, describe))
+
+# Fill in the AI descriptions that enrichment left empty, from the
+# description cache or with one batched Gemini call. Titles the batch answer
+# doesn't cover are described one by one.
+async def describe_recommendations_async(detailed_recommendations):
+    cache = get_description_cache()
+    pending = []
+    for i, rec in enumerate(detailed_recommendations):
+        if rec['ai_description'] is not None:
+            continue
+        cached = await cache.get_async(description_cache_key(rec['title'], rec['media_type'], rec['overview'], rec['reason']))
+        if cached is CACHE_MISS:
+            pending.append(i)
+        else:
+            rec['ai_description'] = cached
+    if not pending:
+        return detailed_recommendations
+    if not may_run_optional("description"):
+        for i in pending:
+            rec = detailed_recommendations[i]
+            rec['ai_description'] = fallback_description(rec['overview'], rec['reason'])
+            rec['degraded'] = True
+        return detailed_recommendations
+    
+    items = [
+        {
+            'title': detailed_recommendations[i]['title'],
+            'overview': detailed_recommendations[i]['overview'],
+            'media_type': detailed_recommendations[i]['media_type'].lower(),
+            'reason': detailed_recommendations[i]['reason']
+        }
+        for i in pending
+    ]
+    descriptions = await generate_ai_descriptions_async(items)
+    
+    if descriptions is None:
+        # Gemini is unavailable; per-title calls would fail the same way
+        descriptions = {}
+        retry = []
+    else:
+        retry = [j for j in range(len(items)) if j not in descriptions]
+        for j, description in descriptions.items():
+            await cache.set_async(
+                description_cache_key(items[j]['title'], items[j]['media_type'], items[j]['overview'], items[j]['reason']),
+                description,
+                DESCRIPTION_CACHE_TTL
+            )
+    
+    if retry:
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(
+                    generate_ai_description_async(
+                        items[j]['title'], items[j]['overview'], items[j]['media_type'], items[j]['reason']
+                    )
+                    for j in retry
+                )),
+                ENRICHMENT_TIMEOUT
+            )
+            descriptions.update(zip(retry, results))
+        except asyncio.TimeoutError:
+            set_debug_info("Per-title descriptions took too long, using overviews")
+    
+    for j, i in enumerate(pending):
+        rec = detailed_recommendations[i]
+        if descriptions.get(j):
+            rec['ai_description'] = descriptions[j]
+        else:
+            rec['ai_description'] = fallback_description(rec['overview'], rec['reason'])
+            rec['degraded'] = True
+    return detailed_recommendations
+
+def describe_recommendations(detailed_recommendations):
+    return run_async(describe_recommendations_async(detailed_recommendations))
+
+# Enrich all recommendations at the same time. The output keeps the input order,
+# and a title that fails or runs past ENRICHMENT_TIMEOUT gets a fallback card
+# instead of holding up the others.
+async def enrich_recommendations_async(recommendations):
+    describe = GEMINI_DESCRIPTION_MODE == "per_item"
+    
+    async def enrich_or_fallback(rec):
+        try:
+            return await asyncio.wait_for(enrich_recommendation_async(rec, describe), ENRICHMENT_TIMEOUT)
+        except Exception as e:
+            set_debug_info(f"Error enriching {rec.get('title')}: {e!r}")
+            return build_fallback_recommendation(rec.get('title'), rec.get('type', 'movie'), rec.get('reason', ''))
+    
+    detailed_recommendations = await asyncio.gather(*(enrich_or_fallback(rec) for rec in recommendations))
+    return await describe_recommendations_async(list(detailed_recommendations))
+
+def enrich_recommendations(recommendations):
+    return run_async(enrich_recommendations_async(recommendations))
+
+# Canonical, whitespace- and case-insensitive form of a question or answer
+def normalize_text(text):
+    return " ".join(str(text).casefold().split())
+
+# Hash of a persona and its normalized question/answer pairs, identifying one
+# recommendation request
+def recommendation_signature(persona, questions, answers):
+    signature = json.dumps({
+        'persona': persona,
+        'answers': [
+            [normalize_text(q['question']), normalize_text(a)]
+            for q, a in zip(questions, answers)
+        ],
+        'version': RECOMMENDATION_PROMPT_VERSION
+    }, sort_keys=True)
+    return hashlib.sha256(signature.encode()).hexdigest()
+
+# Question/answer pairs as stored with a cached results page, so the semantic
+# index can be rebuilt from the disk cache
+def recommendation_prompt(persona, questions, answers):
+    return {'persona': persona, 'pairs': [[q['question'], a] for q, a in zip(questions, answers)]}
+
+# Semantic cache group and question vectors of a recommendation_prompt().
+# The answers are part of the group, so they always have to match exactly.
+def embed_recommendation_prompt(prompt):
+    answers = [normalize_text(str(answer)) for _, answer in prompt['pairs']]
+    group = semantic_cache.group_id(prompt['persona'], RECOMMENDATION_PROMPT_VERSION, *answers)
+    return group, semantic_cache.embed_texts([question for question, _ in prompt['pairs']])
+
+# Cache of fully enriched results pages (TMDB data and AI descriptions
+# included), keyed on the answer signature. Stale entries can be served while a
+# single background job per signature rebuilds them. On a miss, the semantic
+# index can point at the page of a differently worded but equivalent prompt.
+class RecommendationCache:
+    def __init__(self, cache, executor, index=None):
+        self.cache = cache
+        self.executor = executor
+        self.index = index
+        self.revalidating = set()
+        self._lock = threading.Lock()
+        if index is not None:
+            for entry in reversed(cache.recent(index.capacity)):
+                if 'prompt' in entry:
+                    index.add(entry['signature'], *embed_recommendation_prompt(entry['prompt']))
+    
+    def _key(self, persona, questions, answers):
+        return recommendation_signature(persona, questions, answers)
+    
+    # Cache entry of the closest page for a prompt with no exact entry, or
+    # CACHE_MISS if none is similar enough
+    def _near_duplicate(self, persona, questions, answers):
+        if self.index is None:
+            return CACHE_MISS
+        group, texts = embed_recommendation_prompt(recommendation_prompt(persona, questions, answers))
+        key, similarity = self.index.nearest(group, texts)
+        if key is None or similarity < SEMANTIC_CACHE_THRESHOLD:
+            self.index.observe(semantic_cache.MISS, similarity)
+            return CACHE_MISS
+        entry = self.cache.get(key)
+        if entry is CACHE_MISS:
+            # Expired or evicted from the disk cache since it was indexed
+            self.index.remove(key)
+            self.index.observe(semantic_cache.MISS)
+            return CACHE_MISS
+        self.index.observe(semantic_cache.NEAR, similarity)
+        set_debug_info(f"Reusing recommendations cached for a similar prompt (similarity {similarity:.3f})")
+        return entry
+    
+    # Return the cached results page, or None on a miss. A stale entry is
+    # returned too (when allowed) and triggers a background refresh. The
+    # refresh is always for the requesting prompt, so a stale near-duplicate
+    # leads to a fresh entry under this prompt's own key.
+    def get(self, persona, questions, answers):
+        key = self._key(persona, questions, answers)
+        entry = self.cache.get(key)
+        if entry is not CACHE_MISS and self.index is not None:
+            self.index.observe(semantic_cache.EXACT)
+        if entry is CACHE_MISS:
+            entry = self._near_duplicate(persona, questions, answers)
+        if entry is CACHE_MISS:
+            return None
+        if time.time() - entry['created_at'] <= RECOMMENDATION_CACHE_TTL:
+            return entry['recommendations']
+        # Under load a stale page is served as it is, rather than regenerated
+        shedding = get_admission().tier() != "normal"
+        if not RECOMMENDATION_CACHE_SERVE_STALE and not shedding:
+            return None
+        if may_run_optional("revalidation"):
+            self.revalidate(key, persona, questions, answers)
+        return entry['recommendations']
+    
+    def set(self, persona, questions, answers, detailed_recommendations):
+        key = self._key(persona, questions, answers)
+        prompt = recommendation_prompt(persona, questions, answers)
+        self.cache.set(
+            key,
+            {'created_at': time.time(), 'recommendations': detailed_recommendations, 'signature': key, 'prompt': prompt},
+            RECOMMENDATION_CACHE_TTL + RECOMMENDATION_CACHE_STALE_TTL
+        )
+        if self.index is not None:
+            self.index.add(key, *embed_recommendation_prompt(prompt))
+    
+    def revalidate(self, key, persona, questions, answers):
+        with self._lock:
+            if key in self.revalidating:
+                return
+            self.revalidating.add(key)
+        future = self.executor.submit(build_recommendations, persona, questions, answers)
+        future.add_done_callback(lambda _: self.revalidating.discard(key))
+
+# Recommendation cache, created once per server process
+@st.cache_resource
+def get_recommendation_cache():
+    return RecommendationCache(
+        DiskCache(CACHE_PATH, "recommendations", RECOMMENDATION_CACHE_MAX_ENTRIES),
+        get_prefetcher().executor,
+        semantic_cache.SemanticIndex(RECOMMENDATION_CACHE_MAX_ENTRIES) if SEMANTIC_CACHE_ENABLED else None
+    )
+
+# Check whether a recommendation came from the canned lists rather than Gemini
+def is_canned_recommendation(rec):
+    canned = [*DEFAULT_RECOMMENDATIONS.values(), FALLBACK_RECOMMENDATIONS]
+    return any(rec is candidate for recs in canned for candidate in recs)
+
+# Check whether a finished results page can be served to other people: every
+# card resolved, every description Gemini's and nothing from the canned lists
+def is_complete_page(detailed_recommendations):
+    return bool(detailed_recommendations) and not any(
+        rec.get('degraded') or rec.get('canned') for rec in detailed_recommendations
+    )
+
+# Cache a results page, unless it is built from canned recommendations or
+# any card is degraded: a fallback card (TMDB failed, timed out, was refused
+# or the circuit was open) or a description that isn't Gemini's. Those pages
+# would otherwise be served for days.
+def remember_recommendations(persona, questions, answers, recommendations, detailed_recommendations):
+    if not detailed_recommendations or any(is_canned_recommendation(rec) for rec in recommendations):
+        return
+    if not is_complete_page(detailed_recommendations):
+        set_debug_info("Not caching a results page with degraded cards")
+        return
+    get_recommendation_cache().set(persona, questions, answers, detailed_recommendations)
+
+# Get recommendations and enrich them in one go, without touching the page.
+# Used for work that runs off the script thread.
+def build_recommendations(persona, questions, answers):
+    recommendations = get_recommendations(persona, questions, answers) or FALLBACK_RECOMMENDATIONS
+    detailed_recommendations = enrich_recommendations(recommendations)
+    remember_recommendations(persona, questions, answers, recommendations, detailed_recommendations)
+    return detailed_recommendations
+
+# Speculative build: the likely answer paths are the ones most often cached
+# already, so the cache is checked before spending Gemini calls on them
+def build_speculative_recommendations(persona, questions, answers):
+    cached_recommendations = get_recommendation_cache().get(persona, questions, answers)
+    if cached_recommendations:
+        return cached_recommendations
+    return build_recommendations(persona, questions, answers)
+
+# Process-wide background scheduler. It counts which options people pick so it
+# can guess likely answers, and runs speculative recommendation jobs and
+# stale-page revalidation.
+class PrefetchScheduler:
+    def __init__(self, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.answer_counts = {}
+        self._lock = threading.Lock()
+    
+    def record_answer(self, question, option):
+        with self._lock:
+            counts = self.answer_counts.setdefault(question, {})
+            counts[option] = counts.get(option, 0) + 1
+    
+    # Options for a question ordered from most to least often picked so far
+    # (ties keep the order the options are shown in)
+    def likely_options(self, question, options):
+        with self._lock:
+            counts = dict(self.answer_counts.get(question, {}))
+        return sorted(options, key=lambda option: -counts.get(option, 0))
+    
+    # Start a speculative job, or return None if every worker is taken
+    def speculate(self, persona, questions, answers):
+        if not self.slots.acquire(blocking=False):
+            return None
+        try:
+            future = self.executor.submit(build_speculative_recommendations, persona, questions, answers)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+# Prefetch scheduler, created once per server process
+@st.cache_resource
+def get_prefetcher():
+    return PrefetchScheduler(PREFETCH_MAX_WORKERS)
+
+# Persona question bank. Each persona has a pool of up to QUESTION_BANK_SIZE
+# validated question sets on disk, keyed by persona and a hash of the prompt
+# (so a prompt change starts a fresh pool). Pools are held in memory once
+# loaded, so serving a set is a dict lookup. Gemini is only called to top up a
+# pool that is short or older than QUESTION_BANK_REFRESH_AFTER, on a
+# background thread.
+class QuestionBank:
+    def __init__(self, cache, executor):
+        self.cache = cache
+        self.executor = executor
+        self.pools = {}
+        self.refreshing = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, persona):
+        prompt_hash = hashlib.sha256(
+            f"{QUESTION_PROMPT_VERSION}:{build_questions_prompt(persona)}".encode()
+        ).hexdigest()[:16]
+        return [persona, prompt_hash]
+    
+    def _pool(self, persona):
+        with self._lock:
+            pool = self.pools.get(persona)
+        if pool is None:
+            stored = self.cache.get(self._key(persona))
+            pool = stored if stored is not CACHE_MISS else {'sets': [], 'updated_at': 0}
+            with self._lock:
+                pool = self.pools.setdefault(persona, pool)
+        return pool
+    
+    def _needs_refresh(self, pool):
+        return (
+            len(pool['sets']) < QUESTION_BANK_SIZE or
+            time.time() - pool['updated_at'] > QUESTION_BANK_REFRESH_AFTER
+        )
+    
+    # Generate one more question set and add it to the pool, dropping the
+    # oldest once the pool is full. Other processes may have added sets in the
+    # meantime, so the stored pool is re-read before writing.
+    def _refresh(self, persona):
+        questions = request_questions(persona)
+        if not questions:
+            return None
+        key = self._key(persona)
+        stored = self.cache.get(key)
+        pool = stored if stored is not CACHE_MISS else self._pool(persona)
+        pool = {
+            'sets': (pool['sets'] + [questions])[-QUESTION_BANK_SIZE:],
+            'updated_at': time.time()
+        }
+        self.cache.set(key, pool, QUESTION_BANK_TTL)
+        with self._lock:
+            self.pools[persona] = pool
+        return questions
+    
+    # Start a background refresh for a persona unless one is already running
+    def refresh_in_background(self, persona):
+        with self._lock:
+            future = self.refreshing.get(persona)
+            if future is None or future.done():
+                future = self.executor.submit(self._refresh, persona)
+                self.refreshing[persona] = future
+        return future
+    
+    # Top up every persona whose pool is short or stale. This is optional
+    # work, so it is skipped (and counted as shed) under load.
+    def warm(self, personas):
+        stale = [persona for persona in personas if self._needs_refresh(self._pool(persona))]
+        if stale and may_run_optional("question_refresh"):
+            for persona in stale:
+                self.refresh_in_background(persona)
+    
+    # Serve a question set for a persona. An empty pool (first use) waits for
+    # one generation; otherwise this never blocks on Gemini. With
+    # generate=False (load shedding) the pool is served as it is.
+    def get(self, persona, generate=True):
+        pool = self._pool(persona)
+        if not generate:
+            return random.choice(pool['sets']) if pool['sets'] else None
+        if self._needs_refresh(pool) and (not pool['sets'] or may_run_optional("question_refresh")):
+            future = self.refresh_in_background(persona)
+            if not pool['sets']:
+                try:
+                    return future.result(timeout=QUESTION_BANK_WAIT_TIMEOUT)
+                except Exception as e:
+                    set_debug_info(f"Question bank refresh for {persona} failed: {e}")
+                    return None
+        if not pool['sets']:
+            return None
+        return random.choice(pool['sets']) if QUESTION_BANK_ROTATE else pool['sets'][-1]
+
+# Question bank, created once per server process
+@st.cache_resource
+def get_question_bank():
+    return QuestionBank(
+        DiskCache(CACHE_PATH, "question_bank", len(PERSONA_OPTIONS) * 4),
+        ThreadPoolExecutor(max_workers=len(PERSONA_OPTIONS), thread_name_prefix="question_bank")
+    )
+
+# Start speculative recommendation jobs for the likeliest answers to the last
+# question. Each job is keyed by the full answer list it assumes.
+def speculate_recommendations(question):
+    if SPECULATION_BRANCHES <= 0 or st.session_state.speculations:
+        return
+    if not may_run_optional("speculation"):
+        return
+    prefetcher = get_prefetcher()
+    for option in prefetcher.likely_options(question['question'], question['options'])[:SPECULATION_BRANCHES]:
+        answers = st.session_state.answers + [option]
+        future = prefetcher.speculate(st.session_state.persona, st.session_state.questions, answers)
+        if future is None:
+            break
+        st.session_state.speculations[tuple(answers)] = future
+
+# Drop this session's speculative jobs. Jobs that haven't started are
+# cancelled; running ones finish in the background and are ignored.
+def cancel_speculations():
+    for future in st.session_state.speculations.values():
+        future.cancel()
+    st.session_state.speculations = {}
+
+# Take the speculative job matching the user's actual answers, if any, and
+# cancel the guesses that turned out wrong
+def take_speculation(answers):
+    future = st.session_state.speculations.pop(tuple(answers), None)
+    cancel_speculations()
+    return future
+
+# Wait for a speculative job's result; None if it failed, took too long or
+# hadn't started yet (it is cancelled then, and the caller builds the page
+# itself instead of waiting behind other sessions' jobs)
+def speculative_result(future):
+    if future.cancel():
+        set_debug_info("Speculative recommendations hadn't started, building them directly")
+        return None
     try:
-        response = ask_gemini(prompt)
-        return response
+        # The job itself runs on a prefetch worker, outside any trace
+        with get_tracer().span("speculation_wait", ready=future.done()):
+            return future.result(timeout=SPECULATION_WAIT_TIMEOUT)
     except Exception as e:
-        return overview[:150] + "..."  # Fallback to truncated original overview
+        set_debug_info(f"Speculative recommendations unavailable: {e}")
+        return None
+
+# Streaming recommendations without a page: cards are published as soon as
+# Gemini names each title, and again when TMDB enrichment fills them in.
+# `publish` is called with the full list of cards so far. Returns the raw
+# recommendations and the enriched cards.
+def stream_recommendation_cards(persona, questions, answers, publish, limit=3):
+    cards = []
+    
+    # Put a card in its slot and publish the list
+    def draw(i, rec):
+        while len(cards) <= i:
+            cards.append(build_pending_recommendation(''))
+        cards[i] = rec
+        publish(list(cards))
+    
+    describe = GEMINI_DESCRIPTION_MODE == "per_item"
+    runner = get_async_runner()
+    recommendations = []
+    futures = {}
+    for event, i, payload in stream_recommendations(persona, questions, answers, limit=limit):
+        if event == "title":
+            draw(i, build_pending_recommendation(payload))
+        else:
+            recommendations.append(payload)
+            draw(i, build_pending_recommendation(payload['title'], payload.get('type', 'movie')))
+            futures[runner.submit(enrich_recommendation_async(payload, describe))] = i
+    
+    detailed_recommendations = [None] * len(recommendations)
+    try:
+        for future in as_completed(futures, timeout=ENRICHMENT_TIMEOUT):
+            i = futures[future]
+            if future.exception() is None:
+                detailed_recommendations[i] = future.result()
+                draw(i, detailed_recommendations[i])
+    except TimeoutError:
+        set_debug_info("Some titles took too long to enrich, using fallback cards")
+        for future in futures:
+            future.cancel()
+    
+    for i, rec in enumerate(recommendations):
+        if detailed_recommendations[i] is None:
+            detailed_recommendations[i] = build_fallback_recommendation(
+                rec.get('title'), rec.get('type', 'movie'), rec.get('reason', '')
+            )
+            draw(i, detailed_recommendations[i])
+    
+    return recommendations, describe_recommendations(detailed_recommendations)
+
+# Work out the enriched recommendations for a set of answers, from a
+# speculative job or from Gemini and TMDB. Runs off the script thread, so it
+# never touches the page; progress goes to `publish`.
+def find_recommendations(persona, questions, answers, speculation=None, publish=None):
+    # Fallback recommendations if the AI fails
+    fallback_recommendations = FALLBACK_RECOMMENDATIONS
+    
+    # Use the speculative result if we guessed the last answer right
+    if speculation is not None:
+        speculative_recommendations = speculative_result(speculation)
+        if speculative_recommendations:
+            return speculative_recommendations
+    
+    if GEMINI_STREAMING:
+        # Streaming mode publishes the cards as they arrive
+        recommendations, detailed_recommendations = stream_recommendation_cards(
+            persona, questions, answers, publish or (lambda cards: None)
+        )
+        if not detailed_recommendations:
+            recommendations = fallback_recommendations
+            detailed_recommendations = enrich_recommendations(recommendations)
+    else:
+        # Try to get AI recommendations, use fallbacks if it fails
+        try:
+            recommendations = get_recommendations(persona, questions, answers)
+            
+            if not recommendations or len(recommendations) == 0:
+                set_debug_info("Using fallback recommendations")
+                recommendations = fallback_recommendations
+        except Exception as e:
+            set_debug_info(f"Error generating recommendations: {e}")
+            recommendations = fallback_recommendations
+        
+        # Fetch detailed information from TMDB
+        detailed_recommendations = enrich_recommendations(recommendations)
+    
+    remember_recommendations(persona, questions, answers, recommendations, detailed_recommendations)
+    return detailed_recommendations
+
+# Job records in Redis (or anything speaking its protocol), with the same
+# get/set interface as DiskCache
+class RedisJobStore:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+    
+    def get(self, key):
+        value = self.client.get(f"svomo:job:{key}")
+        return CACHE_MISS if value is None else json.loads(value)
+    
+    def set(self, key, value, ttl):
+        self.client.set(f"svomo:job:{key}", json.dumps(value), ex=max(int(ttl), 1))
+
+# Recommendation jobs. The job id is derived from the persona and answers, so
+# identical requests share one job. A job's record holds its inputs (to
+# restart it if it is lost), the cards published so far and, once done, the
+# final results, which stay readable for JOB_TTL.
+class RecommendationJobs:
+    def __init__(self, store, executor):
+        self.store = store
+        self.executor = executor
+        self.running = {}
+        self._lock = threading.RLock()
+    
+    def get(self, job_id):
+        record = self.store.get(job_id)
+        return None if record is CACHE_MISS else record
+    
+    def _save(self, job_id, record):
+        record['updated_at'] = time.time()
+        self.store.set(job_id, record, JOB_TTL)
+    
+    def _is_live(self, job_id, record):
+        with self._lock:
+            future = self.running.get(job_id)
+        if future is not None and not future.done():
+            return True
+        return record['status'] == 'done' or time.time() - record['updated_at'] < JOB_STALE_AFTER
+    
+    # A finished job is only shared if its page is complete; one that ended
+    # with fallback or canned cards is built again for the next request
+    def _is_reusable(self, job_id, record):
+        if not self._is_live(job_id, record):
+            return False
+        return record['status'] != 'done' or is_complete_page(record['recommendations'])
+    
+    # Start a job for these answers unless an identical one is already running
+    # or finished with a complete page (here or in another process). Returns
+    # the job id.
+    def submit(self, persona, questions, answers, speculation=None):
+        job_id = recommendation_signature(persona, questions, answers)[:24]
+        with self._lock:
+            record = self.get(job_id)
+            future = self.running.get(job_id)
+            if (future is not None and not future.done()) or (record and self._is_reusable(job_id, record)):
+                if speculation is not None:
+                    speculation.cancel()
+                return job_id
+            self._save(job_id, {
+                'status': 'running',
+                'persona': persona,
+                'questions': questions,
+                'answers': answers,
+                'cards': [],
+                'recommendations': None
+            })
+            self.running[job_id] = self.executor.submit(
+                self._run, job_id, persona, questions, answers, speculation, admission.current_session()
+            )
+        return job_id
+    
+    # Runs on a job worker; the job's calls are charged to the session that
+    # submitted it
+    def _run(self, job_id, persona, questions, answers, speculation, session_id=None):
+        with get_admission().session(session_id):
+            return self._build(job_id, persona, questions, answers, speculation)
+    
+    def _build(self, job_id, persona, questions, answers, speculation):
+        record = self.get(job_id)
+        
+        def publish(cards):
+            record['cards'] = cards
+            self._save(job_id, record)
+        
+        try:
+            detailed_recommendations = find_recommendations(persona, questions, answers, speculation, publish)
+        except Exception as e:
+            set_debug_info(f"Recommendation job {job_id} failed: {e}")
+            detailed_recommendations = enrich_recommendations(FALLBACK_RECOMMENDATIONS)
+        record.update(status='done', cards=detailed_recommendations, recommendations=detailed_recommendations)
+        self._save(job_id, record)
+        with self._lock:
+            self.running.pop(job_id, None)
+        return detailed_recommendations
+    
+    # Current record of a job (None once it has expired), restarting it from
+    # its stored inputs if the process that ran it has gone away
+    def poll(self, job_id):
+        record = self.get(job_id)
+        if record and not self._is_live(job_id, record):
+            set_debug_info(f"Recommendation job {job_id} was lost, restarting it")
+            self.submit(record['persona'], record['questions'], record['answers'])
+            record = self.get(job_id)
+        return record
+
+# Recommendation jobs, created once per server process
+@st.cache_resource
+def get_recommendation_jobs():
+    store = None
+    if JOB_REDIS_URL:
+        if redis is None:
+            set_debug_info("JOB_REDIS_URL is set but the redis package isn't installed; keeping jobs on disk")
+        else:
+            store = RedisJobStore(JOB_REDIS_URL)
+    if store is None:
+        store = DiskCache(CACHE_PATH, "jobs", JOB_MAX_ENTRIES)
+    return RecommendationJobs(store, ThreadPoolExecutor(max_workers=JOB_MAX_WORKERS, thread_name_prefix="jobs"))
 
 # Display welcome screen
 def show_welcome():
+    # Top up the question bank for every persona while the user decides
+    get_question_bank().warm(PERSONA_OPTIONS)
+    
     # Check API keys first and show warnings if missing
     if TMDB_API_KEY == "missing" or GEMINI_API_KEY == "missing":
         st.warning("""
@@ -536,65 +2541,76 @@ def show_welcome():
     
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        persona_options = [
-            "Anime Fan", 
-            "Hollywood Movie Enthusiast", 
-            "Bollywood Fan", 
-            "K-Drama Lover", 
-            "TV Series Binger",
-            "Indie Film Appreciator"
-        ]
-        
-        for persona in persona_options:
-            if st.button(persona, key=f"persona_{persona}", use_container_width=True):
-                st.session_state.persona = persona
-                st.session_state.step = 'generating_questions'
-                st.session_state.debug_info = f"Selected persona: {persona}, moving to generating_questions"
-                st.rerun()
+        for persona in PERSONA_OPTIONS:
+            st.button(persona, key=f"persona_{persona}", use_container_width=True, on_click=choose_persona, args=(persona,))
     
     # Credits
-    st.markdown("""
-    <div class="credits">
-        <p style="color: #00ffff; font-size: 1.2em;">Powered by Google Gemini AI | Movie data from TheMovieDB</p>
-        <div>
-            <img src="https://www.gstatic.com/lamda/images/gemini_ai_logo_70e467c4f0c37.svg" alt="Gemini AI">
-            <img src="https://www.themoviedb.org/assets/2/v4/logos/v2/blue_short-8e7b30f73a4020692ccca9c88bafe5dcb6f8a62a4c6bc55cd9ba82bb2cd95f6c.svg" alt="TMDB">
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    show_credits()
+
+# Button callback on the welcome page. Callbacks run before the script, so
+# the same run goes on to generate the questions.
+def choose_persona(persona):
+    st.session_state.persona = persona
+    st.session_state.step = 'generating_questions'
+    set_debug_info(f"Selected persona: {persona}, moving to generating_questions")
+
+# Admission for a step about to start new work. Returns the load-shedding
+# tier to run it under; "reject" means it was turned away (by this session's
+# or the process's step bucket).
+def admit_step():
+    controller = get_admission()
+    tier = controller.tier()
+    if tier != "reject" and controller.admit(admission.STEPS) == admission.ADMITTED:
+        return tier
+    controller.note_shed("reject", "step")
+    return "reject"
 
-# Generate questions based on selected persona
+# Notice for a rejected step. The step is left as it is, so the retry button
+# (any rerun, really) tries it again.
+def show_busy():
+    st.warning("SVOMO is swamped right now. Give it a few seconds and try again.")
+    st.button("Try again", key="admission_retry")
+    st.button("Start Over", key="admission_start_over", on_click=start_over)
+
+# Generate questions based on selected persona. Runs in place: the loading
+# screen is cleared and the step moves on within the same script run. Under
+# load, banked question sets and then the canned set stand in for Gemini.
 def generate_persona_questions():
-    show_loading("Generating personalized questions...")
-    
-    # Debug info
-    st.write(f"Generating questions for persona: {st.session_state.persona}")
+    persona = st.session_state.persona
+    tier = admit_step()
+    loading = st.empty()
+    with loading.container():
+        show_loading("Generating personalized questions...")
+        
+        # Debug info
+        st.write(f"Generating questions for persona: {persona}")
+        
+        # Serve questions from the bank, generating them directly only if it
+        # has none; try a total of 3 times before giving up
+        questions = None
+        if tier in ("canned", "reject"):
+            questions = get_question_bank().get(persona, generate=False)
+            if not questions and tier == "canned":
+                questions = canned_questions(persona)
+        else:
+            for attempt in range(3):
+                questions = get_question_bank().get(persona) or generate_questions(persona)
+                if questions:
+                    break
+                set_debug_info(f"Question generation attempt {attempt + 1} failed")
+    loading.empty()
     
-    # Generate questions
-    questions = generate_questions(st.session_state.persona)
+    if not questions and tier == "reject":
+        show_busy()
+        return
     
     if questions:
         st.session_state.questions = questions
         st.session_state.step = 'asking_questions'
-        st.write("Questions generated successfully, moving to asking_questions")
+        set_debug_info("Questions generated successfully, moving to asking_questions")
     else:
-        # If we failed to generate questions, we'll try a total of 3 times before giving up
-        if st.session_state.retry_count < 3:
-            st.session_state.retry_count += 1
-            st.write(f"Retry attempt {st.session_state.retry_count}...")
-            # Short delay before retry
-            time.sleep(1)
-            st.rerun()
-        else:
-            st.error("Failed to generate questions after multiple attempts. Please try again.")
-            st.session_state.step = 'welcome'
-            st.session_state.retry_count = 0
-    
-    # Show debug info
-    if 'debug_info' in st.session_state:
-        st.write(f"Debug info: {st.session_state.debug_info}")
-    
-    st.rerun()
+        st.error("Failed to generate questions after multiple attempts. Please try again.")
+        st.session_state.step = 'welcome'
 
 # Display current question and options
 def show_question():
@@ -624,122 +2640,166 @@ def show_question():
         </div>
         """, unsafe_allow_html=True)
         
+        # On the last question, start on the likeliest outcomes in the background
+        if current_q == len(st.session_state.questions) - 1:
+            speculate_recommendations(question)
+        
         # Use unique keys for each option button to avoid conflicts
         for i, option in enumerate(question['options']):
-            if st.button(option, key=f"q{current_q}_option_{i}", use_container_width=True):
-                st.write(f"Selected: {option}")
-                st.session_state.answers.append(option)
-                st.session_state.current_question += 1
-                
-                # Check if all questions are answered
-                if st.session_state.current_question >= len(st.session_state.questions):
-                    st.session_state.step = 'generating_recommendations'
-                
-                st.rerun()
+            st.button(
+                option,
+                key=f"q{current_q}_option_{i}",
+                use_container_width=True,
+                on_click=answer_question,
+                args=(question, option)
+            )
     else:
         st.session_state.step = 'generating_recommendations'
-        st.rerun()
 
-# Generate and display movie recommendations
-def generate_recommendations():
-    show_loading("Analyzing your preferences and finding perfect recommendations...")
-    
-    # Debug information
-    st.write(f"Generating recommendations for persona: {st.session_state.persona}")
-    st.write(f"Based on {len(st.session_state.answers)} answers")
+# Button callback for an answer. After the last one the same script run goes
+# on to generate the recommendations.
+def answer_question(question, option):
+    get_prefetcher().record_answer(question['question'], option)
+    st.session_state.answers.append(option)
+    st.session_state.current_question += 1
     
-    # Fallback recommendations if the AI fails
-    fallback_recommendations = [
-        {
-            "title": "The Matrix",
-            "type": "movie",
-            "reason": "A sci-fi classic that combines action, philosophy, and groundbreaking visuals."
-        },
-        {
-            "title": "Stranger Things",
-            "type": "tv",
-            "reason": "A nostalgic series with supernatural elements and compelling characters."
-        },
-        {
-            "title": "Inception",
-            "type": "movie",
-            "reason": "A mind-bending thriller with stunning visuals and an intricate plot."
-        }
-    ]
-    
-    # Try to get AI recommendations, use fallbacks if it fails
-    try:
-        recommendations = get_recommendations(
-            st.session_state.persona, 
-            st.session_state.questions, 
-            st.session_state.answers
-        )
+    # Check if all questions are answered
+    if st.session_state.current_question >= len(st.session_state.questions):
+        st.session_state.step = 'generating_recommendations'
+
+# Recommendation step. Cached results (and finished speculative ones) are
+# used in place; otherwise the work is handed to a recommendation job and the
+# page polls it, drawing cards as they are published. The job id goes into
+# the URL so a refreshed or reconnected page resumes the same job.
+def generate_recommendations():
+    jobs = get_recommendation_jobs()
+    if not st.session_state.job_id:
+        persona = st.session_state.persona
+        questions = st.session_state.questions
+        answers = st.session_state.answers
         
-        if not recommendations or len(recommendations) == 0:
-            st.write("Using fallback recommendations")
-            recommendations = fallback_recommendations
-    except Exception as e:
-        st.error(f"Error generating recommendations: {e}")
-        recommendations = fallback_recommendations
-    
-    # Fetch detailed information from TMDB
-    detailed_recommendations = []
-    
-    for rec in recommendations:
-        title = rec.get('title')
-        media_type = rec.get('type', 'movie')  # Default to movie if not specified
-        reason = rec.get('reason', '')
+        # Serve straight from the cache when these answers have been seen before
+        cached_recommendations = get_recommendation_cache().get(persona, questions, answers)
+        if cached_recommendations:
+            cancel_speculations()
+            st.session_state.recommendations = cached_recommendations
+            st.session_state.step = 'show_recommendations'
+            return
         
-        # Search for the title in TMDB
-        result = search_tmdb(title, media_type)
+        # Under load, canned recommendations stand in for Gemini
+        tier = admit_step()
+        if tier == "reject":
+            show_busy()
+            return
+        if tier == "canned":
+            cancel_speculations()
+            get_admission().note_shed(tier, "recommendations")
+            st.session_state.recommendations = enrich_recommendations(
+                DEFAULT_RECOMMENDATIONS.get(persona, DEFAULT_RECOMMENDATIONS["Hollywood Movie Enthusiast"])
+            )
+            st.session_state.step = 'show_recommendations'
+            return
         
-        if result:
-            item_id = result.get('id')
-            # Get full details
-            details = get_tmdb_details(item_id, media_type)
-            
-            if details:
-                # Extract relevant information
-                poster_path = details.get('poster_path')
-                poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else "https://i.ibb.co/s9ZYS5wk/45e6544ed099.jpg"
-                
-                overview = details.get('overview', '')
-                
-                # For movies, get release year; for TV shows, get first air date year
-                year = ""
-                if media_type == 'movie' and 'release_date' in details:
-                    year = details['release_date'][:4] if details.get('release_date') else ''
-                elif media_type == 'tv' and 'first_air_date' in details:
-                    year = details['first_air_date'][:4] if details.get('first_air_date') else ''
-                
-                # Generate AI description
-                ai_description = generate_ai_description(title, overview, media_type, reason)
-                
-                detailed_recommendations.append({
-                    'title': details.get('title') if media_type == 'movie' else details.get('name'),
-                    'poster_url': poster_url,
-                    'year': year,
-                    'overview': overview,
-                    'ai_description': ai_description,
-                    'media_type': media_type.title(),
-                    'reason': reason
-                })
+        speculation = take_speculation(answers)
+        if speculation is not None and speculation.done():
+            speculative_recommendations = speculative_result(speculation)
+            if speculative_recommendations:
+                st.session_state.recommendations = speculative_recommendations
+                st.session_state.step = 'show_recommendations'
+                return
         
-        # If no TMDB result, create a fallback recommendation
-        if not result:
-            detailed_recommendations.append({
-                'title': title,
-                'poster_url': "https://i.ibb.co/s9ZYS5wk/45e6544ed099.jpg",
-                'year': '',
-                'overview': '',
-                'ai_description': reason,
-                'media_type': media_type.title(),
-                'reason': reason
-            })
+        st.session_state.job_id = jobs.submit(persona, questions, answers, speculation)
+        st.query_params["job"] = st.session_state.job_id
     
-    st.session_state.recommendations = detailed_recommendations
+    record = jobs.poll(st.session_state.job_id)
+    if record and record['status'] == 'done':
+        finish_recommendation_job(record)
+        return
+    show_job_progress(st.session_state.job_id)
+
+# Move to the results page with a finished job's recommendations
+def finish_recommendation_job(record):
+    st.session_state.persona = record['persona']
+    st.session_state.recommendations = record['recommendations']
     st.session_state.step = 'show_recommendations'
-    st.rerun()
+
+# Polling view of a running recommendation job. Only this fragment reruns
+# while the job works; once it is done the whole page reruns to show the
+# results.
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def show_job_progress(job_id):
+    record = get_recommendation_jobs().poll(job_id)
+    if record is None:
+        st.error("These recommendations have expired. Please start over.")
+        st.button("Start Over", key="expired_start_over", on_click=start_over)
+        return
+    if record['status'] == 'done':
+        finish_recommendation_job(record)
+        st.rerun()
+    
+    show_loading("Analyzing your preferences and finding perfect recommendations...")
+    
+    # Debug information
+    st.write(f"Generating recommendations for persona: {record['persona']}")
+    st.write(f"Based on {len(record['answers'])} answers")
+    
+    cols = st.columns(3)
+    for i, card in enumerate(record['cards'][:len(cols)]):
+        with cols[i]:
+            render_recommendation_card(card, show_details=False)
+
+# Poster markup for a card: the local WebP/JPEG variants when the poster has
+# been prepared, TMDB's image when it hasn't (e.g. cards cached before the
+# poster pipeline, or a download that failed), the placeholder otherwise
+def poster_html(rec):
+    style = "max-width: 100%; height: auto; border: 2px solid #ff00ff;"
+    store = get_poster_store()
+    key = rec.get('poster')
+    if not (key and store.has(key)):
+        if rec.get('poster_url') and rec['poster_url'] != POSTER_PLACEHOLDER_SOURCE:
+            return f'<img src="{rec["poster_url"]}" loading="lazy" style="{style}">'
+        key = get_placeholder_poster()
+    return (
+        f'<picture><source type="image/webp" srcset="{store.srcset(key, "webp")}" sizes="{POSTER_SIZES}">'
+        f'<img src="{store.url(key)}" srcset="{store.srcset(key, "jpg")}" sizes="{POSTER_SIZES}" '
+        f'loading="lazy" style="{style}"></picture>'
+    )
+
+# Render one recommendation card. Cards that are still loading (streaming mode)
+# are drawn without the details expander.
+def render_recommendation_card(rec, show_details=True):
+    st.markdown(f"""
+    <div class="movie-card">
+        <div style="text-align: center;">
+            {poster_html(rec)}
+        </div>
+        <div class="movie-title">{rec['title']}</div>
+        <div class="movie-year">{rec['year']} | {rec['media_type']}</div>
+        <div class="movie-overview">{rec['ai_description'] or '<span class="blinking-cursor">_</span>'}</div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Show additional details in expandable section
+    if show_details:
+        with st.expander("Why this recommendation?"):
+            st.write(rec['reason'])
+            if rec['overview']:
+                st.write("**Original Overview:**")
+                st.write(rec['overview'])
+
+# Placeholder card for a title that is still being looked up
+def build_pending_recommendation(title, media_type=''):
+    return {
+        'title': title,
+        'poster': None,
+        'poster_url': None,
+        'year': '',
+        'overview': '',
+        'ai_description': None,
+        'media_type': media_type.title(),
+        'reason': '',
+        'degraded': False
+    }
 
 # Display movie recommendations
 def show_recommendations():
@@ -763,51 +2823,112 @@ def show_recommendations():
     
     for i, rec in enumerate(st.session_state.recommendations):
         with cols[i]:
-            st.markdown(f"""
-            <div class="movie-card">
-                <div style="text-align: center;">
-                    <img src="{rec['poster_url']}" style="max-width: 100%; height: auto; border: 2px solid #ff00ff;">
-                </div>
-                <div class="movie-title">{rec['title']}</div>
-                <div class="movie-year">{rec['year']} | {rec['media_type']}</div>
-                <div class="movie-overview">{rec['ai_description']}</div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Show additional details in expandable section
-            with st.expander("Why this recommendation?"):
-                st.write(rec['reason'])
-                if rec['overview']:
-                    st.write("**Original Overview:**")
-                    st.write(rec['overview'])
+            render_recommendation_card(rec)
     
     # Restart button
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        if st.button("Start Over", use_container_width=True):
-            st.session_state.step = 'welcome'
-            st.session_state.persona = None
-            st.session_state.answers = []
-            st.session_state.current_question = 0
-            st.session_state.questions = []
-            st.session_state.recommendations = []
-            st.rerun()
+        st.button("Start Over", use_container_width=True, on_click=start_over)
     
     # Credits
-    st.markdown("""
-    <div class="credits">
-        <p style="color: #00ffff; font-size: 1.2em;">Powered by Google Gemini AI | Movie data from TheMovieDB</p>
-        <div>
-            <img src="https://www.gstatic.com/lamda/images/gemini_ai_logo_70e467c4f0c37.svg" alt="Gemini AI">
-            <img src="https://www.themoviedb.org/assets/2/v4/logos/v2/blue_short-8e7b30f73a4020692ccca9c88bafe5dcb6f8a62a4c6bc55cd9ba82bb2cd95f6c.svg" alt="TMDB">
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    show_credits()
+
+# Button callback: back to the welcome page with a clean slate
+def start_over():
+    cancel_speculations()
+    st.query_params.pop("job", None)
+    st.session_state.job_id = None
+    st.session_state.step = 'welcome'
+    st.session_state.persona = None
+    st.session_state.answers = []
+    st.session_state.current_question = 0
+    st.session_state.questions = []
+    st.session_state.recommendations = []
+
+# Button callback for the sidebar's Reset App; main() re-initialises the state
+def reset_app():
+    st.session_state.clear()
+    st.query_params.clear()
+
+# Sidebar waterfall of one of this session's recent runs, plus the
+# process-wide span metrics
+def show_trace_panel():
+    traces = [trace for trace in st.session_state.traces if trace.duration is not None]
+    if not traces:
+        return
+    with st.expander("Trace waterfall"):
+        # Options are indexes: widgets copy their options, and traces hold a lock
+        traces.reverse()
+        choice = st.selectbox(
+            "Run",
+            range(len(traces)),
+            format_func=lambda i: f"{traces[i].name} · {traces[i].duration * 1000:.0f} ms · {time.strftime('%H:%M:%S', time.localtime(traces[i].started_at))}"
+        )
+        trace = traces[choice]
+        spans = trace.waterfall()
+        parents = {span['span_id']: span['parent_id'] for span in spans}
+        total = max(trace.duration, 1e-6)
+        rows = []
+        for span in spans:
+            depth = 0
+            parent = span['parent_id']
+            while parent in parents:
+                depth += 1
+                parent = parents[parent]
+            left = min(span['start'] / total * 100, 100)
+            width = max(min(span['duration'] / total * 100, 100 - left), 0.5)
+            color = "#ff4b4b" if span['error'] else "#00e5ff"
+            detail = ", ".join(f"{key}={value}" for key, value in span['attrs'].items())
+            rows.append(
+                f'<div style="font-size:11px;padding-left:{depth * 8}px" title="{detail}">'
+                f'{span["name"]} <span style="opacity:0.6">{span["duration"] * 1000:.0f} ms</span>'
+                f'<div style="background:rgba(255,255,255,0.08);height:6px">'
+                f'<div style="margin-left:{left:.1f}%;width:{width:.1f}%;height:6px;background:{color}"></div>'
+                f'</div></div>'
+            )
+        st.markdown("".join(rows), unsafe_allow_html=True)
+    with st.expander("Span metrics"):
+        st.code(get_tracer().export_prometheus(), language="text")
+
+# The flow as a state machine: each step's handler either draws a page and
+# waits for a button callback, or does some work and moves to the next step.
+# Steps that move on are followed within the same script run, so a user
+# interaction costs one run rather than one per step.
+STEP_HANDLERS = {
+    'welcome': show_welcome,
+    'generating_questions': generate_persona_questions,
+    'asking_questions': show_question,
+    'generating_recommendations': generate_recommendations,
+    'show_recommendations': show_recommendations
+}
+
+# A new session opened on a job's URL (after a refresh or reconnect) picks
+# the job back up instead of starting from the welcome page
+def resume_job_from_url():
+    job_id = st.query_params.get("job")
+    if job_id and not st.session_state.job_id and st.session_state.step == 'welcome':
+        st.session_state.job_id = job_id
+        st.session_state.step = 'generating_recommendations'
+
+# Upper bound on steps followed in one run, as a guard against cycles
+MAX_STEPS_PER_RUN = len(STEP_HANDLERS)
+
+def run_steps():
+    for _ in range(MAX_STEPS_PER_RUN):
+        step = st.session_state.step
+        with get_tracer().span(step):
+            STEP_HANDLERS.get(step, show_welcome)()
+        if st.session_state.step == step:
+            return
 
 # Main app flow
 def main():
     # Initialize session state
     init_session_state()
+    resume_job_from_url()
+    
+    # Warm up the Gemini transport (only does anything on the first run per process)
+    start_gemini_warmup()
     
     # Add custom CSS
     load_css()
@@ -816,21 +2937,52 @@ def main():
     with st.sidebar:
         st.write("Debug Panel")
         st.write(f"Current step: {st.session_state.step}")
-        if st.button("Reset App"):
-            st.session_state.clear()
-            st.rerun()
-    
-    # Route to the appropriate step
-    if st.session_state.step == 'welcome':
-        show_welcome()
-    elif st.session_state.step == 'generating_questions':
-        generate_persona_questions()
-    elif st.session_state.step == 'asking_questions':
-        show_question()
-    elif st.session_state.step == 'generating_recommendations':
-        generate_recommendations()
-    elif st.session_state.step == 'show_recommendations':
-        show_recommendations()
+        tmdb_cache_stats = get_tmdb_cache().stats()
+        st.write(
+            f"TMDB cache: {tmdb_cache_stats['hits']} hits / {tmdb_cache_stats['misses']} misses "
+            f"({tmdb_cache_stats['hit_rate']:.0%}), {tmdb_cache_stats['size']} entries"
+        )
+        st.write(f"TMDB circuit: {get_tmdb_client().breaker.state}")
+        controller = get_admission()
+        st.write(
+            f"Admission tier: {controller.tier()} (Gemini bucket "
+            f"{controller.buckets[admission.GEMINI].level():.0%}, TMDB bucket "
+            f"{controller.buckets[admission.TMDB].level():.0%})"
+        )
+        index = get_recommendation_cache().index
+        if index is not None:
+            semantic_stats = index.stats()
+            st.write(
+                f"Recommendation cache: {semantic_stats['exact']} exact / {semantic_stats['near']} similar hits, "
+                f"{semantic_stats['misses']} misses ({semantic_stats['hit_rate']:.0%}), "
+                f"{semantic_stats['size']} prompts indexed"
+            )
+        poster_stats = get_poster_store().stats()
+        st.write(f"Poster cache: {poster_stats['files']} files, {poster_stats['bytes'] / 1024 / 1024:.1f} MB")
+        single_flight = get_single_flight()
+        st.write(f"Coalesced calls: {single_flight.coalesced} of {single_flight.started + single_flight.coalesced}")
+        for call_site, usage in get_prompt_usage().summary().items():
+            st.write(
+                f"Gemini {call_site}: {usage['calls']} calls, "
+                f"{usage['avg_input_tokens']:.0f} in / {usage['avg_output_tokens']:.0f} out tokens, "
+                f"{usage['avg_latency']:.2f}s avg ({usage['max_latency']:.2f}s max)"
+            )
+        for call_site, latency in get_gemini_latency().summary().items():
+            p50 = f"{latency['p50']:.2f}s" if latency['p50'] is not None else "-"
+            hedge_at = f"{latency['hedge_at']:.2f}s" if latency['hedge_at'] is not None else "cold"
+            st.write(
+                f"Gemini {call_site} latency: p50 {p50}, hedge at {hedge_at}, "
+                f"{latency['hedged']} hedged ({latency['hedge_won']} won), {latency['over_budget']} over budget"
+            )
+        show_trace_panel()
+        st.button("Reset App", on_click=reset_app)
+    
+    # Run the step machine, tracing the run and charging its calls to this
+    # session. The trace goes into the buffer up front so it is kept even if
+    # the run is interrupted.
+    with get_admission().session(get_script_run_ctx().session_id), get_tracer().trace(st.session_state.step) as trace:
+        st.session_state.traces.append(trace)
+        run_steps()
     
     # Show debug info at the bottom for development
     if st.checkbox("Show Debug Info"):
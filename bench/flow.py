@@ -0,0 +1,63 @@
+import logging
+import os
+import random
+import time
+
+from streamlit.testing.v1 import AppTest
+
+# One simulated user going through the app, for run_bench.py. Kept out of the
+# driver script so worker processes can import it by name.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PHASES = ("welcome", "questions", "answer", "recommendations", "total")
+
+# How often a waiting user re-runs the page, standing in for the app's own
+# polling of recommendation jobs
+POLL_INTERVAL = 0.05
+
+# Keep re-running until the app reaches `step`; returns the time taken
+def run_until(at, step, timeout=60.0):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        if at.session_state.step == step:
+            return time.perf_counter() - started
+        time.sleep(POLL_INTERVAL)
+        at.run()
+    raise RuntimeError(f"never reached {step}, stuck at {at.session_state.step}")
+
+# One user going through the whole flow. Returns {phase: [seconds, ...]}.
+def simulate_user(settings, seed, timeout):
+    logging.disable(logging.WARNING)
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    for name, value in settings.items():
+        at.secrets[name] = value
+    samples = {phase: [] for phase in PHASES}
+    started = time.perf_counter()
+
+    phase_started = time.perf_counter()
+    at.run()
+    samples["welcome"].append(time.perf_counter() - phase_started)
+
+    phase_started = time.perf_counter()
+    rng.choice(list(at.main.button)).click().run()
+    run_until(at, "asking_questions")
+    samples["questions"].append(time.perf_counter() - phase_started)
+
+    while at.session_state.step == "asking_questions":
+        options = [button for button in at.main.button if button.key and button.key.startswith("q")]
+        phase_started = time.perf_counter()
+        rng.choice(options).click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        if at.session_state.step == "asking_questions":
+            samples["answer"].append(time.perf_counter() - phase_started)
+
+    # The last answer starts the recommendations phase
+    run_until(at, "show_recommendations", timeout)
+    samples["recommendations"].append(time.perf_counter() - phase_started)
+
+    samples["total"].append(time.perf_counter() - started)
+    return samples
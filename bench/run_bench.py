@@ -0,0 +1,133 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from flow import PHASES, simulate_user
+from stub_server import DEFAULT_FIXTURES_PATH, StubServer
+
+# End-to-end benchmark of the welcome -> questions -> recommendations flow.
+# Simulated users drive app.py headlessly through Streamlit's AppTest against
+# the stub server. AppTest can only run one script at a time per process, so
+# --concurrency worker processes each play users back to back, sharing their
+# process-wide clients and caches like a server process would; the disk
+# cache is shared by all of them. Reports p50/p95/p99 per phase and overall
+# throughput.
+#
+#   python bench/run_bench.py --users 50 --concurrency 8 --gemini-latency-ms 800 --tmdb-latency-ms 120
+
+# Nearest-rank percentile
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+def report(samples, completed, failed, wall_time):
+    lines = [f"{'phase':<16}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}"]
+    summary = {}
+    for phase in PHASES:
+        values = samples[phase]
+        if not values:
+            continue
+        summary[phase] = {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": statistics.fmean(values)
+        }
+        row = summary[phase]
+        lines.append(
+            f"{phase:<16}{row['n']:>6}{row['p50'] * 1000:>8.0f}ms{row['p95'] * 1000:>8.0f}ms"
+            f"{row['p99'] * 1000:>8.0f}ms{row['mean'] * 1000:>8.0f}ms"
+        )
+    throughput = completed / wall_time if wall_time else 0.0
+    lines.append(f"{completed} users in {wall_time:.1f}s ({throughput:.2f} users/s), {failed} failed")
+    return "\n".join(lines), {"phases": summary, "completed": completed, "failed": failed,
+                              "wall_time": wall_time, "throughput": throughput}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation flow offline.")
+    parser.add_argument("--users", type=int, default=20, help="simulated users")
+    parser.add_argument("--concurrency", type=int, default=4, help="users running at the same time")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_PATH, help="fixtures for the stub server")
+    parser.add_argument("--stub-url", help="use a stub server that is already running instead of starting one")
+    parser.add_argument("--tmdb-latency-ms", type=float, default=100.0)
+    parser.add_argument("--gemini-latency-ms", type=float, default=600.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cache-dir", help="app cache directory (default: a fresh temporary one, i.e. cold caches)")
+    parser.add_argument("--setting", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra app setting, e.g. GEMINI_STREAMING=false (repeatable)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per script run timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    stub = None
+    stub_url = args.stub_url
+    if not stub_url:
+        stub = StubServer(
+            args.fixtures,
+            tmdb_latency=args.tmdb_latency_ms / 1000,
+            gemini_latency=args.gemini_latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate
+        ).start()
+        stub_url = stub.url
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="svomo-bench-")
+    settings = {
+        "TMDB_API_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "TMDB_API_BASE": f"{stub_url}/3",
+        "TMDB_IMAGE_BASE": f"{stub_url}/t/p",
+        "GEMINI_TRANSPORT": "rest",
+        "GEMINI_API_ENDPOINT": stub_url,
+        "CACHE_PATH": os.path.join(cache_dir, "cache.sqlite3"),
+        "TMDB_CATALOG_PATH": os.path.join(cache_dir, "catalog.sqlite3")
+    }
+    for setting in args.setting:
+        name, _, value = setting.partition("=")
+        settings[name] = value
+
+    samples = {phase: [] for phase in PHASES}
+    completed = failed = 0
+    started = time.perf_counter()
+    # Spawned workers: AppTest takes over __main__, and forking a threaded process is unsafe
+    with ProcessPoolExecutor(max_workers=args.concurrency, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [
+            executor.submit(simulate_user, settings, args.seed + i, args.timeout)
+            for i in range(args.users)
+        ]
+        for future in as_completed(futures):
+            try:
+                user_samples = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"user failed: {e}", file=sys.stderr)
+                continue
+            completed += 1
+            for phase, values in user_samples.items():
+                samples[phase].extend(values)
+    wall_time = time.perf_counter() - started
+
+    text, results = report(samples, completed, failed, wall_time)
+    print(text)
+    if stub:
+        print(f"stub requests: {stub.counts}")
+        results["stub_requests"] = stub.counts
+        stub.stop()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == "__main__":
+    main()
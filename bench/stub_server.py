@@ -0,0 +1,347 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prompts
+
+# Local stand-in for the TMDB and Gemini APIs, for benchmarking the app offline.
+#
+# Replay (default): answers from a fixtures file, falling back to synthetic
+# responses shaped like the real ones, with optional injected latency and
+# errors.
+#
+# Record (--record): forwards every request to the real API and saves the
+# response to the fixtures file. API keys are forwarded but never stored.
+#
+# Point the app at it with these settings (env or secrets.toml):
+#   TMDB_API_BASE=http://127.0.0.1:8700/3
+#   GEMINI_TRANSPORT=rest
+#   GEMINI_API_ENDPOINT=http://127.0.0.1:8700
+#   TMDB_IMAGE_BASE=http://127.0.0.1:8700/t/p
+#
+# Poster images are always synthetic (never recorded) and count as TMDB for
+# latency.
+
+DEFAULT_FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "fixtures.json")
+DEFAULT_PORT = 8700
+
+UPSTREAMS = {
+    "/3/": "https://api.themoviedb.org",
+    "/v1beta/": "https://generativelanguage.googleapis.com"
+}
+SECRET_PARAMS = {"api_key", "key"}
+SECRET_HEADERS = {"x-goog-api-key", "authorization"}
+FORWARDED_HEADERS = {"accept", "content-type", "x-goog-api-key", "x-goog-api-client", "authorization"}
+
+def service_for(path):
+    if path.startswith("/t/p/"):
+        return "images"
+    return "gemini" if path.startswith("/v1beta/") else "tmdb"
+
+def canonical_query(query):
+    return "&".join(f"{key}={value}" for key, value in sorted(query) if key not in SECRET_PARAMS)
+
+# Request body with keys sorted, so equal JSON bodies compare equal
+def canonical_body(body):
+    try:
+        return json.dumps(json.loads(body), sort_keys=True)
+    except ValueError:
+        return body.decode("utf-8", "replace")
+
+def prompt_text(body):
+    try:
+        return json.loads(body)["contents"][0]["parts"][0]["text"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return ""
+
+# Keys a request is looked up by: an exact one, and a loose one (ids replaced
+# and the Gemini prompt reduced to its first line) used when the exact
+# request was never recorded
+def request_keys(method, path, query, body):
+    exact = hashlib.sha256(
+        f"{method} {path}?{canonical_query(query)}\n{canonical_body(body)}".encode()
+    ).hexdigest()
+    loose = f"{method} {re.sub(r'/[0-9]+', '/{id}', path)} {prompt_text(body).split(chr(10))[0][:60]}"
+    return exact, loose
+
+# Recorded responses, stored as one JSON file
+class FixtureStore:
+    def __init__(self, path):
+        self.path = path
+        self.exact = {}
+        self.loose = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fixtures:
+                for entry in json.load(fixtures)["entries"]:
+                    self._index(entry)
+
+    def _index(self, entry):
+        self.exact[entry['exact']] = entry
+        self.loose.setdefault(entry['loose'], []).append(entry)
+
+    def find(self, exact, loose):
+        with self._lock:
+            entry = self.exact.get(exact)
+            if entry is None and self.loose.get(loose):
+                entry = random.choice(self.loose[loose])
+        return entry
+
+    def add(self, entry):
+        with self._lock:
+            self._index(entry)
+            entries = list(self.exact.values())
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as fixtures:
+            json.dump({"entries": entries}, fixtures, indent=1)
+
+    def __len__(self):
+        return len(self.exact)
+
+# Synthetic TMDB responses: every search finds one title, every id has details
+def synthetic_tmdb(path, query):
+    params = dict(query)
+    search = re.fullmatch(r"/3/search/(movie|tv)", path)
+    if search:
+        title = params.get("query", "Untitled")
+        item_id = int(hashlib.sha256(title.casefold().encode()).hexdigest()[:6], 16)
+        return 200, {"page": 1, "total_results": 1, "results": [synthetic_tmdb_item(item_id, search.group(1), title)]}
+    details = re.fullmatch(r"/3/(movie|tv)/([0-9]+)", path)
+    if details:
+        item = synthetic_tmdb_item(int(details.group(2)), details.group(1), f"Title {details.group(2)}")
+        if "images" in params.get("append_to_response", ""):
+            item["images"] = {"posters": [{"file_path": f"/poster{details.group(2)}.jpg", "vote_average": 5.0}]}
+        return 200, item
+    return 404, {"status_code": 34, "status_message": "The resource you requested could not be found."}
+
+def synthetic_tmdb_item(item_id, media_type, title):
+    item = {
+        "id": item_id,
+        "overview": f"A synthetic overview of {title} for benchmarking. " * 4,
+        "poster_path": f"/poster{item_id}.jpg",
+        "vote_average": 7.4,
+        "popularity": 42.0
+    }
+    if media_type == "movie":
+        item.update(title=title, release_date="2015-06-01")
+    else:
+        item.update(name=title, first_air_date="2015-06-01")
+    return item
+
+# Synthetic poster: a flat 500x750 JPEG whose colour depends on the path
+@lru_cache(maxsize=256)
+def synthetic_poster(path):
+    digest = hashlib.sha256(path.encode()).digest()
+    image = Image.new("RGB", (500, 750), tuple(digest[:3]))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=80)
+    return output.getvalue()
+
+def template_opening(template):
+    return template.split("{")[0].split("\n")[0]
+
+# Synthetic Gemini answer text for a prompt built from prompts.py
+def synthetic_gemini_text(prompt):
+    if prompt.startswith(template_opening(prompts.QUESTIONS_TEMPLATE)):
+        return json.dumps([
+            {"question": f"Synthetic question {i + 1}?", "options": ["Option A", "Option B", "Option C"]}
+            for i in range(8)
+        ])
+    if prompt.startswith(template_opening(prompts.RECOMMENDATIONS_TEMPLATE)):
+        recommendations = [
+            {"title": "The Synthetic Movie", "type": "movie", "reason": "It matches every answer."},
+            {"title": "Stub Series", "type": "tv", "reason": "A long watch for a long night."},
+            {"title": "Replay", "type": "movie", "reason": "Deterministic and fast."}
+        ]
+        if '"description"' in prompt:
+            for rec in recommendations:
+                rec["description"] = f"{rec['title']} glows with neon synthetic charm."
+        return json.dumps(recommendations)
+    if prompt.startswith(template_opening(prompts.BATCH_DESCRIPTION_TEMPLATE)):
+        count = len(re.findall(r"^\[[0-9]+\]", prompt, re.MULTILINE))
+        return json.dumps({str(i): f"Synthetic description {i}, beamed in from the future." for i in range(count)})
+    return "A synthetic description, beamed in from the future."
+
+def gemini_response(text):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": prompts.estimate_tokens(text)}
+    }
+
+def synthetic_gemini(path, body):
+    prompt = prompt_text(body)
+    text = synthetic_gemini_text(prompt)
+    if ":streamGenerateContent" in path:
+        # The REST transport reads a stream as one JSON array of responses
+        size = max(len(text) // 3, 1)
+        chunks = [gemini_response(text[i:i + size]) for i in range(0, len(text), size)]
+        for chunk in chunks:
+            chunk["usageMetadata"]["promptTokenCount"] = prompts.estimate_tokens(prompt)
+        return 200, chunks
+    response = gemini_response(text)
+    response["usageMetadata"]["promptTokenCount"] = prompts.estimate_tokens(prompt)
+    return 200, response
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        stub = self.server.stub
+        url = urlsplit(self.path)
+        query = parse_qsl(url.query, keep_blank_values=True)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        service = service_for(url.path)
+        stub.count(service)
+
+        if service == "images":
+            time.sleep(stub.latency("tmdb"))
+            return self.reply(200, "image/jpeg", synthetic_poster(url.path))
+
+        if stub.record:
+            status, content_type, payload = stub.forward(self.command, self.path, self.headers, body)
+            exact, loose = request_keys(self.command, url.path, query, body)
+            if status < 500:
+                stub.store.add({
+                    "exact": exact,
+                    "loose": loose,
+                    "status": status,
+                    "content_type": content_type,
+                    "body": payload.decode("utf-8", "replace")
+                })
+            return self.reply(status, content_type, payload)
+
+        time.sleep(stub.latency(service))
+        if random.random() < stub.error_rate:
+            stub.count("errors")
+            return self.reply(503, "application/json", b'{"error": "injected"}', {"Retry-After": "0"})
+
+        entry = stub.store.find(*request_keys(self.command, url.path, query, body))
+        if entry is not None:
+            stub.count("replayed")
+            return self.reply(entry["status"], entry["content_type"], entry["body"].encode())
+
+        stub.count("synthetic")
+        if service == "gemini":
+            status, payload = synthetic_gemini(url.path, body)
+        else:
+            status, payload = synthetic_tmdb(url.path, query)
+        self.reply(status, "application/json", json.dumps(payload).encode())
+
+    def reply(self, status, content_type, payload, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+# The stub server. Latencies are in seconds; each request gets the service's
+# latency plus uniform jitter, and fails with a 503 at `error_rate`.
+class StubServer:
+    def __init__(self, fixtures_path=DEFAULT_FIXTURES_PATH, port=0, record=False,
+                 tmdb_latency=0.0, gemini_latency=0.0, jitter=0.0, error_rate=0.0):
+        self.store = FixtureStore(fixtures_path)
+        self.record = record
+        self.latencies = {"tmdb": tmdb_latency, "gemini": gemini_latency}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.counts = {}
+        self._lock = threading.Lock()
+        self.http = httpx.Client(timeout=60) if record else None
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def latency(self, service):
+        return max(self.latencies[service] + random.uniform(-self.jitter, self.jitter), 0.0)
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def forward(self, method, path, headers, body):
+        upstream = next(base for prefix, base in UPSTREAMS.items() if path.startswith(prefix))
+        response = self.http.request(
+            method,
+            upstream + path,
+            headers={name: value for name, value in headers.items() if name.lower() in FORWARDED_HEADERS},
+            content=body
+        )
+        return response.status_code, response.headers.get("content-type", "application/json"), response.content
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="bench-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay (or record) TMDB and Gemini responses for offline benchmarks.")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_PATH, help="fixtures file to replay from or record into")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--record", action="store_true", help="forward to the real APIs and save the responses")
+    parser.add_argument("--tmdb-latency-ms", type=float, default=0.0, help="injected latency per TMDB request")
+    parser.add_argument("--gemini-latency-ms", type=float, default=0.0, help="injected latency per Gemini request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform jitter added to the injected latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--seed", type=int, help="random seed for jitter and errors")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    stub = StubServer(
+        args.fixtures,
+        args.port,
+        args.record,
+        args.tmdb_latency_ms / 1000,
+        args.gemini_latency_ms / 1000,
+        args.jitter_ms / 1000,
+        args.error_rate
+    )
+    mode = "Recording into" if args.record else "Replaying"
+    print(f"{mode} {args.fixtures} ({len(stub.store)} fixtures) on {stub.url}")
+    print(f"  TMDB_API_BASE={stub.url}/3 GEMINI_TRANSPORT=rest GEMINI_API_ENDPOINT={stub.url} TMDB_IMAGE_BASE={stub.url}/t/p")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Requests: {stub.counts}")
+
+if __name__ == "__main__":
+    main()
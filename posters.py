@@ -0,0 +1,157 @@
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+# Local poster pipeline. Each source image is resized once to a few widths and
+# re-encoded as WebP and JPEG. The variants go into a directory served by
+# Streamlit's static file serving, named after a hash of the source image, so
+# a URL always means the same bytes and browsers can keep it cached. The
+# directory is trimmed back to a byte budget, least recently used first.
+
+# Widths written for every poster; the cards pick one with srcset
+POSTER_WIDTHS = (185, 342, 500)
+
+# Output formats: file extension -> (Pillow format, save options)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True})
+}
+
+# Width of the variant used where only one URL fits (e.g. a plain <img>)
+DEFAULT_WIDTH = 342
+
+# TMDB posters are 2:3
+POSTER_ASPECT = 1.5
+
+# Eviction brings the directory down to this share of the budget, so it
+# doesn't run again on the very next write
+EVICTION_TARGET = 0.9
+
+# Content address of a source image
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()[:24]
+
+# Resize and encode one source image. Images are never upscaled: a source
+# narrower than a target width is stored at its own size under that width.
+# Returns {(width, extension): bytes}.
+def render_variants(data, widths=POSTER_WIDTHS):
+    variants = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for width in widths:
+            resized = image
+            if image.width > width:
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            for extension, (image_format, options) in FORMATS.items():
+                output = io.BytesIO()
+                resized.save(output, image_format, **options)
+                variants[(width, extension)] = output.getvalue()
+    return variants
+
+# Retro "no signal" poster, used when the placeholder image can't be fetched
+def draw_placeholder(width=max(POSTER_WIDTHS)):
+    height = round(width * POSTER_ASPECT)
+    image = Image.new("RGB", (width, height), "#000020")
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 6):
+        draw.line([(0, y), (width, y)], fill="#0a0a3a")
+    draw.rectangle([4, 4, width - 5, height - 5], outline="#ff00ff", width=4)
+    font = ImageFont.load_default(size=width // 9)
+    draw.text((width / 2, height / 2), "NO SIGNAL", fill="#00ffff", font=font, anchor="mm")
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+# Directory of poster variants, keyed by content_key(). `url_prefix` is where
+# the directory is served from.
+class PosterStore:
+    def __init__(self, directory, url_prefix, max_bytes):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        entries = self._scan()
+        self.files = len(entries)
+        self.bytes = sum(size for _, size, _, _ in entries)
+
+    def _path(self, key, width, extension):
+        return os.path.join(self.directory, f"{key}-{width}.{extension}")
+
+    def url(self, key, width=DEFAULT_WIDTH, extension="jpg"):
+        return f"{self.url_prefix}/{key}-{width}.{extension}"
+
+    # srcset attribute value listing every width of one format
+    def srcset(self, key, extension):
+        return ", ".join(f"{self.url(key, width, extension)} {width}w" for width in POSTER_WIDTHS)
+
+    # Whether all variants of a poster are on disk. Marks the poster as used
+    # for eviction.
+    def has(self, key):
+        paths = [self._path(key, width, extension) for width in POSTER_WIDTHS for extension in FORMATS]
+        try:
+            for path in paths:
+                os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    # Store a source image's variants and return its key. Does the resizing,
+    # so call it off the event loop.
+    def add(self, data):
+        key = content_key(data)
+        if self.has(key):
+            return key
+        for (width, extension), variant in render_variants(data).items():
+            path = self._path(key, width, extension)
+            # Write then rename so a browser never gets half a file
+            temporary = f"{path}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as output:
+                output.write(variant)
+            os.replace(temporary, path)
+        self.evict(keep=key)
+        return key
+
+    # (mtime, size, path, name) of every finished file in the directory
+    def _scan(self):
+        entries = []
+        with os.scandir(self.directory) as files:
+            for entry in files:
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        return entries
+
+    # Delete the least recently used posters until the directory fits the
+    # budget. `keep` is never deleted. Runs after every add(), so it also
+    # brings the counters reported by stats() up to date.
+    def evict(self, keep=None):
+        with self._lock:
+            entries = self._scan()
+            total = sum(size for _, size, _, _ in entries)
+            removed = 0
+            if total > self.max_bytes:
+                for _, size, path, name in sorted(entries):
+                    if total <= self.max_bytes * EVICTION_TARGET:
+                        break
+                    if keep and name.startswith(f"{keep}-"):
+                        continue
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    removed += 1
+            self.files = len(entries) - removed
+            self.bytes = total
+            return removed
+
+    # Size of the directory as of the last add() (or startup), without
+    # touching the disk, so it is cheap enough for every rerun
+    def stats(self):
+        with self._lock:
+            return {"files": self.files, "bytes": self.bytes}
@@ -0,0 +1,142 @@
+import threading
+
+# Prompt templates for every Gemini call, plus the per-call-site usage
+# counters used to tune them. Each template is compacted once at import time
+# and every free-text field is capped to a token budget before it goes in.
+
+# Gemini averages roughly four characters per token for English text; used to
+# size field budgets and when a response carries no usage metadata
+CHARS_PER_TOKEN = 4
+
+# Token budgets for fields pasted into prompts
+OVERVIEW_TOKEN_BUDGET = 120
+REASON_TOKEN_BUDGET = 60
+QUESTION_TOKEN_BUDGET = 30
+ANSWER_TOKEN_BUDGET = 20
+TITLE_TOKEN_BUDGET = 20
+
+# Strip indentation and blank lines from a template
+def compact(template):
+    return "\n".join(line.strip() for line in template.strip().splitlines() if line.strip())
+
+# Rough token count for a piece of text
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+# Cut text down to about `budget` tokens, on a word boundary
+def truncate_to_tokens(text, budget):
+    text = " ".join(str(text or "").split())
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0] or text[:limit]
+    return cut.rstrip(" ,.;:") + "…"
+
+QUESTIONS_TEMPLATE = compact("""
+    Write 8 questions that help recommend movies or shows to this persona: {persona}.
+    Each question has 2-4 short answer options.
+    Cover: mood, watching companions, available time, movie or series length, themes, new releases vs classics, languages/regions.
+    Return only a JSON array of {{"question": string, "options": [string]}} objects.
+""")
+
+RECOMMENDATIONS_TEMPLATE = compact("""
+    Recommend exactly 3 movies or TV shows for this user.
+    Persona: {persona}
+    {answers}
+    Return only a JSON array of {{"title": string, "type": "movie" or "tv", "reason": string{description_field}}} objects.
+    title: exactly as listed on TheMovieDB. reason: why it fits these answers, 2-3 sentences max.{description_rule}
+""")
+
+INLINE_DESCRIPTION_FIELD = ', "description": string'
+INLINE_DESCRIPTION_RULE = " description: an appealing 2-3 sentence pitch in a vibrant retro-futuristic tone."
+
+DESCRIPTION_TEMPLATE = compact("""
+    Write an appealing 2-3 sentence description of this {media_type} in a vibrant retro-futuristic tone, saying why it fits the reason given.
+    Title: {title}
+    Overview: {overview}
+    Reason: {reason}
+""")
+
+BATCH_DESCRIPTION_TEMPLATE = compact("""
+    For each title below, write an appealing 2-3 sentence description in a vibrant retro-futuristic tone, saying why it fits the reason given.
+    {items}
+    Return only a JSON object mapping each bracketed number to its description, e.g. {{"0": "..."}}.
+""")
+
+BATCH_DESCRIPTION_ITEM = compact("""
+    [{index}] {title} ({media_type})
+    Overview: {overview}
+    Reason: {reason}
+""")
+
+def questions_prompt(persona):
+    return QUESTIONS_TEMPLATE.format(persona=persona)
+
+# `qa_pairs` is a list of (question, answer) strings
+def recommendations_prompt(persona, qa_pairs, inline_descriptions=False):
+    answers = "\n".join(
+        f"Q: {truncate_to_tokens(question, QUESTION_TOKEN_BUDGET)} A: {truncate_to_tokens(answer, ANSWER_TOKEN_BUDGET)}"
+        for question, answer in qa_pairs
+    )
+    return RECOMMENDATIONS_TEMPLATE.format(
+        persona=persona,
+        answers=answers,
+        description_field=INLINE_DESCRIPTION_FIELD if inline_descriptions else "",
+        description_rule=INLINE_DESCRIPTION_RULE if inline_descriptions else ""
+    )
+
+def description_prompt(title, media_type, overview, reason):
+    return DESCRIPTION_TEMPLATE.format(
+        title=truncate_to_tokens(title, TITLE_TOKEN_BUDGET),
+        media_type=media_type,
+        overview=truncate_to_tokens(overview, OVERVIEW_TOKEN_BUDGET),
+        reason=truncate_to_tokens(reason, REASON_TOKEN_BUDGET)
+    )
+
+# `items` is a list of dicts with title, overview, media_type and reason
+def batch_description_prompt(items):
+    return BATCH_DESCRIPTION_TEMPLATE.format(items="\n".join(
+        BATCH_DESCRIPTION_ITEM.format(
+            index=i,
+            title=truncate_to_tokens(item['title'], TITLE_TOKEN_BUDGET),
+            media_type=item['media_type'],
+            overview=truncate_to_tokens(item['overview'], OVERVIEW_TOKEN_BUDGET),
+            reason=truncate_to_tokens(item['reason'], REASON_TOKEN_BUDGET)
+        )
+        for i, item in enumerate(items)
+    ))
+
+# Token counts and latency per call site. Token counts come from the
+# response's usage_metadata; when that's missing the input side is estimated
+# from the prompt and the output side is left out.
+class PromptUsage:
+    def __init__(self):
+        self.sites = {}
+        self._lock = threading.Lock()
+
+    def record(self, call_site, prompt, usage_metadata, latency):
+        input_tokens = getattr(usage_metadata, 'prompt_token_count', 0) or estimate_tokens(prompt)
+        output_tokens = getattr(usage_metadata, 'candidates_token_count', 0) or 0
+        with self._lock:
+            site = self.sites.setdefault(call_site, {
+                'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'latency': 0.0, 'max_latency': 0.0
+            })
+            site['calls'] += 1
+            site['input_tokens'] += input_tokens
+            site['output_tokens'] += output_tokens
+            site['latency'] += latency
+            site['max_latency'] = max(site['max_latency'], latency)
+
+    # Per-site averages, for display
+    def summary(self):
+        with self._lock:
+            return {
+                call_site: {
+                    'calls': site['calls'],
+                    'avg_input_tokens': site['input_tokens'] / site['calls'],
+                    'avg_output_tokens': site['output_tokens'] / site['calls'],
+                    'avg_latency': site['latency'] / site['calls'],
+                    'max_latency': site['max_latency']
+                }
+                for call_site, site in self.sites.items()
+            }
@@ -0,0 +1,196 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+# Near-duplicate lookup for recommendation prompts. Gemini words its questions
+# differently from session to session, so two people giving the same answers
+# to the same questions rarely produce the same exact cache key. Only the
+# question wording is matched loosely: prompts are grouped by everything that
+# has to be equal (for recommendations: persona, prompt version and the exact
+# answers), and each question is embedded with a hashed n-gram vectorizer (no
+# model to download). A lookup returns the stored prompt in the same group
+# whose least similar question is most similar to the query's question at the
+# same position, and the caller decides whether that is close enough.
+#
+# Lookups are approximate: random-hyperplane LSH codes of the whole prompt
+# pick the candidates (stored prompts sharing a code with the query in at
+# least one table), and only those are compared question by question.
+
+DIMENSIONS = 1024
+
+# Character n-grams catch rewordings and typos; whole words and word pairs
+# keep the meaning of longer questions
+NGRAM_SIZES = (3, 4, 5)
+
+# LSH tables and bits per table. With 12 x 6 bits, prompts whose summary
+# vectors are at cosine 0.75 (typical for a fully reworded prompt) are
+# candidates for each other about 94% of the time, unrelated ones about 17%.
+LSH_TABLES = 12
+LSH_BITS = 6
+
+# Upper bounds of the similarity histogram buckets
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 1.0)
+
+# Outcomes counted by SemanticIndex.observe()
+EXACT = "exact"
+NEAR = "near"
+MISS = "miss"
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def _features(text):
+    words = WORD_PATTERN.findall(text.lower())
+    yield from words
+    yield from (f"{first} {second}" for first, second in zip(words, words[1:]))
+    padded = f" {' '.join(words)} "
+    for size in NGRAM_SIZES:
+        yield from (f"#{padded[i:i + size]}" for i in range(len(padded) - size + 1))
+
+# Embed a text as a unit vector
+def embed(text, dimensions=DIMENSIONS):
+    vector = np.zeros(dimensions, np.float32)
+    hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in _features(text)), np.uint32)
+    # Signed hashing: the top bit picks the sign, so collisions cancel out on
+    # average instead of piling up
+    np.add.at(vector, hashes % dimensions, np.where(hashes >> 31, -1.0, 1.0).astype(np.float32))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+# Embed each text of a prompt; returns an (n, dimensions) matrix
+def embed_texts(texts, dimensions=DIMENSIONS):
+    return np.stack([embed(text, dimensions) for text in texts]) if texts else np.zeros((0, dimensions), np.float32)
+
+# Stable integer id of a group of prompts that may be matched with each other
+def group_id(*parts):
+    return zlib.crc32("\x1f".join(str(part) for part in parts).encode())
+
+# Fixed-size index of prompts (embed_texts() matrices) keyed by cache key.
+# When full, the oldest entry is overwritten.
+class SemanticIndex:
+    def __init__(self, capacity, dimensions=DIMENSIONS, seed=0):
+        self.capacity = max(int(capacity), 1)
+        self.vectors = np.zeros((self.capacity, dimensions), np.float32)
+        self.codes = np.zeros((self.capacity, LSH_TABLES), np.uint16)
+        self.groups = np.zeros(self.capacity, np.int64)
+        self.used = np.zeros(self.capacity, bool)
+        self.keys = [None] * self.capacity
+        self.texts = [None] * self.capacity
+        self.slots = {}
+        self.next_slot = 0
+        self.planes = np.random.default_rng(seed).standard_normal((LSH_TABLES * LSH_BITS, dimensions)).astype(np.float32)
+        self.bit_values = (1 << np.arange(LSH_BITS)).astype(np.uint16)
+        self.outcomes = {}
+        self.histogram = {}
+        self.similarity_sums = {}
+        self._lock = threading.Lock()
+
+    def _codes(self, vector):
+        bits = (self.planes @ vector > 0).reshape(LSH_TABLES, LSH_BITS)
+        return bits @ self.bit_values
+
+    # Whole-prompt vector the LSH codes are taken from
+    @staticmethod
+    def _summary(texts):
+        vector = texts.sum(axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, key, group, texts):
+        vector = self._summary(texts)
+        codes = self._codes(vector)
+        with self._lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.next_slot
+                self.next_slot = (slot + 1) % self.capacity
+                if self.keys[slot] is not None:
+                    del self.slots[self.keys[slot]]
+                self.keys[slot] = key
+                self.slots[key] = slot
+            self.vectors[slot] = vector
+            self.texts[slot] = texts
+            self.codes[slot] = codes
+            self.groups[slot] = group
+            self.used[slot] = True
+
+    def remove(self, key):
+        with self._lock:
+            slot = self.slots.pop(key, None)
+            if slot is not None:
+                self.keys[slot] = None
+                self.texts[slot] = None
+                self.used[slot] = False
+
+    # Most similar stored prompt in the group, as (key, similarity), or (None,
+    # None) if there are no candidates. The similarity of two prompts is the
+    # lowest cosine similarity between their texts at the same position.
+    def nearest(self, group, texts):
+        codes = self._codes(self._summary(texts))
+        with self._lock:
+            candidates = np.flatnonzero(self.used & (self.groups == group) & (self.codes == codes).any(axis=1))
+            # Guards against a group id collision between prompt lengths
+            candidates = [slot for slot in candidates if self.texts[slot].shape == texts.shape]
+            if not candidates:
+                return None, None
+            stored = np.stack([self.texts[slot] for slot in candidates])
+            keys = [self.keys[slot] for slot in candidates]
+        similarities = np.einsum("knd,nd->kn", stored, texts).min(axis=1)
+        best = int(similarities.argmax())
+        return keys[best], float(similarities[best])
+
+    # Count a cache lookup. `similarity` is the nearest stored prompt's, for
+    # lookups that went past the exact key.
+    def observe(self, outcome, similarity=None):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if similarity is not None:
+                bucket = next((bound for bound in SIMILARITY_BUCKETS if similarity <= bound), SIMILARITY_BUCKETS[-1])
+                self.histogram[(outcome, bucket)] = self.histogram.get((outcome, bucket), 0) + 1
+                self.similarity_sums[outcome] = self.similarity_sums.get(outcome, 0.0) + similarity
+
+    def stats(self):
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            size = len(self.slots)
+        lookups = sum(outcomes.values())
+        hits = outcomes.get(EXACT, 0) + outcomes.get(NEAR, 0)
+        return {
+            'size': size,
+            'exact': outcomes.get(EXACT, 0),
+            'near': outcomes.get(NEAR, 0),
+            'misses': outcomes.get(MISS, 0),
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+    # Prometheus text exposition format. The similarity histogram is split by
+    # outcome: "near" lookups were served a neighbour's results, "miss"
+    # lookups had one that was not similar enough.
+    def export_prometheus(self, prefix="svomo_semantic_cache"):
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            histogram = dict(self.histogram)
+            sums = dict(self.similarity_sums)
+            size = len(self.slots)
+        lines = [
+            f"# HELP {prefix}_entries Prompts in the index.",
+            f"# TYPE {prefix}_entries gauge",
+            f"{prefix}_entries {size}",
+            f"# HELP {prefix}_lookups_total Recommendation cache lookups by outcome.",
+            f"# TYPE {prefix}_lookups_total counter"
+        ]
+        lines += [f'{prefix}_lookups_total{{outcome="{outcome}"}} {count}' for outcome, count in sorted(outcomes.items())]
+        lines += [
+            f"# HELP {prefix}_similarity Similarity (least similar question) of the nearest stored prompt on exact-key misses.",
+            f"# TYPE {prefix}_similarity histogram"
+        ]
+        for outcome in (NEAR, MISS):
+            cumulative = 0
+            for bound in SIMILARITY_BUCKETS:
+                cumulative += histogram.get((outcome, bound), 0)
+                lines.append(f'{prefix}_similarity_bucket{{outcome="{outcome}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_similarity_bucket{{outcome="{outcome}",le="+Inf"}} {cumulative}')
+            lines.append(f'{prefix}_similarity_sum{{outcome="{outcome}"}} {sums.get(outcome, 0.0):.4f}')
+            lines.append(f'{prefix}_similarity_count{{outcome="{outcome}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,14 @@
+import logging
+import os
+import sys
+import tempfile
+
+# app.py is a Streamlit script: point its caches at a scratch directory before
+# it is imported, and silence the warnings Streamlit logs for st.* calls made
+# outside a script run
+_scratch = tempfile.mkdtemp(prefix="svomo-tests-")
+os.environ.setdefault("CACHE_PATH", os.path.join(_scratch, "cache.sqlite3"))
+os.environ.setdefault("TMDB_CATALOG_PATH", os.path.join(_scratch, "catalog.sqlite3"))
+logging.disable(logging.WARNING)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+import time
+
+import admission
+
+def limits(rate=0.0, burst=4, session_rate=0.0, session_burst=2):
+    return {
+        resource: ((rate, burst), (session_rate, session_burst))
+        for resource in (admission.STEPS, admission.GEMINI, admission.TMDB)
+    }
+
+def test_bucket_refuses_when_empty_and_refills():
+    bucket = admission.TokenBucket(rate=100, burst=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    time.sleep(0.02)
+    assert bucket.try_acquire()
+
+def test_bucket_never_exceeds_its_burst():
+    bucket = admission.TokenBucket(rate=1000, burst=3)
+    bucket.refund(10)
+    time.sleep(0.01)
+    assert bucket.available() == 3
+
+def test_session_limit_is_hit_before_the_process_limit():
+    controller = admission.AdmissionController(limits(burst=3), 0.5, 0.2)
+    with controller.session("a"):
+        assert controller.admit(admission.GEMINI) == admission.ADMITTED
+        assert controller.admit(admission.GEMINI) == admission.ADMITTED
+        assert controller.admit(admission.GEMINI) == admission.SESSION_LIMITED
+    with controller.session("b"):
+        assert controller.admit(admission.GEMINI) == admission.ADMITTED
+        assert controller.admit(admission.GEMINI) == admission.GLOBAL_LIMITED
+
+def test_refused_session_token_is_refunded():
+    controller = admission.AdmissionController(limits(burst=1, session_burst=2), 0.5, 0.2)
+    controller.admit(admission.GEMINI)
+    with controller.session("a"):
+        assert controller.admit(admission.GEMINI) == admission.GLOBAL_LIMITED
+        assert controller._session_buckets("a")[admission.GEMINI].available() == 2
+
+def test_tiers_follow_the_gemini_bucket():
+    controller = admission.AdmissionController(limits(burst=10, session_burst=10), 0.5, 0.2)
+    assert controller.tier() == "normal"
+    controller.buckets[admission.GEMINI].try_acquire(6)
+    assert controller.tier() == "cache"
+    controller.buckets[admission.GEMINI].try_acquire(3)
+    assert controller.tier() == "canned"
+    controller.buckets[admission.STEPS].try_acquire(10)
+    assert controller.tier() == "reject"
+
+def test_calls_outside_a_session_only_use_the_process_bucket():
+    controller = admission.AdmissionController(limits(burst=3, session_burst=1), 0.5, 0.2)
+    assert [controller.admit(admission.TMDB) for _ in range(3)] == [admission.ADMITTED] * 3
+    assert controller.sessions == {}
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+import app
+
+def test_closing_iterate_async_cancels_the_pump():
+    released = threading.Event()
+
+    async def numbers():
+        try:
+            for i in range(1000):
+                yield i
+                await asyncio.sleep(0.01)
+        finally:
+            released.set()
+
+    for item in app.iterate_async(numbers()):
+        break
+    assert released.wait(2)
+
+def test_iterate_async_reraises_errors():
+    async def failing():
+        yield 1
+        raise ValueError("boom")
+
+    items = []
+    with pytest.raises(ValueError, match="boom"):
+        for item in app.iterate_async(failing()):
+            items.append(item)
+    assert items == [1]
+
+class UnreachableHTTP:
+    def __init__(self):
+        self.timeouts = []
+
+    async def get(self, path, params=None, timeout=None):
+        self.timeouts.append(timeout)
+        await asyncio.sleep(0.05)
+        raise httpx.ConnectError("unreachable")
+
+def test_tmdb_retries_stay_within_the_request_budget(monkeypatch):
+    monkeypatch.setattr(app, "TMDB_REQUEST_BUDGET", 1.5)
+    monkeypatch.setattr(app, "TMDB_MIN_ATTEMPT_TIME", 0.2)
+    client = app.TMDBClient("test")
+    http = UnreachableHTTP()
+    monkeypatch.setattr(client, "_client", lambda: http)
+    monkeypatch.setattr(client, "_backoff", lambda attempt, retry_after=None: 0.5)
+
+    started = time.monotonic()
+    assert asyncio.run(client._get_with_retries("/search/movie", {})) is None
+    assert time.monotonic() - started < 1.5
+    # 0.05s attempt + 0.5s backoff each: the third retry wouldn't fit
+    assert len(http.timeouts) == 3
+    assert all(timeout.read <= 1.5 for timeout in http.timeouts)
+    assert client.breaker.failures == 1
+
+def test_disk_cache_async_round_trip(tmp_path):
+    cache = app.DiskCache(str(tmp_path / "cache.sqlite3"), "test", 10)
+
+    async def round_trip():
+        assert await cache.get_async(["a"]) is app.CACHE_MISS
+        await cache.set_async(["a"], {'value': 1}, 60)
+        return await cache.get_async(["a"])
+
+    assert asyncio.run(round_trip()) == {'value': 1}
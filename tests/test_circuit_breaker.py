@@ -0,0 +1,48 @@
+import time
+
+import app
+
+def test_opens_after_the_failure_threshold():
+    breaker = app.CircuitBreaker(failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow_request() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow_request() is False
+
+def test_success_resets_the_failure_count():
+    breaker = app.CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_half_open_allows_a_single_trial():
+    breaker = app.CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow_request() == "trial"
+    assert breaker.allow_request() is False
+
+def test_successful_trial_closes_the_breaker():
+    breaker = app.CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    breaker.record_failure()
+    assert breaker.allow_request() == "trial"
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow_request() is True
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = app.CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.opened_at = time.monotonic() - 61
+    assert breaker.allow_request() == "trial"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_released_trial_can_be_taken_again():
+    breaker = app.CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    breaker.record_failure()
+    assert breaker.allow_request() == "trial"
+    breaker.release_trial()
+    assert breaker.allow_request() == "trial"
@@ -0,0 +1,62 @@
+import pytest
+
+import app
+
+@pytest.fixture
+def cache(tmp_path):
+    return app.DiskCache(str(tmp_path / "cache.sqlite3"), "test", 3)
+
+def test_miss_then_hit(cache):
+    assert cache.get(["search", "movie", "Heat"]) is app.CACHE_MISS
+    cache.set(["search", "movie", "Heat"], {'id': 949}, 60)
+    assert cache.get(["search", "movie", "Heat"]) == {'id': 949}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+def test_cached_none_is_a_hit(cache):
+    # A remembered "not found" must not look like a miss
+    cache.set(["search", "movie", "No Such Film"], None, 60)
+    assert cache.get(["search", "movie", "No Such Film"]) is None
+
+def test_expired_entries_miss(cache):
+    cache.set(["details", "movie", 949], {'title': "Heat"}, -1)
+    assert cache.get(["details", "movie", 949]) is app.CACHE_MISS
+
+def test_least_recently_used_entries_are_evicted(cache, monkeypatch):
+    monkeypatch.setattr(app, "CACHE_TOUCH_INTERVAL", 0)
+    for i in range(3):
+        cache.set([i], i, 60)
+    cache.get([0])
+    cache.set([3], 3, 60)
+    assert cache.get([1]) is app.CACHE_MISS
+    assert [cache.get([i]) for i in (0, 2, 3)] == [0, 2, 3]
+
+def access_time(cache, key):
+    return cache._connect().execute(
+        "SELECT accessed_at FROM cache_entries WHERE key = ?", (app.json.dumps(key),)
+    ).fetchone()[0]
+
+def test_recent_hits_do_not_write(cache, monkeypatch):
+    cache.set(["key"], 1, 60)
+    written = access_time(cache, ["key"])
+    cache.get(["key"])
+    assert access_time(cache, ["key"]) == written
+    monkeypatch.setattr(app, "CACHE_TOUCH_INTERVAL", 0)
+    cache.get(["key"])
+    assert access_time(cache, ["key"]) > written
+
+def test_entry_count_is_refreshed_periodically(cache, monkeypatch):
+    assert cache.stats()['size'] == 0
+    cache.set(["key"], 1, 60)
+    assert cache.stats()['size'] == 0
+    monkeypatch.setattr(app, "CACHE_STATS_INTERVAL", -1)
+    assert cache.stats()['size'] == 1
+
+def test_namespaces_are_separate(tmp_path, cache):
+    other = app.DiskCache(str(tmp_path / "cache.sqlite3"), "other", 3)
+    cache.set(["key"], "test", 60)
+    assert other.get(["key"]) is app.CACHE_MISS
+
+def test_miss_marker_survives_a_rerun():
+    assert app.get_cache_miss_marker() is app.CACHE_MISS
@@ -0,0 +1,17 @@
+import pytest
+
+import app
+
+@pytest.mark.parametrize("text, expected", [
+    ('[{"title": "Heat"}]', [{'title': "Heat"}]),
+    ('```json\n{"questions": []}\n```', {'questions': []}),
+    ('Here you go: [1, 2] Enjoy!', [1, 2]),
+    # Cut off mid-response: the complete elements are kept
+    ('[{"title": "Heat"}, {"title": "Da', [{'title': "Heat"}]),
+])
+def test_usable_json_is_extracted(text, expected):
+    assert app.extract_json(text) == expected
+
+@pytest.mark.parametrize("text", [None, "", "No JSON here", '{"title": "Hea', '[{"title": "Hea'])
+def test_nothing_usable_is_none(text):
+    assert app.extract_json(text) is None
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import admission
+import app
+
+class StubAdmission:
+    def __init__(self, tier="normal"):
+        self.current = tier
+        self.admitted = 0
+
+    def tier(self):
+        return self.current
+
+    def admit(self, resource, cost=1.0):
+        self.admitted += 1
+        return admission.ADMITTED
+
+class ScriptedClient:
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.calls = 0
+
+    async def generate(self, prompt, generation_config=None):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        return f"answer after {delay}"
+
+@pytest.fixture
+def latency(monkeypatch):
+    # Built before get_admission is replaced, as it registers its collector
+    app.get_tracer()
+    tracker = app.GeminiLatency()
+    monkeypatch.setattr(app, "get_gemini_latency", lambda: tracker)
+    monkeypatch.setitem(app.GEMINI_CALL_BUDGETS, "test", 1.0)
+    return tracker
+
+def run(client):
+    return asyncio.run(app.hedged_generate(client, "prompt", None, "test"))
+
+def test_hedge_wins_and_latency_is_timed_from_the_first_attempt(latency, monkeypatch):
+    monkeypatch.setattr(app, "get_admission", StubAdmission)
+    assert run(ScriptedClient(0.9, 0.05)) == "answer after 0.05"
+    assert latency.summary()['test']['hedge_won'] == 1
+    # Cold start: the hedge goes out at half the budget
+    assert list(latency.samples['test'])[0] == pytest.approx(0.55, abs=0.05)
+
+def test_over_budget_calls_are_recorded_at_the_budget(latency, monkeypatch):
+    monkeypatch.setattr(app, "get_admission", StubAdmission)
+    assert run(ScriptedClient(3.0)) is None
+    assert latency.summary()['test']['over_budget'] == 1
+    assert list(latency.samples['test']) == [pytest.approx(1.0, abs=0.05)]
+
+def test_no_hedge_outside_the_normal_tier(latency, monkeypatch):
+    controller = StubAdmission("cache")
+    monkeypatch.setattr(app, "get_admission", lambda: controller)
+    client = ScriptedClient(0.7, 0.05)
+    assert run(client) == "answer after 0.7"
+    assert client.calls == 1
+    assert controller.admitted == 0
+
+def test_slow_samples_raise_the_hedge_delay(latency):
+    for _ in range(app.GEMINI_HEDGE_MIN_SAMPLES):
+        latency.record("test", 0.1)
+    fast = latency.hedge_delay("test", 1.0)
+    for _ in range(app.GEMINI_HEDGE_MIN_SAMPLES):
+        latency.record("test", 1.0)
+    assert latency.hedge_delay("test", 1.0) > fast
+    assert latency.hedge_delay("test", 1.0) == pytest.approx(1.0)
@@ -0,0 +1,28 @@
+import os
+
+import posters
+
+def test_stats_track_adds_without_scanning(tmp_path, monkeypatch):
+    store = posters.PosterStore(str(tmp_path), "app/static/posters", 10 * 1024 * 1024)
+    assert store.stats() == {"files": 0, "bytes": 0}
+    store.add(posters.draw_placeholder())
+    on_disk = [entry.stat().st_size for entry in os.scandir(tmp_path)]
+
+    def scandir(path):
+        raise AssertionError("stats() scanned the directory")
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    assert store.stats() == {"files": len(posters.POSTER_WIDTHS) * len(posters.FORMATS), "bytes": sum(on_disk)}
+
+def test_stats_follow_eviction(tmp_path):
+    store = posters.PosterStore(str(tmp_path), "app/static/posters", 1)
+    first = store.add(posters.draw_placeholder(300))
+    second = store.add(posters.draw_placeholder(400))
+    # Only the poster just added survives a budget it can't fit in
+    assert not store.has(first) and store.has(second)
+    assert store.stats()["files"] == len(os.listdir(tmp_path))
+
+def test_existing_files_are_counted_at_startup(tmp_path):
+    posters.PosterStore(str(tmp_path), "app/static/posters", 10 * 1024 * 1024).add(posters.draw_placeholder())
+    restarted = posters.PosterStore(str(tmp_path), "app/static/posters", 10 * 1024 * 1024)
+    assert restarted.stats()["files"] == len(os.listdir(tmp_path))
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+import app
+
+QUESTIONS = [{'question': "What mood are you in right now?", 'options': ["Happy/Upbeat", "Need a good laugh"]}]
+
+def test_speculation_is_skipped_when_every_worker_is_busy(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(app, "build_speculative_recommendations", lambda *args: release.wait(5) and ["page"])
+    prefetcher = app.PrefetchScheduler(1)
+    first = prefetcher.speculate("Persona", QUESTIONS, ["Happy/Upbeat"])
+    assert prefetcher.speculate("Persona", QUESTIONS, ["Need a good laugh"]) is None
+    release.set()
+    assert first.result(5) == ["page"]
+    # The worker is free again
+    second = prefetcher.speculate("Persona", QUESTIONS, ["Need a good laugh"])
+    assert second is not None and second.result(5) == ["page"]
+
+def test_queued_speculation_is_cancelled_instead_of_waited_for():
+    release = threading.Event()
+    executor = app.ThreadPoolExecutor(max_workers=1)
+    executor.submit(release.wait, 5)
+    queued = executor.submit(lambda: ["page"])
+    assert app.speculative_result(queued) is None
+    assert queued.cancelled()
+    release.set()
+    executor.shutdown()
+
+def test_question_bank_fills_do_not_share_the_speculation_pool(tmp_path, monkeypatch):
+    busy = threading.Event()
+    prefetcher = app.PrefetchScheduler(1)
+    prefetcher.executor.submit(busy.wait, 5)
+    monkeypatch.setattr(app, "get_prefetcher", lambda: prefetcher)
+    monkeypatch.setattr(app, "request_questions", lambda persona: QUESTIONS)
+    bank = app.get_question_bank.__wrapped__()
+    bank.cache = app.DiskCache(str(tmp_path / "cache.sqlite3"), "question_bank", 10)
+    assert bank.get("Persona") == QUESTIONS
+    busy.set()
+
+class Tier:
+    def __init__(self, tier):
+        self.current = tier
+        self.shed = []
+
+    def tier(self):
+        return self.current
+
+    def note_shed(self, tier, what):
+        self.shed.append((tier, what))
+
+def test_warming_is_shed_under_load(tmp_path, monkeypatch):
+    controller = Tier("cache")
+    monkeypatch.setattr(app, "get_admission", lambda: controller)
+    monkeypatch.setattr(app, "request_questions", lambda persona: pytest.fail("Gemini called while shedding"))
+    bank = app.QuestionBank(app.DiskCache(str(tmp_path / "cache.sqlite3"), "question_bank", 10), None)
+    bank.warm(["Persona", "Other persona"])
+    assert controller.shed == [("cache", "question_refresh")]
+    assert bank.refreshing == {}
@@ -0,0 +1,45 @@
+import pytest
+
+import app
+
+QUESTIONS = [{'question': "What mood are you in right now?", 'options': ["Happy/Upbeat", "Need a good laugh"]}]
+ANSWERS = ["Need a good laugh"]
+
+def card(**changes):
+    card = {
+        'title': "Paddington 2", 'poster': "abc", 'poster_url': "/t/p/w500/abc.jpg", 'year': "2017",
+        'overview': "Paddington picks up a series of odd jobs.", 'ai_description': "A joyful caper.",
+        'media_type': "Movie", 'reason': "Warm and funny", 'degraded': False, 'canned': False
+    }
+    card.update(changes)
+    return card
+
+@pytest.fixture
+def jobs(tmp_path):
+    return app.RecommendationJobs(
+        app.DiskCache(str(tmp_path / "cache.sqlite3"), "jobs", 10),
+        app.ThreadPoolExecutor(max_workers=1)
+    )
+
+def run_twice(jobs, monkeypatch, page):
+    builds = []
+
+    def find_recommendations(*args):
+        builds.append(1)
+        return page
+
+    monkeypatch.setattr(app, "find_recommendations", find_recommendations)
+    for _ in range(2):
+        job_id = jobs.submit("Persona", QUESTIONS, ANSWERS)
+        future = jobs.running.get(job_id)
+        if future is not None:
+            future.result(5)
+    assert jobs.poll(job_id)['recommendations'] == page
+    return len(builds)
+
+def test_finished_complete_jobs_are_shared(jobs, monkeypatch):
+    assert run_twice(jobs, monkeypatch, [card()]) == 1
+
+@pytest.mark.parametrize("page", [[card(), card(degraded=True)], [card(canned=True)]])
+def test_finished_degraded_or_canned_jobs_are_built_again(jobs, monkeypatch, page):
+    assert run_twice(jobs, monkeypatch, page) == 2
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import app
+import semantic_cache
+
+QUESTIONS = [{'question': "What mood are you in right now?", 'options': ["Happy/Upbeat", "Need a good laugh"]}]
+ANSWERS = ["Need a good laugh"]
+RECOMMENDATIONS = [{'title': "Paddington 2", 'type': "movie", 'reason': "Warm and funny"}]
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = app.RecommendationCache(
+        app.DiskCache(os.path.join(tmp_path, "cache.sqlite3"), "recommendations", 100),
+        None,
+        semantic_cache.SemanticIndex(10)
+    )
+    monkeypatch.setattr(app, "get_recommendation_cache", lambda: cache)
+    return cache
+
+def card(**changes):
+    card = {
+        'title': "Paddington 2", 'poster': "abc", 'poster_url': "/t/p/w500/abc.jpg", 'year': "2017",
+        'overview': "Paddington picks up a series of odd jobs.", 'ai_description': "A joyful caper.",
+        'media_type': "Movie", 'reason': "Warm and funny", 'degraded': False
+    }
+    card.update(changes)
+    return card
+
+def test_complete_pages_are_cached(cache):
+    app.remember_recommendations("Persona", QUESTIONS, ANSWERS, RECOMMENDATIONS, [card()])
+    assert cache.get("Persona", QUESTIONS, ANSWERS) == [card()]
+
+@pytest.mark.parametrize("degraded_card", [
+    app.build_fallback_recommendation("Paddington 2", "movie", "Warm and funny"),
+    card(ai_description=app.fallback_description("Paddington picks up a series of odd jobs.", ""), degraded=True),
+])
+def test_pages_with_degraded_cards_are_not_cached(cache, degraded_card):
+    app.remember_recommendations("Persona", QUESTIONS, ANSWERS, RECOMMENDATIONS, [card(), degraded_card])
+    assert cache.get("Persona", QUESTIONS, ANSWERS) is None
+
+def test_shed_descriptions_mark_the_card_degraded(monkeypatch):
+    monkeypatch.setattr(app, "may_run_optional", lambda what: False)
+    cards = app.run_async(app.describe_recommendations_async([card(ai_description=None)]))
+    assert cards[0]['degraded']
+    assert cards[0]['ai_description'] == app.fallback_description(card()['overview'], card()['reason'])
+
+def test_speculation_reuses_cached_pages(cache, monkeypatch):
+    app.remember_recommendations("Persona", QUESTIONS, ANSWERS, RECOMMENDATIONS, [card()])
+
+    def fail(*args):
+        raise AssertionError("Gemini called for a cached answer path")
+
+    monkeypatch.setattr(app, "get_recommendations", fail)
+    assert app.build_speculative_recommendations("Persona", QUESTIONS, ANSWERS) == [card()]
@@ -0,0 +1,124 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+import app
+import semantic_cache
+
+PERSONA = "Hollywood Movie Enthusiast"
+
+REWORDED = [
+    "Will you be watching alone or with others?",
+    "What mood are you in at the moment?",
+    "How much time have you got?",
+    "Which themes interest you the most?",
+    "Do you prefer new releases or older classics?",
+    "Any languages you prefer?",
+    "Do you like intense content or something lighter?",
+]
+
+class RecordingExecutor:
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, function, *args):
+        self.calls.append(args)
+        return DoneFuture()
+
+class DoneFuture:
+    def add_done_callback(self, callback):
+        callback(self)
+
+@pytest.fixture
+def cache(tmp_path):
+    return app.RecommendationCache(
+        app.DiskCache(os.path.join(tmp_path, "cache.sqlite3"), "recommendations", 100),
+        RecordingExecutor(),
+        semantic_cache.SemanticIndex(100)
+    )
+
+def canned():
+    questions = app.canned_questions(PERSONA)
+    return questions, [question['options'][0] for question in questions]
+
+def reworded(questions):
+    return [dict(question, question=text) for question, text in zip(questions, REWORDED)] + questions[len(REWORDED):]
+
+def test_reworded_questions_with_the_same_answers_hit(cache):
+    questions, answers = canned()
+    cache.set(PERSONA, questions, answers, [{'title': "Cached"}])
+    assert cache.get(PERSONA, reworded(questions), answers) == [{'title': "Cached"}]
+    assert cache.index.stats()['near'] == 1
+
+def test_one_changed_answer_misses(cache):
+    questions, answers = canned()
+    cache.set(PERSONA, questions, answers, [{'title': "Cached"}])
+    for position, question in enumerate(questions):
+        for option in question['options'][1:]:
+            changed = answers[:position] + [option] + answers[position + 1:]
+            assert cache.get(PERSONA, questions, changed) is None
+            assert cache.get(PERSONA, reworded(questions), changed) is None
+
+def test_a_different_question_misses(cache):
+    questions, answers = canned()
+    cache.set(PERSONA, questions, answers, [{'title': "Cached"}])
+    swapped = [dict(questions[0], question="Who is your favourite director?")] + questions[1:]
+    assert cache.get(PERSONA, swapped, answers) is None
+
+def test_other_personas_miss(cache):
+    questions, answers = canned()
+    cache.set(PERSONA, questions, answers, [{'title': "Cached"}])
+    assert cache.get("Anime Fan", questions, answers) is None
+
+def test_stale_near_duplicate_revalidates_the_requesting_prompt(cache, monkeypatch):
+    questions, answers = canned()
+    cache.set(PERSONA, questions, answers, [{'title': "Cached"}])
+    key = cache._key(PERSONA, questions, answers)
+    entry = cache.cache.get(key)
+    entry['created_at'] = time.time() - app.RECOMMENDATION_CACHE_TTL - 60
+    cache.cache.set(key, entry, 3600)
+    monkeypatch.setattr(app, "may_run_optional", lambda what: True)
+
+    requesting = reworded(questions)
+    assert cache.get(PERSONA, requesting, answers) == [{'title': "Cached"}]
+    assert cache.executor.calls == [(PERSONA, requesting, answers)]
+
+def test_index_is_rebuilt_from_the_disk_cache(cache, tmp_path):
+    questions, answers = canned()
+    cache.set(PERSONA, questions, answers, [{'title': "Cached"}])
+    rebuilt = app.RecommendationCache(cache.cache, RecordingExecutor(), semantic_cache.SemanticIndex(100))
+    assert rebuilt.get(PERSONA, reworded(questions), answers) == [{'title': "Cached"}]
+
+def test_index_overwrites_the_oldest_entry_when_full():
+    index = semantic_cache.SemanticIndex(2)
+    texts = semantic_cache.embed_texts(["What mood are you in?"])
+    for key in ("a", "b", "c"):
+        index.add(key, 1, texts)
+    assert set(index.slots) == {"b", "c"}
+    index.remove("b")
+    index.remove("c")
+    assert index.nearest(1, texts) == (None, None)
+
+def test_similarity_is_that_of_the_least_similar_question():
+    index = semantic_cache.SemanticIndex(10)
+    shared = [question['question'] for question in app.canned_questions(PERSONA)[1:]]
+    stored = semantic_cache.embed_texts(["What mood are you in?", *shared])
+    query = semantic_cache.embed_texts(["Who is your favourite director?", *shared])
+    index.add("a", 1, stored)
+    key, similarity = index.nearest(1, query)
+    assert key == "a"
+    assert similarity == pytest.approx(float(stored[0] @ query[0]), abs=1e-5)
+    assert similarity < app.SEMANTIC_CACHE_THRESHOLD
+
+def test_prometheus_histogram_is_cumulative():
+    index = semantic_cache.SemanticIndex(10)
+    index.observe(semantic_cache.NEAR, 0.97)
+    index.observe(semantic_cache.MISS, 0.42)
+    index.observe(semantic_cache.EXACT)
+    text = index.export_prometheus()
+    assert 'svomo_semantic_cache_similarity_bucket{outcome="near",le="0.95"} 0' in text
+    assert 'svomo_semantic_cache_similarity_bucket{outcome="near",le="0.975"} 1' in text
+    assert 'svomo_semantic_cache_similarity_count{outcome="miss"} 1' in text
+    assert index.stats()['hit_rate'] == pytest.approx(2 / 3)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import app
+
+def test_identical_calls_share_one_request():
+    flight = app.SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1
+    assert (flight.started, flight.coalesced) == (1, 4)
+    assert flight.calls == {}
+
+def test_finished_calls_are_not_reused():
+    flight = app.SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        return [await flight.do("key", fetch), await flight.do("key", fetch)]
+
+    assert asyncio.run(run()) == [1, 2]
+
+def test_a_waiter_timing_out_does_not_cancel_the_call():
+    flight = app.SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        impatient = asyncio.ensure_future(asyncio.wait_for(flight.do("key", fetch), 0.01))
+        patient = asyncio.ensure_future(flight.do("key", fetch))
+        with pytest.raises(asyncio.TimeoutError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(run()) == "result"
+
+def test_errors_reach_every_waiter():
+    flight = app.SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(2)), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(run())] == ["boom", "boom"]
@@ -0,0 +1,27 @@
+import app
+
+RESPONSE = '```json\n[{"title": "Heat", "type": "movie"}, {"title": "Dark", "type": "tv"}]\n```'
+
+def test_elements_are_returned_once_complete():
+    parser = app.JSONArrayStreamParser()
+    items = []
+    for i in range(0, len(RESPONSE), 7):
+        items += parser.feed(RESPONSE[i:i + 7])
+    assert items == [{'title': "Heat", 'type': "movie"}, {'title': "Dark", 'type': "tv"}]
+
+def test_nothing_before_the_array_starts():
+    parser = app.JSONArrayStreamParser()
+    assert parser.feed("```json\n") == []
+    assert parser.pending_title() is None
+
+def test_pending_title_of_the_element_still_arriving():
+    parser = app.JSONArrayStreamParser()
+    assert parser.feed('[{"title": "Heat", "type": "movie"}, {"title": "Am\\u00e9lie", "rea') == [
+        {'title': "Heat", 'type': "movie"}
+    ]
+    assert parser.pending_title() == "Amélie"
+
+def test_incomplete_title_is_not_pending():
+    parser = app.JSONArrayStreamParser()
+    parser.feed('[{"title": "Hea')
+    assert parser.pending_title() is None
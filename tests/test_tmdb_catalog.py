@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import pytest
+
+import app
+import tmdb_catalog
+
+EXPORT = [
+    {"id": 27810, "original_title": "Parasite", "popularity": 3.1},
+    {"id": 496243, "original_title": "기생충", "popularity": 85.0},
+    {"id": 27205, "original_title": "Inception", "popularity": 92.4},
+    {"id": 550, "original_title": "Fight Club", "popularity": 70.2},
+    {"id": 1001, "original_title": "Crash", "popularity": 30.0},
+    {"id": 1002, "original_title": "Crash", "popularity": 25.0},
+    {"id": 1003, "original_title": "Hidden Adult Title", "popularity": 99.0, "adult": True},
+]
+
+@pytest.fixture
+def catalog(tmp_path):
+    export = tmp_path / "movie_ids_05_15_2024.json"
+    export.write_text("\n".join(json.dumps(item) for item in EXPORT), encoding="utf-8")
+    catalog = tmdb_catalog.TMDBCatalog(str(tmp_path / "catalog.sqlite3"))
+    assert catalog.import_export(str(export)) == len(EXPORT) - 1
+    return catalog
+
+def test_normalize_title():
+    assert tmdb_catalog.normalize_title("  Amélie & the Café!  ") == "amelie and the cafe"
+
+def test_exact_match(catalog):
+    assert catalog.lookup("inception", "movie")['id'] == 27205
+    assert catalog.lookup("Inception", "tv") is None
+
+def test_fuzzy_match(catalog):
+    assert catalog.lookup("Fight Clubb", "movie")['id'] == 550
+
+def test_obscure_homonym_of_a_translated_title_misses(catalog):
+    assert catalog.lookup("Parasite", "movie") is None
+
+def test_ambiguous_title_misses(catalog):
+    assert catalog.lookup("Crash", "movie") is None
+
+def test_adult_titles_are_not_imported(catalog):
+    assert catalog.lookup("Hidden Adult Title", "movie") is None
+
+def test_details_for_another_title_fall_back_to_search(catalog, monkeypatch):
+    monkeypatch.setattr(app, "get_tmdb_catalog", lambda: catalog)
+
+    async def details(item_id, media_type, append_to_response=None):
+        return {'id': item_id, 'title': "Inception: The Cobol Job", 'original_title': "Inception: The Cobol Job"}
+
+    async def search(title, media_type):
+        return {'id': 42, 'title': title}
+
+    async def resolve(result, media_type):
+        return {**result, 'overview': "From /search"}
+
+    monkeypatch.setattr(app, "get_tmdb_details_async", details)
+    monkeypatch.setattr(app, "search_tmdb_async", search)
+    monkeypatch.setattr(app, "resolve_tmdb_item_async", resolve)
+    item = asyncio.run(app.find_tmdb_item_async("Inception", "movie"))
+    assert item == {'id': 42, 'title': "Inception", 'overview': "From /search"}
+
+def test_confirmed_catalog_hit_skips_search(catalog, monkeypatch):
+    monkeypatch.setattr(app, "get_tmdb_catalog", lambda: catalog)
+
+    async def details(item_id, media_type, append_to_response=None):
+        return {'id': item_id, 'title': "Inception", 'poster_path': "/inception.jpg"}
+
+    async def search(title, media_type):
+        raise AssertionError("/search called for a confirmed catalog hit")
+
+    monkeypatch.setattr(app, "get_tmdb_details_async", details)
+    monkeypatch.setattr(app, "search_tmdb_async", search)
+    assert asyncio.run(app.find_tmdb_item_async("Inception", "movie"))['id'] == 27205
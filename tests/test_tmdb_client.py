@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+import admission
+import app
+
+class RefusingAdmission:
+    def admit(self, resource, cost=1.0):
+        return admission.GLOBAL_LIMITED
+
+def half_open_client():
+    client = app.TMDBClient("test")
+    client.breaker = app.CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    client.breaker.record_failure()
+    return client
+
+def test_refused_admission_does_not_take_the_trial(monkeypatch):
+    client = half_open_client()
+    monkeypatch.setattr(app, "get_admission", RefusingAdmission)
+    assert asyncio.run(client.get_async("/search/movie")) is None
+    assert client.breaker.allow_request() == "trial"
+
+def test_cancelled_trial_is_released(monkeypatch):
+    client = half_open_client()
+
+    async def hang(path, params):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(client, "_get_with_retries", hang)
+
+    async def cancel_midway():
+        task = asyncio.ensure_future(client.get_async("/search/movie"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_midway())
+    assert client.breaker.state == "half-open"
+    assert client.breaker.allow_request() == "trial"
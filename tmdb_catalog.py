@@ -0,0 +1,242 @@
+import argparse
+import difflib
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Local index of the TMDB catalog, built from TMDB's daily ID exports
+# (https://developer.themoviedb.org/docs/daily-id-exports). It lets the app
+# resolve a title string to a TMDB id without calling /search, and keeps title
+# resolution working while TMDB is down.
+#
+# Import a snapshot with:
+#   python tmdb_catalog.py movie_ids_05_15_2024.json.gz tv_series_ids_05_15_2024.json.gz
+
+DEFAULT_CATALOG_PATH = ".cache/tmdb_catalog.sqlite3"
+
+# Fuzzy matches below this similarity (0-1) are treated as a miss
+DEFAULT_FUZZY_THRESHOLD = 0.85
+
+# The exports only carry original titles, so an English title can exactly
+# match an obscure work while the one meant is indexed under its
+# original-language title ("Parasite" finds a 1982 film, not 기생충). Only
+# unambiguous hits at least this popular are returned; everything else is
+# left to /search, which knows translated titles.
+DEFAULT_MIN_POPULARITY = 20.0
+
+# How many full-text candidates are scored for a fuzzy match
+FUZZY_CANDIDATES = 25
+
+# Rows written per transaction while importing
+IMPORT_BATCH_SIZE = 10000
+
+# Canonical form of a title for matching: accents stripped, case folded,
+# "&" spelled out, punctuation dropped and whitespace collapsed
+def normalize_title(title):
+    title = unicodedata.normalize("NFKD", str(title))
+    title = "".join(char for char in title if not unicodedata.combining(char))
+    title = title.casefold().replace("&", " and ")
+    title = re.sub(r"[^\w\s]", " ", title)
+    return " ".join(title.split())
+
+# Similarity (0-1) of two titles after normalization
+def title_similarity(first, second):
+    return difflib.SequenceMatcher(None, normalize_title(first), normalize_title(second)).ratio()
+
+# Work out the media type of an export file from its name
+def media_type_from_filename(path):
+    name = os.path.basename(path)
+    if name.startswith("movie_ids"):
+        return "movie"
+    if name.startswith("tv_series_ids"):
+        return "tv"
+    return None
+
+# Read one export line into a catalog row, or None if it should be skipped.
+# The exports carry no dates, but a year is kept when the snapshot has one.
+def parse_export_line(line, media_type):
+    item = json.loads(line)
+    if item.get("adult") or item.get("video"):
+        return None
+    title = item.get("original_title") or item.get("original_name") or item.get("title") or item.get("name")
+    if not title or "id" not in item:
+        return None
+    date = item.get("release_date") or item.get("first_air_date") or ""
+    year = item.get("year") or (int(date[:4]) if date[:4].isdigit() else None)
+    return (
+        int(item["id"]),
+        media_type,
+        title,
+        normalize_title(title),
+        year,
+        float(item.get("popularity") or 0.0)
+    )
+
+# SQLite-backed catalog index. Exact lookups go through a B-tree index on the
+# normalized title; fuzzy lookups pull candidates from an FTS5 table and score
+# them with difflib.
+class TMDBCatalog:
+    def __init__(self, path=DEFAULT_CATALOG_PATH, fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD,
+                 min_popularity=DEFAULT_MIN_POPULARITY):
+        self.path = path
+        self.fuzzy_threshold = fuzzy_threshold
+        self.min_popularity = min_popularity
+        self._local = threading.local()
+
+    # SQLite connections can't be shared between threads, so keep one per thread
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    # True once a snapshot has been imported
+    def available(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            row = self._connect().execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'catalog'"
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None
+
+    def create_schema(self, conn):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS catalog (
+                id INTEGER NOT NULL,
+                media_type TEXT NOT NULL,
+                title TEXT NOT NULL,
+                normalized_title TEXT NOT NULL,
+                year INTEGER,
+                popularity REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (media_type, id)
+            );
+            CREATE INDEX IF NOT EXISTS catalog_title
+                ON catalog (media_type, normalized_title);
+            CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+                normalized_title,
+                content='catalog',
+                content_rowid='rowid'
+            );
+        """)
+
+    # Load one export file into the index. Existing rows for the same ids are
+    # replaced, so importing a newer snapshot updates titles and popularity.
+    # Titles below min_popularity are skipped to keep the index compact.
+    def import_export(self, path, media_type=None, min_popularity=0.0):
+        media_type = media_type or media_type_from_filename(path)
+        if media_type not in ("movie", "tv"):
+            raise ValueError(f"Can't tell whether {path} holds movies or TV series; pass --media-type")
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        self.create_schema(conn)
+
+        opener = gzip.open if path.endswith(".gz") else open
+        imported = 0
+        batch = []
+        with opener(path, "rt", encoding="utf-8") as export:
+            for line in export:
+                if not line.strip():
+                    continue
+                row = parse_export_line(line, media_type)
+                if row is None or row[5] < min_popularity:
+                    continue
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    imported += self._write_batch(conn, batch)
+                    batch = []
+        if batch:
+            imported += self._write_batch(conn, batch)
+
+        # Rebuild the full-text index from the catalog table in one pass
+        with conn:
+            conn.execute("INSERT INTO catalog_fts (catalog_fts) VALUES ('rebuild')")
+        return imported
+
+    def _write_batch(self, conn, batch):
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO catalog VALUES (?, ?, ?, ?, ?, ?)", batch)
+        return len(batch)
+
+    # Resolve a title to its catalog entry, or None on a miss. An exact
+    # normalized match wins, otherwise the closest full-text candidate above
+    # the fuzzy threshold. Ambiguous matches (several titles equally close)
+    # and entries below min_popularity count as misses. Blocking; call it off
+    # the event loop.
+    def lookup(self, title, media_type):
+        normalized = normalize_title(title)
+        if not normalized:
+            return None
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, title, year, popularity FROM catalog "
+                "WHERE media_type = ? AND normalized_title = ? "
+                "ORDER BY popularity DESC LIMIT 2",
+                (media_type, normalized)
+            ).fetchall()
+            if len(rows) > 1:
+                return None
+            row = rows[0] if rows else self._fuzzy_lookup(conn, normalized, media_type)
+        except sqlite3.Error:
+            return None
+        if row is None or row[3] < self.min_popularity:
+            return None
+        return self._entry(row, media_type)
+
+    def _fuzzy_lookup(self, conn, normalized, media_type):
+        query = " OR ".join(f'"{token}"' for token in normalized.split())
+        rows = conn.execute(
+            "SELECT catalog.id, catalog.title, catalog.year, catalog.popularity, catalog.normalized_title "
+            "FROM catalog_fts JOIN catalog ON catalog.rowid = catalog_fts.rowid "
+            "WHERE catalog_fts MATCH ? AND catalog.media_type = ? "
+            "ORDER BY catalog_fts.rank LIMIT ?",
+            (query, media_type, FUZZY_CANDIDATES)
+        ).fetchall()
+
+        # Closest title wins, unless another one is just as close
+        scored = sorted(
+            ((difflib.SequenceMatcher(None, normalized, row[4]).ratio(), row[:4]) for row in rows),
+            key=lambda item: item[0],
+            reverse=True
+        )
+        if not scored or scored[0][0] < self.fuzzy_threshold:
+            return None
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None
+        return scored[0][1]
+
+    def _entry(self, row, media_type):
+        return {'id': row[0], 'title': row[1], 'year': row[2], 'popularity': row[3], 'media_type': media_type}
+
+# Command-line importer
+def main():
+    parser = argparse.ArgumentParser(description="Import TMDB daily ID exports into the local catalog index.")
+    parser.add_argument("exports", nargs="+", help="movie_ids_*.json.gz / tv_series_ids_*.json.gz files")
+    parser.add_argument("--db", default=os.environ.get("TMDB_CATALOG_PATH", DEFAULT_CATALOG_PATH),
+                        help="catalog database to create or update")
+    parser.add_argument("--media-type", choices=("movie", "tv"),
+                        help="media type, when it can't be read from the file name")
+    parser.add_argument("--min-popularity", type=float, default=0.0,
+                        help="skip titles less popular than this")
+    args = parser.parse_args()
+
+    catalog = TMDBCatalog(args.db)
+    for path in args.exports:
+        started = time.monotonic()
+        imported = catalog.import_export(path, args.media_type, args.min_popularity)
+        print(f"{path}: {imported} titles in {time.monotonic() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Lightweight span tracing for the hot path. A trace covers one script run;
+# spans opened while it is active (including inside coroutines handed to the
+# shared event loop, which copy the caller's context) are attached to it.
+# Every finished span also feeds process-wide latency histograms that can be
+# exported in the Prometheus text format.
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Default number of traces kept per session
+DEFAULT_BUFFER_SIZE = 20
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# One script run and the spans recorded during it. Offsets are seconds since
+# the trace started.
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def offset(self):
+        return time.perf_counter() - self._started
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    # Spans in start order
+    def waterfall(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span['start'])
+
+# Latency histogram and error count per span name
+class SpanMetrics:
+    def __init__(self):
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, duration, error):
+        with self._lock:
+            series = self.series.setdefault(name, {
+                'count': 0, 'sum': 0.0, 'errors': 0, 'buckets': [0] * len(LATENCY_BUCKETS)
+            })
+            series['count'] += 1
+            series['sum'] += duration
+            series['errors'] += int(error)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    series['buckets'][i] += 1
+
+    # Prometheus text exposition format
+    def export_prometheus(self, prefix="svomo_span"):
+        lines = [
+            f"# HELP {prefix}_duration_seconds Time spent in each traced operation.",
+            f"# TYPE {prefix}_duration_seconds histogram"
+        ]
+        with self._lock:
+            series = {name: dict(values, buckets=list(values['buckets'])) for name, values in self.series.items()}
+        for name, values in sorted(series.items()):
+            for bound, count in zip(LATENCY_BUCKETS, values['buckets']):
+                lines.append(f'{prefix}_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_duration_seconds_bucket{{span="{name}",le="+Inf"}} {values["count"]}')
+            lines.append(f'{prefix}_duration_seconds_sum{{span="{name}"}} {values["sum"]:.6f}')
+            lines.append(f'{prefix}_duration_seconds_count{{span="{name}"}} {values["count"]}')
+        lines.append(f"# HELP {prefix}_errors_total Traced operations that raised.")
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for name, values in sorted(series.items()):
+            lines.append(f'{prefix}_errors_total{{span="{name}"}} {values["errors"]}')
+        return "\n".join(lines) + "\n"
+
+# Turn a finished trace into an OpenTelemetry (OTLP/JSON) resourceSpans record
+def to_otel(trace, service_name):
+    def attributes(attrs):
+        return [{'key': key, 'value': {'stringValue': str(value)}} for key, value in attrs.items()]
+
+    def nanos(offset):
+        return str(int((trace.started_at + offset) * 1e9))
+
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': attributes({'service.name': service_name})},
+            'scopeSpans': [{
+                'scope': {'name': 'svomo.tracing'},
+                'spans': [
+                    {
+                        'traceId': trace.trace_id,
+                        'spanId': span['span_id'],
+                        'parentSpanId': span['parent_id'] or "",
+                        'name': span['name'],
+                        'kind': 1,
+                        'startTimeUnixNano': nanos(span['start']),
+                        'endTimeUnixNano': nanos(span['start'] + span['duration']),
+                        'attributes': attributes(span['attrs']),
+                        'status': {'code': 2 if span['error'] else 1}
+                    }
+                    for span in trace.waterfall()
+                ]
+            }]
+        }]
+    }
+
+# Entry point for the app: opens traces and spans, keeps the metrics and
+# optionally writes the OpenTelemetry log and a Prometheus textfile (for
+# node_exporter's textfile collector). `collectors` are extra callables
+# returning Prometheus text, appended after the span metrics.
+class Tracer:
+    def __init__(self, service_name, otel_log_path=None, prometheus_path=None):
+        self.service_name = service_name
+        self.otel_log_path = otel_log_path
+        self.prometheus_path = prometheus_path
+        self.metrics = SpanMetrics()
+        self.collectors = []
+        self._write_lock = threading.Lock()
+
+    # Trace one script run. Nested traces are not supported; the inner call
+    # just joins the outer trace.
+    @contextmanager
+    def trace(self, name):
+        if _current_trace.get() is not None:
+            yield _current_trace.get()
+            return
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            with self.span(name):
+                yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.duration = trace.offset()
+            self.export(trace)
+
+    # Time a block. Outside a trace the span only feeds the metrics.
+    @contextmanager
+    def span(self, name, **attrs):
+        trace = _current_trace.get()
+        span_id = secrets.token_hex(8)
+        parent_id = _current_span.get()
+        token = _current_span.set(span_id)
+        started = time.perf_counter()
+        start = trace.offset() if trace else 0.0
+        error = False
+        try:
+            yield attrs
+        except Exception as e:
+            error = True
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            _current_span.reset(token)
+            self.metrics.observe(name, duration, error)
+            if trace is not None:
+                trace.add({
+                    'name': name,
+                    'span_id': span_id,
+                    'parent_id': parent_id,
+                    'start': start,
+                    'duration': duration,
+                    'error': error,
+                    'attrs': attrs
+                })
+
+    def export_prometheus(self):
+        return "".join([self.metrics.export_prometheus(), *(collect() for collect in self.collectors)])
+
+    def export(self, trace):
+        if not self.otel_log_path and not self.prometheus_path:
+            return
+        try:
+            with self._write_lock:
+                if self.otel_log_path:
+                    self._makedirs(self.otel_log_path)
+                    with open(self.otel_log_path, "a", encoding="utf-8") as log:
+                        log.write(json.dumps(to_otel(trace, self.service_name)) + "\n")
+                if self.prometheus_path:
+                    # Write then rename so the collector never reads a partial file
+                    self._makedirs(self.prometheus_path)
+                    temporary = f"{self.prometheus_path}.tmp"
+                    with open(temporary, "w", encoding="utf-8") as metrics_file:
+                        metrics_file.write(self.export_prometheus())
+                    os.replace(temporary, self.prometheus_path)
+        except OSError:
+            # Telemetry must never break a page
+            pass
+
+    def _makedirs(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+# Ring buffer of recent traces for one session
+def new_trace_buffer(size=DEFAULT_BUFFER_SIZE):
+    return deque(maxlen=size)
@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+# Streamlit warns about every st.* call made outside a script run
+logging.disable(logging.WARNING)
+
+import app
+
+# Cache warmer, meant to run at deploy time. Every canned recommendation (the
+# per-persona defaults and the fallback list), the titles on the most recently
+# served results pages and a popular-titles file go through the same
+# enrichment path as a real request, filling the TMDB lookup, poster and AI
+# description caches, so cold starts and fallback pages don't need the network.
+#
+#   python warm_cache.py --popular popular_titles.json --concurrency 4 --rate 5
+#
+# The popular-titles file is a JSON list of {"title", "type", "reason"}
+# objects; "type" defaults to movie. Descriptions are only written for titles
+# with a fixed reason (the canned lists, or a popular entry that has one):
+# for anything else the reason comes from Gemini at request time, so a
+# description written now would never be looked up.
+
+DEFAULT_POPULAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "popular_titles.json")
+
+# Results pages whose titles are warmed by default
+DEFAULT_SERVED_PAGES = 50
+
+# Spaces out title starts to at most `rate` per second (0 = no limit). Each
+# title costs one to three TMDB requests, a poster download and at most one
+# Gemini call.
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.next_start = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        delay = self.next_start - now
+        self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def canned_titles():
+    for persona, recommendations in app.DEFAULT_RECOMMENDATIONS.items():
+        for rec in recommendations:
+            yield f"default:{persona}", rec, True
+    for rec in app.FALLBACK_RECOMMENDATIONS:
+        yield "fallback", rec, True
+
+def served_titles(pages):
+    for entry in app.get_recommendation_cache().cache.recent(pages):
+        for card in entry['recommendations']:
+            yield "served", {'title': card['title'], 'type': card['media_type'].lower() or 'movie', 'reason': card['reason']}, False
+
+def popular_titles(path):
+    with open(path, encoding="utf-8") as titles:
+        entries = json.load(titles)
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'title': entry}
+        rec = {'title': entry['title'], 'type': entry.get('type', 'movie'), 'reason': entry.get('reason', '')}
+        yield "popular", rec, bool(rec['reason'])
+
+# Unique titles to warm, in source order: each title once, plus once per
+# extra reason it should be described with
+def collect_titles(sources, describe=True):
+    titles = {}
+    seen = set()
+    for source, rec, with_description in sources:
+        with_description = with_description and describe
+        title = (app.normalize_text(rec['title']), rec['type'])
+        key = (*title, app.normalize_text(rec['reason'])) if with_description else title
+        if key in titles or (not with_description and title in seen):
+            continue
+        seen.add(title)
+        titles[key] = (source, rec, with_description)
+    return list(titles.values())
+
+async def warm_title(source, rec, describe, timeout):
+    started = time.perf_counter()
+    result = {'source': source, 'title': rec['title'], 'type': rec['type']}
+    try:
+        card = await asyncio.wait_for(app.enrich_recommendation_async(rec, describe), timeout)
+    except Exception as e:
+        result.update(error=repr(e), seconds=time.perf_counter() - started)
+        return result
+    description_key = app.description_cache_key(card['title'], card['media_type'], card['overview'], card['reason'])
+    result.update(
+        found=bool(card['overview'] or card['year']),
+        poster=card['poster'] is not None,
+        described=describe and app.get_description_cache().get(description_key) is not app.CACHE_MISS,
+        seconds=time.perf_counter() - started
+    )
+    return result
+
+async def warm_all(titles, concurrency, rate, timeout):
+    slots = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+
+    async def warm(source, rec, describe):
+        async with slots:
+            await limiter.wait()
+            return await warm_title(source, rec, describe, timeout)
+
+    return await asyncio.gather(*(warm(*item) for item in titles))
+
+def report(results, placeholder_seconds, wall_time):
+    lines = [f"{'source':<36}{'title':<32}{'tmdb':>8}{'poster':>8}{'descr.':>8}{'time':>9}"]
+    for result in results:
+        if 'error' in result:
+            lines.append(f"{result['source']:<36}{result['title'][:31]:<32}  failed: {result['error']}")
+            continue
+        lines.append(
+            f"{result['source']:<36}{result['title'][:31]:<32}"
+            f"{'found' if result['found'] else 'missing':>8}{'yes' if result['poster'] else 'no':>8}"
+            f"{'yes' if result['described'] else '-':>8}{result['seconds']:>8.2f}s"
+        )
+    count = lambda field: sum(1 for result in results if result.get(field))
+    lines.append(f"placeholder poster ready in {placeholder_seconds:.2f}s")
+    lines.append(
+        f"{len(results)} titles in {wall_time:.1f}s: {count('found')} found, {count('poster')} posters, "
+        f"{count('described')} descriptions, {count('error')} failed"
+    )
+    tmdb_stats = app.get_tmdb_cache().stats()
+    lines.append(f"TMDB cache: {tmdb_stats['size']} entries; poster cache: {app.get_poster_store().stats()}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fill the TMDB, poster and AI description caches.")
+    parser.add_argument("--popular", default=DEFAULT_POPULAR_PATH, help="popular-titles JSON file (skipped if missing)")
+    parser.add_argument("--served", type=int, default=DEFAULT_SERVED_PAGES,
+                        help="also warm the titles on this many recently served results pages")
+    parser.add_argument("--concurrency", type=int, default=4, help="titles warmed at the same time")
+    parser.add_argument("--rate", type=float, default=5.0, help="titles started per second (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds allowed per title")
+    parser.add_argument("--no-descriptions", action="store_true", help="only warm TMDB lookups and posters")
+    parser.add_argument("--json", help="also write the per-title results to this file")
+    args = parser.parse_args()
+
+    sources = [canned_titles(), served_titles(args.served)]
+    if os.path.exists(args.popular):
+        sources.append(popular_titles(args.popular))
+    elif args.popular != DEFAULT_POPULAR_PATH:
+        parser.error(f"popular-titles file {args.popular} not found")
+    titles = collect_titles((item for source in sources for item in source), not args.no_descriptions)
+
+    started = time.perf_counter()
+    app.get_placeholder_poster()
+    placeholder_seconds = time.perf_counter() - started
+    results = app.run_async(warm_all(titles, max(args.concurrency, 1), args.rate, args.timeout))
+    wall_time = time.perf_counter() - started
+
+    print(report(results, placeholder_seconds, wall_time))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+    return 1 if any('error' in result for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())